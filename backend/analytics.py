@@ -0,0 +1,108 @@
+import numpy as np
+
+# Everything here works on per-day arrays indexed from the start of the
+# requested range. Documents are only touched once, to pull their fields
+# into arrays; every series after that is computed with array operations.
+ROLLING_WINDOWS = [7, 30]
+ADHERENCE_TOLERANCE = 0.1  # within 10% of calorieGoal counts as on target
+MAX_RANGE_DAYS = 3660
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+FOOD_PROJECTION = {'_id': 0, 'date': 1, 'calories': 1, 'protein': 1, 'carbs': 1, 'fat': 1}
+EXERCISE_PROJECTION = {'_id': 0, 'date': 1, 'caloriesBurned': 1}
+
+def load_columns(docs, projection):
+    # Entries from one projected query -> {field: ndarray}
+    columns = {'date': np.array([d['date'] for d in docs], dtype='datetime64[D]')}
+    for field in projection:
+        if field not in ('_id', 'date'):
+            columns[field] = np.fromiter((d.get(field) or 0 for d in docs), dtype=np.float64, count=len(docs))
+    return columns
+
+def per_day(day_index, weights, num_days):
+    return np.bincount(day_index, weights=weights, minlength=num_days)
+
+def rolling_mean(values, logged, window):
+    # Trailing mean over the logged days in each window; NaN when none were
+    csum = np.cumsum(np.where(logged, values, 0.0))
+    ccount = np.cumsum(logged.astype(np.int64))
+    window_sum = csum - np.concatenate([np.zeros(window), csum[:-window]])[:len(csum)]
+    window_count = ccount - np.concatenate([np.zeros(window, dtype=np.int64), ccount[:-window]])[:len(ccount)]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(window_count > 0, window_sum / window_count, np.nan)
+
+def safe_ratio(numerator, denominator):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(denominator > 0, numerator / denominator, np.nan)
+
+def to_json_list(values, decimals=1):
+    rounded = np.round(values.astype(np.float64), decimals)
+    return [None if np.isnan(v) else v for v in rounded.tolist()]
+
+def compute_trends(food, exercise, start_day, end_day, calorie_goal):
+    days = np.arange(np.datetime64(start_day, 'D'), np.datetime64(end_day, 'D') + 1)
+    num_days = len(days)
+
+    food_index = (food['date'] - days[0]).astype(np.int64)
+    exercise_index = (exercise['date'] - days[0]).astype(np.int64)
+
+    intake = per_day(food_index, food['calories'], num_days)
+    protein = per_day(food_index, food['protein'], num_days)
+    carbs = per_day(food_index, food['carbs'], num_days)
+    fat = per_day(food_index, food['fat'], num_days)
+    burned = per_day(exercise_index, exercise['caloriesBurned'], num_days)
+    food_logged = np.bincount(food_index, minlength=num_days) > 0
+    exercise_logged = np.bincount(exercise_index, minlength=num_days) > 0
+    net = intake - burned
+
+    rolling = {}
+    for window in ROLLING_WINDOWS:
+        rolling[f'{window}d'] = {
+            'intake': to_json_list(rolling_mean(intake, food_logged, window)),
+            'burned': to_json_list(rolling_mean(burned, food_logged | exercise_logged, window)),
+            'net': to_json_list(rolling_mean(net, food_logged, window))
+        }
+
+    # Adherence only counts days with food logged; an empty day says nothing
+    adherence = {'goal': calorie_goal, 'loggedDays': int(food_logged.sum())}
+    if calorie_goal and food_logged.any():
+        logged_net = net[food_logged]
+        adherence['onTarget'] = round(float(np.mean(np.abs(logged_net - calorie_goal) <= ADHERENCE_TOLERANCE * calorie_goal)), 3)
+        adherence['underGoal'] = round(float(np.mean(logged_net <= calorie_goal)), 3)
+        adherence['averageDeviation'] = round(float(np.mean(logged_net - calorie_goal)), 1)
+    else:
+        adherence.update({'onTarget': None, 'underGoal': None, 'averageDeviation': None})
+
+    # Share of macro calories (4/4/9 kcal per gram)
+    macro_calories = np.stack([protein * 4, carbs * 4, fat * 9])
+    macro_total = macro_calories.sum(axis=0)
+    macros = {
+        name: to_json_list(safe_ratio(series, macro_total), 3)
+        for name, series in zip(['protein', 'carbs', 'fat'], macro_calories)
+    }
+
+    # 1970-01-01 was a Thursday, so shift by 3 to make Monday 0
+    weekday = (days.astype(np.int64) + 3) % 7
+    logged_weekdays = weekday[food_logged]
+    weekday_counts = np.bincount(logged_weekdays, minlength=7)
+    weekday_intake = safe_ratio(np.bincount(logged_weekdays, weights=intake[food_logged], minlength=7), weekday_counts)
+    weekday_burned = safe_ratio(np.bincount(logged_weekdays, weights=burned[food_logged], minlength=7), weekday_counts)
+    weekdays = [
+        {'day': name, 'loggedDays': int(count), 'intake': intake_avg, 'burned': burned_avg}
+        for name, count, intake_avg, burned_avg in zip(
+            WEEKDAYS, weekday_counts, to_json_list(weekday_intake), to_json_list(weekday_burned)
+        )
+    ]
+
+    return {
+        'dates': [str(day) for day in days],
+        'daily': {
+            'intake': to_json_list(intake, 0),
+            'burned': to_json_list(burned, 0),
+            'net': to_json_list(net, 0)
+        },
+        'rolling': rolling,
+        'adherence': adherence,
+        'macroRatios': macros,
+        'weekdays': weekdays
+    }
@@ -1,108 +1,339 @@
 # backend/app.py
-from flask import Flask, jsonify, request
+from dotenv import load_dotenv
+load_dotenv()
+
+from flask import Blueprint, Flask, Response, current_app, jsonify, request
+from werkzeug.middleware.proxy_fix import ProxyFix
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timedelta
+from datetime import datetime
+import hmac
 import os
-from pymongo import MongoClient
 from bson.objectid import ObjectId
-from otp_utils import generate_otp, send_otp_email, otp_expiry_time
-from dotenv import load_dotenv
-load_dotenv()
+from otp_utils import generate_otp, hash_otp, build_otp_message, otp_expiry_time, OTP_MAX_ATTEMPTS
+from mail_queue import otp_mail_queue
+from ratelimit import otp_email_limiter, otp_ip_limiter
+from indexes import ensure_indexes
+from analytics import load_columns, compute_trends, FOOD_PROJECTION, EXERCISE_PROJECTION, MAX_RANGE_DAYS
+from cache import profile_cache
+from hashing import hash_password, verify_password, needs_rehash, rehash_in_background
+from pagination import encode_cursor, apply_cursor, parse_page_size, parse_projection
+from repository import (UserRepository, OTPRepository, SummaryRepository, TombstoneRepository, PRIVATE_USER_FIELDS, PUBLIC_USER_PROJECTION,
+                        start_op_count, op_count, entry_repository)
+from config import config
+from db import mongo, db, client_options
+from sync import new_sync_token, decode_sync_token, token_expired, SYNC_MAX_CHANGES
+from etags import day_list_etag, profile_etag, etag_matches
+import events
+import metrics
+import profiling
+import encoder
+from entries import build_food_entry, build_exercise_entry
+from goals import calculate_bmr, calculate_tdee, calculate_calorie_goal
+from importer import EntryImporter, parse_rows, text_stream, detect_format, IMPORT_FORMATS, ENTRY_KINDS
+from search import FoodSearch, SEARCH_PROJECTION, DEFAULT_RESULTS, MAX_RESULTS
+from export import (export_rows, ndjson_lines, csv_lines, EXPORT_FORMATS, FOOD_EXPORT_PROJECTION,
+                    EXERCISE_EXPORT_PROJECTION, EARLIEST_DATE, LATEST_DATE)
+
+# Routes are registered on a blueprint and the app is put together by
+# create_app. The Mongo client and the repositories below are module-level
+# singletons that every route uses, so there is one app per process.
+api = Blueprint('api', __name__)
+
+# Collections, all accessed through the repositories. Nothing connects
+# here: each worker opens its own pool on its first query.
+users = UserRepository(db.users)
+otps = OTPRepository(db.otps)
+daily_summaries = SummaryRepository(db.daily_summaries)
+# Entries live in food_entries / exercise_entries, or with
+# ENTRY_STORAGE=buckets in one document per user and day (see buckets.py)
+food_entries = entry_repository(db, 'food', daily_summaries)
+exercise_entries = entry_repository(db, 'exercise', daily_summaries)
+tombstones = TombstoneRepository(db.tombstones)
+food_entries.add_listener(tombstones.listener('food'))
+exercise_entries.add_listener(tombstones.listener('exercise'))
+
+# Live events: published by the writes below, or read back from a change
+# stream so that every worker sees every write
+if events.EVENTS_SOURCE == 'changestream':
+    # public_user is defined further down
+    events.broker.on_first_subscribe = events.ChangeStreamSource(lambda: mongo.database, lambda user: public_user(user)).start
+else:
+    food_entries.add_listener(events.entry_listener('food'))
+    exercise_entries.add_listener(events.entry_listener('exercise'))
 
-# Initialize Flask app
-app = Flask(__name__)
-CORS(app, supports_credentials=True)
+# Food name autocomplete, patched in place by every food entry write
+food_search = FoodSearch(lambda user_id: food_entries.iter_range(user_id, EARLIEST_DATE, LATEST_DATE, SEARCH_PROJECTION))
+food_entries.add_listener(food_search.entry_changed)
 
-# Setup JWT
-app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'dev-secret-key')
-app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
-jwt = JWTManager(app)
+def create_app(config_name='default'):
+    app = Flask(__name__)
+    app.config.from_object(config[config_name])
+    # SECRET_KEY keys the OTP hashes, JWT_SECRET_KEY signs the tokens
+    for key in ('SECRET_KEY', 'JWT_SECRET_KEY'):
+        if not app.config.get(key):
+            raise RuntimeError(f"{key} must be set for the {config_name} configuration")
+    # Binds the process-wide mongo client (and with it every repository) to
+    # this app's MONGO_URI, so a second app in the same process would take
+    # the first one's database away; build one and import it from here
+    if mongo.uri is not None:
+        raise RuntimeError("create_app was already called in this process, import app.app instead")
 
-# Setup MongoDB
-mongo_uri = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/fitness_tracker')
-client = MongoClient(mongo_uri)
-db = client.get_database()
+    # Behind a load balancer remote_addr is the proxy's, which would put
+    # every client in one OTP rate limit bucket. Only trust as many
+    # X-Forwarded-* hops as there are proxies, or clients can spoof them.
+    hops = app.config['TRUSTED_PROXY_HOPS']
+    if hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=hops, x_proto=hops)
 
-# Collections
-users = db.users
-food_entries = db.food_entries
-exercise_entries = db.exercise_entries
+    CORS(app, supports_credentials=True, expose_headers=['ETag'])
+    JWTManager(app)
+    metrics.init_app(app)
+    profiling.init_app(app)
+    encoder.init_app(app)
+    events.broker.dumps = app.json.dumps_bytes
+
+    mongo.configure(app.config['MONGO_URI'], event_listeners=[metrics.MongoCommandMetrics()],
+                    **client_options(app.config))
+    app.register_blueprint(api)
+    return app
+
+def create_indexes(app):
+    # Run once per deployment rather than in every worker: from __main__,
+    # gunicorn's on_starting hook or the ASGI lifespan startup
+    if not app.config['MONGO_ENSURE_INDEXES']:
+        return
+    _, failures = ensure_indexes(mongo.database)
+    for collection_name, index_name, error in failures:
+        print(f"[WARNING] Could not ensure MongoDB index {collection_name}.{index_name}: {str(error)}")
+    # Registration counts on email_unique to settle races between two
+    # sign-ups for the same address; without it duplicates get through
+    if any((collection_name, index_name) == ('users', 'email_unique') for collection_name, index_name, _ in failures):
+        raise RuntimeError("The users.email_unique index is missing, refusing to start")
 
 # Helper functions
-def calculate_bmr(weight, height, age, gender):
-    if gender == 'male':
-        return 88.362 + (13.397 * weight) + (4.799 * height) - (5.677 * age)
-    else:
-        return 447.593 + (9.247 * weight) + (3.098 * height) - (4.330 * age)
-
-def calculate_tdee(bmr, activity_level):
-    activity_multipliers = {
-        'sedentary': 1.2,
-        'light': 1.375,
-        'moderate': 1.55,
-        'active': 1.725,
-        'veryActive': 1.9
-    }
-    return bmr * activity_multipliers.get(activity_level, 1.2)
+def parse_day_range(date):
+    # Raises ValueError for anything that isn't YYYY-MM-DD
+    query_date = datetime.strptime(date, '%Y-%m-%d')
+    start_date = query_date.replace(hour=0, minute=0, second=0, microsecond=0)
+    end_date = query_date.replace(hour=23, minute=59, second=59, microsecond=999999)
+    return start_date, end_date
 
-def calculate_calorie_goal(tdee, goal):
-    goals = {
-        'lose': tdee - 500,  # Deficit for weight loss
-        'maintain': tdee,    # Maintenance
-        'gain': tdee + 500   # Surplus for weight gain
-    }
-    return goals.get(goal, tdee)
+def public_user(user):
+    user_data = {k: v for k, v in user.items() if k not in PRIVATE_USER_FIELDS}
+    user_data['_id'] = str(user_data['_id'])
+    return user_data
+
+def load_profile(user_id):
+    # Serialized profile from the per-worker cache, falling back to Mongo
+    user_data = profile_cache.get(user_id)
+    if user_data is None:
+        user = users.find_by_id(user_id)
+        if not user:
+            return None
+        user_data = public_user(user)
+        profile_cache.set(user_id, user_data)
+    return user_data
+
+def profile_changed(user_id, user_data):
+    profile_cache.set(user_id, user_data)
+    if events.EVENTS_SOURCE != 'changestream':
+        events.publish_profile(user_id, user_data)
 
-def serialize_doc(doc):
-    if doc.get('_id'):
-        doc['_id'] = str(doc['_id'])
-    return doc
+# Partial updates: only the fields present in the request are set.
+# Each returns (updates, None) or (None, error message).
+FOOD_UPDATE_FIELDS = {'name': None, 'calories': int, 'protein': float, 'carbs': float, 'fat': float, 'mealType': None}
+EXERCISE_UPDATE_FIELDS = {'name': None, 'duration': int, 'caloriesBurned': int, 'exerciseType': None}
+
+def parse_entry_updates(data, fields):
+    if not isinstance(data, dict):
+        return None, "Request body must be an object"
+    
+    updates = {'updated_at': datetime.utcnow()}
+    
+    # Parse date if provided
+    if 'date' in data:
+        try:
+            updates['date'] = datetime.strptime(data.get('date'), '%Y-%m-%d')
+        except (TypeError, ValueError):
+            return None, "Invalid date format, use YYYY-MM-DD"
+    
+    for field, convert in fields.items():
+        if field in data:
+            try:
+                updates[field] = convert(data[field]) if convert else data[field]
+            except (TypeError, ValueError):
+                return None, f"Field '{field}' must be a number"
+    
+    return updates, None
+
+# Fields a client may ask for with ?fields=
+FOOD_FIELDS = ['name', 'calories', 'protein', 'carbs', 'fat', 'date', 'mealType', 'created_at', 'updated_at']
+EXERCISE_FIELDS = ['name', 'duration', 'caloriesBurned', 'date', 'exerciseType', 'created_at', 'updated_at']
+
+def not_modified(etag):
+    return with_etag(Response(status=304), etag)
+
+def with_etag(response, etag):
+    # no-cache: the browser may keep the body but must revalidate each time
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def list_entries(repo, user_id, allowed_fields):
+    date = request.args.get('date')
+    range_from = request.args.get('from')
+    range_to = request.args.get('to')
+    
+    try:
+        projection = parse_projection(request.args.get('fields'), allowed_fields)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Single day: the whole day as a plain array
+    if not range_from and not range_to:
+        if not date:
+            return jsonify({"error": "Date parameter is required"}), 400
+        
+        # Parse date
+        try:
+            start_date, end_date = parse_day_range(date)
+        except ValueError:
+            return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
+        
+        # The version is read before the entries, so a write racing this
+        # request can only make the ETag older than the body, never newer
+        etag = day_list_etag(user_id, repo.kind, date, request.args.get('fields'),
+                             daily_summaries.day_version(user_id, start_date, repo.kind))
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return not_modified(etag)
+        entries = repo.iter_range(user_id, start_date, end_date, projection, sort=[('date', 1)])
+        return with_etag(encoder.stream_array(current_app.json, entries), etag), 200
+    
+    # Date range: keyset pages ordered by (date, _id)
+    if not range_from or not range_to:
+        return jsonify({"error": "Both 'from' and 'to' are required for a range"}), 400
+    
+    try:
+        start_date, _ = parse_day_range(range_from)
+        _, end_date = parse_day_range(range_to)
+    except ValueError:
+        return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
+    
+    try:
+        page_size = parse_page_size(request.args.get('limit'))
+    except ValueError:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    
+    query = {'date': {'$gte': start_date, '$lte': end_date}}
+    cursor_token = request.args.get('cursor')
+    if cursor_token:
+        try:
+            apply_cursor(query, cursor_token)
+        except ValueError:
+            return jsonify({"error": "Invalid cursor"}), 400
+    start_date = query.pop('date')['$gte']
+    
+    # One extra document tells us whether there is another page
+    entries = repo.iter_range(user_id, start_date, end_date, projection,
+                              sort=[('date', 1), ('_id', 1)], limit=page_size + 1, extra=query)
+    return encoder.stream_page(current_app.json, entries, page_size, encode_cursor), 200
+
+MAX_BATCH_SIZE = 500
+
+def insert_entries_batch(repo, build_entry, user_id, data):
+    items = data.get('entries') if isinstance(data, dict) else data
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "Expected a non-empty array of entries"}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} entries per batch"}), 400
+    
+    # Validate every item up front; bad rows are reported, not fatal
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        entry, error = build_entry(user_id, item)
+        if error:
+            results[index] = {'index': index, 'status': 'error', 'error': error}
+        else:
+            valid.append((index, entry))
+    
+    if valid:
+        failed = repo.insert_many([entry for _, entry in valid])
+        for position, (index, entry) in enumerate(valid):
+            if position in failed:
+                results[index] = {'index': index, 'status': 'error', 'error': failed[position]}
+            else:
+                results[index] = {'index': index, 'status': 'created', '_id': str(entry['_id'])}
+    
+    created = sum(1 for r in results if r['status'] == 'created')
+    return jsonify({
+        'created': created,
+        'failed': len(results) - created,
+        'results': results
+    }), 201 if created == len(results) else 207
+
+# Count Mongo round trips per request; visible to tests as X-Mongo-Ops
+@api.before_app_request
+def reset_mongo_op_count():
+    start_op_count()
+
+@api.after_app_request
+def report_mongo_op_count(response):
+    if current_app.testing or current_app.debug:
+        response.headers['X-Mongo-Ops'] = str(op_count())
+    return response
 
 # Error handling
-@app.errorhandler(404)
+@api.app_errorhandler(404)
 def not_found(error):
     return jsonify({"error": "Not found"}), 404
 
-@app.errorhandler(400)
+@api.app_errorhandler(400)
 def bad_request(error):
     return jsonify({"error": "Bad request"}), 400
 
-@app.errorhandler(401)
+@api.app_errorhandler(401)
 def unauthorized(error):
     return jsonify({"error": "Unauthorized"}), 401
 
 # OTP-based Email Verification
 import traceback
 
-@app.route('/api/auth/request-otp', methods=['POST'])
+def rate_limited(retry_after):
+    response = jsonify({'error': 'Too many OTP requests, try again later'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+@api.route('/api/auth/request-otp', methods=['POST'])
 def request_otp():
     data = request.json
     email = data.get('email')
     if not email:
         return jsonify({'error': 'Email is required'}), 400
-    user = users.find_one({'email': email})
-    if not user:
+    # Throttled before anything touches Mongo or the mail queue
+    retry_after = otp_ip_limiter.take(request.remote_addr) or otp_email_limiter.take(email)
+    if retry_after:
+        return rate_limited(retry_after)
+    # Check SMTP environment variables
+    smtp_vars = ['SMTP_SERVER', 'SMTP_PORT']
+    missing_vars = [var for var in smtp_vars if not os.environ.get(var)]
+    if missing_vars:
+        print(f"[ERROR] Missing SMTP environment variables: {', '.join(missing_vars)}")
+        return jsonify({'error': f"Missing SMTP config: {', '.join(missing_vars)}"}), 500
+    user_id = users.find_id_by_email(email)
+    if user_id is None:
         return jsonify({'error': 'Email not registered'}), 404
     otp = generate_otp()
-    expiry = otp_expiry_time()
-    users.update_one({'email': email}, {'$set': {'otp': otp, 'otp_expiry': expiry}})
-    try:
-        # Check SMTP environment variables
-        smtp_vars = ['SMTP_SERVER', 'SMTP_PORT', 'SMTP_USER', 'SMTP_PASSWORD']
-        missing_vars = [var for var in smtp_vars if not os.environ.get(var)]
-        if missing_vars:
-            print(f"[ERROR] Missing SMTP environment variables: {', '.join(missing_vars)}")
-            return jsonify({'error': f'Missing SMTP config: {', '.join(missing_vars)}'}), 500
-        send_otp_email(email, otp)
-    except Exception as e:
-        print('[ERROR] Exception in /api/auth/request-otp:', str(e))
-        traceback.print_exc()
-        return jsonify({'error': f'Failed to send OTP: {str(e)}'}), 500
+    otps.issue(email, str(user_id), hash_otp(current_app.config['SECRET_KEY'], email, otp), otp_expiry_time())
+    # Delivery happens on the mail queue's thread; retries and failures are
+    # handled there, so the request doesn't wait on the SMTP server
+    if not otp_mail_queue.enqueue(build_otp_message(email, otp)):
+        print('[ERROR] Mail queue full, rejecting /api/auth/request-otp')
+        return jsonify({'error': 'Too many pending emails, try again shortly'}), 503
     return jsonify({'message': 'OTP sent to email'}), 200
 
-@app.route('/api/auth/verify-otp', methods=['POST'])
+@api.route('/api/auth/verify-otp', methods=['POST'])
 def verify_otp():
     try:
         data = request.json
@@ -110,18 +341,25 @@ def verify_otp():
         otp = data.get('otp')
         if not email or not otp:
             return jsonify({'error': 'Email and OTP are required'}), 400
-        user = users.find_one({'email': email})
-        if not user or 'otp' not in user or 'otp_expiry' not in user:
+        retry_after = otp_ip_limiter.take(request.remote_addr)
+        if retry_after:
+            return rate_limited(retry_after)
+        pending = otps.find(email)
+        if not pending:
             return jsonify({'error': 'OTP not requested or expired'}), 400
-        if user['otp'] != otp:
-            return jsonify({'error': 'Invalid OTP'}), 401
-        if datetime.utcnow() > user['otp_expiry']:
+        # The TTL monitor only runs once a minute, so check expiry here too
+        if datetime.utcnow() > pending['expires_at']:
             return jsonify({'error': 'OTP expired'}), 401
-        # OTP valid, clear OTP fields and log in user
-        users.update_one({'email': email}, {'$unset': {'otp': '', 'otp_expiry': ''}})
-        access_token = create_access_token(identity=str(user['_id']))
-        user_data = {k: v for k, v in user.items() if k not in ['password', 'otp', 'otp_expiry']}
-        user_data['_id'] = str(user_data['_id'])
+        code_hash = hash_otp(current_app.config['SECRET_KEY'], email, str(otp))
+        if not hmac.compare_digest(pending['code_hash'], code_hash):
+            otps.record_failure(email, OTP_MAX_ATTEMPTS)
+            return jsonify({'error': 'Invalid OTP'}), 401
+        if not otps.consume(email, code_hash):
+            return jsonify({'error': 'OTP not requested or expired'}), 400
+        user_data = load_profile(pending['user_id'])
+        if user_data is None:
+            return jsonify({'error': 'User not found'}), 404
+        access_token = create_access_token(identity=pending['user_id'])
         return jsonify({'user': user_data, 'access_token': access_token}), 200
     except Exception as e:
         print('[ERROR] Exception in /api/auth/verify-otp:', str(e))
@@ -129,16 +367,16 @@ def verify_otp():
         return jsonify({'error': f'Failed to verify OTP: {str(e)}'}), 500
 
 # ---- AUTH ROUTES ----
-@app.route('/api/auth/register', methods=['POST'])
+@api.route('/api/auth/register', methods=['POST'])
 def register():
     data = request.json
     
-    # Check if email already exists
-    if users.find_one({'email': data.get('email')}):
+    # Cheap indexed lookup first, so a taken email doesn't pay for a hash
+    if users.find_id_by_email(data.get('email')):
         return jsonify({"error": "Email already registered"}), 400
     
     # Hash password
-    hashed_password = generate_password_hash(data.get('password'))
+    hashed_password = hash_password(data.get('password'))
     
     # Calculate calorie goal
     bmr = calculate_bmr(
@@ -166,130 +404,129 @@ def register():
         'updated_at': datetime.utcnow()
     }
     
-    result = users.insert_one(user)
+    # The unique email index still catches a sign-up racing this one
+    user_id = users.create(user)
+    if user_id is None:
+        return jsonify({"error": "Email already registered"}), 400
     
     # Create JWT token
-    access_token = create_access_token(identity=str(result.inserted_id))
+    access_token = create_access_token(identity=str(user_id))
     
     # Return user info without password
     user.pop('password', None)
-    user['_id'] = str(result.inserted_id)
+    user['_id'] = str(user_id)
     
     return jsonify({
         'user': user,
         'access_token': access_token
     }), 201
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login():
     data = request.json
     email = data.get('email')
     password = data.get('password')
     
     # Find user
-    user = users.find_one({'email': email})
+    user = users.find_by_email(email)
     
-    if not user or not check_password_hash(user.get('password'), password):
+    if not user or not verify_password(user.get('password'), password):
         return jsonify({"error": "Invalid credentials"}), 401
     
+    # Upgrade hashes made with outdated parameters while we have the password
+    if needs_rehash(user['password']):
+        old_hash = user['password']
+        user_id = user['_id']
+        rehash_in_background(password, lambda new_hash: users.replace_password_hash(user_id, old_hash, new_hash))
+    
     # Create JWT token
     access_token = create_access_token(identity=str(user['_id']))
     
     # Return user info without password
-    user_data = {k: v for k, v in user.items() if k != 'password'}
-    user_data['_id'] = str(user_data['_id'])
+    user_data = public_user(user)
+    profile_cache.set(user_data['_id'], user_data)
     
     return jsonify({
         'user': user_data,
         'access_token': access_token
     }), 200
 
-@app.route('/api/auth/status', methods=['GET'])
+@api.route('/api/auth/status', methods=['GET'])
 @jwt_required()
 def auth_status():
     current_user_id = get_jwt_identity()
-    user = users.find_one({'_id': ObjectId(current_user_id)})
+    user_data = load_profile(current_user_id)
     
-    if not user:
+    if not user_data:
         return jsonify({"error": "User not found"}), 404
     
-    # Return user info without password
-    user_data = {k: v for k, v in user.items() if k != 'password'}
-    user_data['_id'] = str(user_data['_id'])
-    
     return jsonify(user_data), 200
 
-@app.route('/api/auth/logout', methods=['POST'])
+@api.route('/api/auth/logout', methods=['POST'])
 def logout():
     # Frontend will handle token removal
     return jsonify({"message": "Logged out successfully"}), 200
 
-@app.route('/api/user/profile', methods=['GET'])
+@api.route('/api/user/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
     current_user_id = get_jwt_identity()
-    user = users.find_one({'_id': ObjectId(current_user_id)})
+    user_data = load_profile(current_user_id)
     
-    if not user:
+    if not user_data:
         return jsonify({"error": "User not found"}), 404
     
-    # Return user info without password
-    user_data = {k: v for k, v in user.items() if k != 'password'}
-    user_data['_id'] = str(user_data['_id'])
-    
-    return jsonify(user_data), 200
+    etag = profile_etag(current_user_id, user_data.get('updated_at'))
+    if etag_matches(request.headers.get('If-None-Match'), etag):
+        return not_modified(etag)
+    return with_etag(jsonify(user_data), etag), 200
 
-@app.route('/api/user/profile', methods=['PUT'])
+@api.route('/api/user/profile', methods=['PUT'])
 @jwt_required()
 def update_profile():
     current_user_id = get_jwt_identity()
     data = request.json
     
-    # Get user
-    user = users.find_one({'_id': ObjectId(current_user_id)})
+    # Current values only matter for recomputing calorieGoal from a partial
+    # update, so the cached profile is good enough and usually saves a read
+    user = load_profile(current_user_id)
     if not user:
         return jsonify({"error": "User not found"}), 404
     
-    # Update fields
-    updates = {
-        'name': data.get('name', user.get('name')),
-        'weight': float(data.get('weight', user.get('weight'))),
-        'height': float(data.get('height', user.get('height'))),
-        'age': int(data.get('age', user.get('age'))),
-        'gender': data.get('gender', user.get('gender')),
-        'activityLevel': data.get('activityLevel', user.get('activityLevel')),
-        'goal': data.get('goal', user.get('goal')),
-        'updated_at': datetime.utcnow()
-    }
+    # Update fields that were sent
+    updates = {'updated_at': datetime.utcnow()}
+    for field, convert in (('name', None), ('weight', float), ('height', float), ('age', int),
+                           ('gender', None), ('activityLevel', None), ('goal', None)):
+        if field in data:
+            try:
+                updates[field] = convert(data[field]) if convert else data[field]
+            except (TypeError, ValueError):
+                return jsonify({"error": f"Field '{field}' must be a number"}), 400
     
     # Recalculate calorie goal if relevant data changed
     if any(key in data for key in ['weight', 'height', 'age', 'gender', 'activityLevel', 'goal']):
+        merged = {**user, **updates}
         bmr = calculate_bmr(
-            updates['weight'],
-            updates['height'],
-            updates['age'],
-            updates['gender']
+            float(merged['weight']),
+            float(merged['height']),
+            int(merged['age']),
+            merged['gender']
         )
-        tdee = calculate_tdee(bmr, updates['activityLevel'])
-        updates['calorieGoal'] = round(calculate_calorie_goal(tdee, updates['goal']))
+        tdee = calculate_tdee(bmr, merged['activityLevel'])
+        updates['calorieGoal'] = round(calculate_calorie_goal(tdee, merged['goal']))
     
-    # Update user in database
-    result = users.update_one(
-        {'_id': ObjectId(current_user_id)},
-        {'$set': updates}
-    )
+    # Update user in database and get the result back in the same round trip
+    updated_user = users.update(current_user_id, updates)
+    if not updated_user:
+        profile_cache.invalidate(current_user_id)
+        return jsonify({"error": "User not found"}), 404
     
-    if result.modified_count == 0:
-        return jsonify({"message": "No changes made"}), 200
-    
-    # Get updated user
-    updated_user = users.find_one({'_id': ObjectId(current_user_id)})
-    user_data = {k: v for k, v in updated_user.items() if k != 'password'}
-    user_data['_id'] = str(user_data['_id'])
+    user_data = public_user(updated_user)
+    profile_changed(current_user_id, user_data)
     
     return jsonify(user_data), 200
 
-@app.route('/api/user/calorie-goal', methods=['PUT'])
+@api.route('/api/user/calorie-goal', methods=['PUT'])
 @jwt_required()
 def update_calorie_goal():
     current_user_id = get_jwt_identity()
@@ -300,278 +537,447 @@ def update_calorie_goal():
         return jsonify({"error": "Calorie goal is required"}), 400
     
     # Update user
-    result = users.update_one(
-        {'_id': ObjectId(current_user_id)},
-        {'$set': {
-            'calorieGoal': int(calorie_goal),
-            'updated_at': datetime.utcnow()
-        }}
-    )
+    updated_user = users.update(current_user_id, {
+        'calorieGoal': int(calorie_goal),
+        'updated_at': datetime.utcnow()
+    })
+    
+    if not updated_user:
+        profile_cache.invalidate(current_user_id)
+        return jsonify({"error": "User not found"}), 404
     
-    if result.modified_count == 0:
-        return jsonify({"message": "No changes made"}), 200
+    profile_changed(current_user_id, public_user(updated_user))
     
     return jsonify({"message": "Calorie goal updated successfully"}), 200
 
 # Food entries
-@app.route('/api/food', methods=['GET'])
+@api.route('/api/food', methods=['GET'])
 @jwt_required()
 def get_food_entries():
     current_user_id = get_jwt_identity()
-    date = request.args.get('date')
-    
-    if not date:
-        return jsonify({"error": "Date parameter is required"}), 400
+    return list_entries(food_entries, current_user_id, FOOD_FIELDS)
+
+@api.route('/api/food/search', methods=['GET'])
+@jwt_required()
+def search_foods():
+    current_user_id = get_jwt_identity()
+    query = request.args.get('q', '')
     
-    # Parse date
     try:
-        query_date = datetime.strptime(date, '%Y-%m-%d')
-        start_date = query_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_date = query_date.replace(hour=23, minute=59, second=59, microsecond=999999)
+        limit = min(int(request.args.get('limit', DEFAULT_RESULTS)), MAX_RESULTS)
     except ValueError:
-        return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
-    
-    # Query food entries
-    entries = food_entries.find({
-        'user_id': current_user_id,
-        'date': {'$gte': start_date, '$lte': end_date}
-    }).sort('date', 1)
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be a positive integer"}), 400
     
-    result = [serialize_doc(entry) for entry in entries]
-    return jsonify(result), 200
+    return jsonify(food_search.search(current_user_id, query, limit)), 200
 
-@app.route('/api/food', methods=['POST'])
+@api.route('/api/food', methods=['POST'])
 @jwt_required()
 def add_food_entry():
     current_user_id = get_jwt_identity()
     data = request.json
     
-    # Validate required fields
-    required_fields = ['name', 'calories', 'date', 'mealType']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({"error": f"Field '{field}' is required"}), 400
-    
-    # Parse date
-    try:
-        entry_date = datetime.strptime(data.get('date'), '%Y-%m-%d')
-    except ValueError:
-        return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
+    food_entry, error = build_food_entry(current_user_id, data)
+    if error:
+        return jsonify({"error": error}), 400
     
-    # Create food entry
-    food_entry = {
-        'user_id': current_user_id,
-        'name': data.get('name'),
-        'calories': int(data.get('calories')),
-        'protein': float(data.get('protein', 0)),
-        'carbs': float(data.get('carbs', 0)),
-        'fat': float(data.get('fat', 0)),
-        'date': entry_date,
-        'mealType': data.get('mealType'),
-        'created_at': datetime.utcnow(),
-        'updated_at': datetime.utcnow()
-    }
-    
-    result = food_entries.insert_one(food_entry)
-    food_entry['_id'] = str(result.inserted_id)
+    food_entries.insert(food_entry)
+    food_entry['_id'] = str(food_entry['_id'])
     
     return jsonify(food_entry), 201
 
-@app.route('/api/food/<id>', methods=['PUT'])
+@api.route('/api/food/batch', methods=['POST'])
+@jwt_required()
+def add_food_entries_batch():
+    current_user_id = get_jwt_identity()
+    return insert_entries_batch(food_entries, build_food_entry, current_user_id, request.json)
+
+@api.route('/api/food/<id>', methods=['PUT'])
 @jwt_required()
 def update_food_entry(id):
     current_user_id = get_jwt_identity()
     data = request.json
     
-    # Validate food entry exists and belongs to user
-    entry = food_entries.find_one({
-        '_id': ObjectId(id),
-        'user_id': current_user_id
-    })
-    
-    if not entry:
-        return jsonify({"error": "Food entry not found"}), 404
-    
-    # Parse date if provided
-    entry_date = entry.get('date')
-    if 'date' in data:
-        try:
-            entry_date = datetime.strptime(data.get('date'), '%Y-%m-%d')
-        except ValueError:
-            return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
+    updates, error = parse_entry_updates(data, FOOD_UPDATE_FIELDS)
+    if error:
+        return jsonify({"error": error}), 400
     
-    # Update fields
-    updates = {
-        'name': data.get('name', entry.get('name')),
-        'calories': int(data.get('calories', entry.get('calories'))),
-        'protein': float(data.get('protein', entry.get('protein', 0))),
-        'carbs': float(data.get('carbs', entry.get('carbs', 0))),
-        'fat': float(data.get('fat', entry.get('fat', 0))),
-        'date': entry_date,
-        'mealType': data.get('mealType', entry.get('mealType')),
-        'updated_at': datetime.utcnow()
-    }
-    
-    result = food_entries.update_one(
-        {'_id': ObjectId(id), 'user_id': current_user_id},
-        {'$set': updates}
-    )
+    # Ownership check, write and rollup move all come from one update
+    updated_entry = food_entries.update(current_user_id, id, updates)
     
-    if result.modified_count == 0:
-        return jsonify({"message": "No changes made"}), 200
+    if not updated_entry:
+        return jsonify({"error": "Food entry not found"}), 404
     
-    # Get updated entry
-    updated_entry = food_entries.find_one({'_id': ObjectId(id)})
-    return jsonify(serialize_doc(updated_entry)), 200
+    return jsonify(updated_entry), 200
 
-@app.route('/api/food/<id>', methods=['DELETE'])
+@api.route('/api/food/<id>', methods=['DELETE'])
 @jwt_required()
 def delete_food_entry(id):
     current_user_id = get_jwt_identity()
     
-    # Validate food entry exists and belongs to user
-    entry = food_entries.find_one({
-        '_id': ObjectId(id),
-        'user_id': current_user_id
-    })
+    # Filtered by owner, so someone else's entry looks the same as a missing one
+    entry = food_entries.delete(current_user_id, id)
     
     if not entry:
         return jsonify({"error": "Food entry not found"}), 404
     
-    result = food_entries.delete_one({'_id': ObjectId(id), 'user_id': current_user_id})
-    
-    if result.deleted_count == 0:
-        return jsonify({"error": "Failed to delete food entry"}), 500
-    
     return jsonify({"message": "Food entry deleted successfully"}), 200
 
 # Exercise entries
-@app.route('/api/exercise', methods=['GET'])
+@api.route('/api/exercise', methods=['GET'])
 @jwt_required()
 def get_exercise_entries():
     current_user_id = get_jwt_identity()
-    date = request.args.get('date')
+    return list_entries(exercise_entries, current_user_id, EXERCISE_FIELDS)
+
+@api.route('/api/exercise', methods=['POST'])
+@jwt_required()
+def add_exercise_entry():
+    current_user_id = get_jwt_identity()
+    data = request.json
     
-    if not date:
-        return jsonify({"error": "Date parameter is required"}), 400
+    exercise_entry, error = build_exercise_entry(current_user_id, data)
+    if error:
+        return jsonify({"error": error}), 400
     
-    # Parse date
+    exercise_entries.insert(exercise_entry)
+    exercise_entry['_id'] = str(exercise_entry['_id'])
+    
+    return jsonify(exercise_entry), 201
+
+@api.route('/api/exercise/batch', methods=['POST'])
+@jwt_required()
+def add_exercise_entries_batch():
+    current_user_id = get_jwt_identity()
+    return insert_entries_batch(exercise_entries, build_exercise_entry, current_user_id, request.json)
+
+@api.route('/api/exercise/<id>', methods=['PUT'])
+@jwt_required()
+def update_exercise_entry(id):
+    current_user_id = get_jwt_identity()
+    data = request.json
+    
+    updates, error = parse_entry_updates(data, EXERCISE_UPDATE_FIELDS)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    # Ownership check, write and rollup move all come from one update
+    updated_entry = exercise_entries.update(current_user_id, id, updates)
+    
+    if not updated_entry:
+        return jsonify({"error": "Exercise entry not found"}), 404
+    
+    return jsonify(updated_entry), 200
+
+@api.route('/api/exercise/<id>', methods=['DELETE'])
+@jwt_required()
+def delete_exercise_entry(id):
+    current_user_id = get_jwt_identity()
+    
+    # Filtered by owner, so someone else's entry looks the same as a missing one
+    entry = exercise_entries.delete(current_user_id, id)
+    
+    if not entry:
+        return jsonify({"error": "Exercise entry not found"}), 404
+    
+    return jsonify({"message": "Exercise entry deleted successfully"}), 200
+
+# Cache statistics for this worker
+@api.route('/api/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify({'profile': profile_cache.stats(), 'mail': otp_mail_queue.stats(), 'pid': os.getpid()}), 200
+
+# Per-worker metrics in the Prometheus text format
+def collect_worker_stats():
+    profile = profile_cache.stats()
+    mail = otp_mail_queue.stats()
+    streams = events.broker.stats()
+    limited = {(scope,): limiter.stats()['rejected'] for scope, limiter in
+               [('email', otp_email_limiter), ('ip', otp_ip_limiter)]}
+    return [
+        ('profile_cache_events_total', 'Profile cache lookups by result', 'counter',
+         {('hit',): profile['hits'], ('miss',): profile['misses']}, ('result',)),
+        ('profile_cache_size', 'Profiles currently cached', 'gauge', {(): profile['size']}, ()),
+        ('mail_queue_depth', 'OTP emails waiting to be sent', 'gauge', {(): mail['queued']}, ()),
+        ('mail_messages_total', 'OTP emails by outcome', 'counter',
+         {('sent',): mail['sent'], ('failed',): mail['failed']}, ('outcome',)),
+        ('event_streams_open', 'Open /api/events connections', 'gauge', {(): streams['connections']}, ()),
+        ('otp_rate_limited_total', 'OTP requests rejected by the rate limiter', 'counter', limited, ('scope',))
+    ]
+
+metrics.registry.add_collector(collect_worker_stats)
+
+@api.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+# Live updates as Server-Sent Events. EventSource can't send headers, so
+# the token may also come as ?jwt=. Each stream holds a worker thread
+# here; serve through asgi.py to keep thousands open.
+@api.route('/api/events', methods=['GET'])
+@jwt_required(locations=['headers', 'query_string'])
+def stream_events():
+    current_user_id = get_jwt_identity()
+    # The page falls back to refetching after its own writes
+    if not events.take_thread_stream():
+        return jsonify({"error": "No free event stream slots, try again later"}), 503, {'Retry-After': '60'}
+    subscription = events.Subscription()
+    if not events.broker.subscribe(current_user_id, subscription):
+        events.release_thread_stream()
+        return jsonify({"error": "Too many open event streams"}), 429
+
+    def stream():
+        yield events.stream_open()
+        yield from subscription.messages()
+
+    def close():
+        # Runs when the server closes the response, even if the client left
+        # before the first chunk and the generator never started
+        events.broker.unsubscribe(current_user_id, subscription)
+        events.release_thread_stream()
+
+    response = Response(stream(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(close)
+    return response
+
+# Delta sync for offline clients. Without since it only hands out a
+# starting token (with the profile); fetch it before loading any days.
+@api.route('/api/sync', methods=['GET'])
+@jwt_required()
+def sync_changes():
+    current_user_id = get_jwt_identity()
+    now = datetime.utcnow()
+    # Straight from Mongo, not the per-worker profile cache: a cached copy
+    # can be older than the token's overlap (other workers' writes, the
+    # recompute_goals job), and the change would be skipped for good
+    user = users.find_by_id(current_user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+    profile = public_user(user)
+
+    changes = {
+        'food': [],
+        'exercise': [],
+        'deleted': {'food': [], 'exercise': []},
+        'profile': profile,
+        'token': new_sync_token(now)
+    }
+    if not request.args.get('since'):
+        return jsonify(changes), 200
+
     try:
-        query_date = datetime.strptime(date, '%Y-%m-%d')
-        start_date = query_date.replace(hour=0, minute=0, second=0, microsecond=0)
-        end_date = query_date.replace(hour=23, minute=59, second=59, microsecond=999999)
+        since = decode_sync_token(request.args['since'])
     except ValueError:
-        return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
+        return jsonify({"error": "Invalid sync token"}), 400
+    if token_expired(since, now):
+        return jsonify({"error": "Sync token expired, reload and start over", "resync": True}), 410
+
+    # One more than allowed tells us the client is better off reloading
+    for kind, repo in (('food', food_entries), ('exercise', exercise_entries)):
+        changes[kind] = repo.find_changed(current_user_id, since, SYNC_MAX_CHANGES + 1)
+    deleted = tombstones.find_since(current_user_id, since, SYNC_MAX_CHANGES + 1)
+    if max(len(changes['food']), len(changes['exercise']), len(deleted)) > SYNC_MAX_CHANGES:
+        return jsonify({"error": "Too many changes, reload and start over", "resync": True}), 410
+
+    for tombstone in deleted:
+        changes['deleted'][tombstone['kind']].append(str(tombstone['entry_id']))
+    updated_at = profile.get('updated_at')
+    if updated_at is not None and updated_at <= since:
+        changes['profile'] = None
+    return jsonify(changes), 200
+
+# Daily summaries
+@api.route('/api/summary', methods=['GET'])
+@jwt_required()
+def get_daily_summaries():
+    current_user_id = get_jwt_identity()
+    range_from = request.args.get('from')
+    range_to = request.args.get('to')
     
-    # Query exercise entries
-    entries = exercise_entries.find({
-        'user_id': current_user_id,
-        'date': {'$gte': start_date, '$lte': end_date}
-    }).sort('date', 1)
+    if not range_from or not range_to:
+        return jsonify({"error": "Both 'from' and 'to' are required"}), 400
+    
+    # Parse dates
+    try:
+        start_date, _ = parse_day_range(range_from)
+        _, end_date = parse_day_range(range_to)
+    except ValueError:
+        return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
     
-    result = [serialize_doc(entry) for entry in entries]
-    return jsonify(result), 200
+    summaries = daily_summaries.find_range(current_user_id, start_date, end_date)
+    return jsonify(summaries), 200
 
-@app.route('/api/exercise', methods=['POST'])
+# Analytics
+@api.route('/api/analytics/trends', methods=['GET'])
 @jwt_required()
-def add_exercise_entry():
+def get_trends():
     current_user_id = get_jwt_identity()
-    data = request.json
+    range_from = request.args.get('from')
+    range_to = request.args.get('to')
     
-    # Validate required fields
-    required_fields = ['name', 'duration', 'caloriesBurned', 'date', 'exerciseType']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({"error": f"Field '{field}' is required"}), 400
+    if not range_from or not range_to:
+        return jsonify({"error": "Both 'from' and 'to' are required"}), 400
     
-    # Parse date
+    # Parse dates
     try:
-        entry_date = datetime.strptime(data.get('date'), '%Y-%m-%d')
+        start_date, _ = parse_day_range(range_from)
+        _, end_date = parse_day_range(range_to)
     except ValueError:
         return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
     
-    # Create exercise entry
-    exercise_entry = {
-        'user_id': current_user_id,
-        'name': data.get('name'),
-        'duration': int(data.get('duration')),
-        'caloriesBurned': int(data.get('caloriesBurned')),
-        'date': entry_date,
-        'exerciseType': data.get('exerciseType'),
-        'created_at': datetime.utcnow(),
-        'updated_at': datetime.utcnow()
-    }
+    if end_date < start_date:
+        return jsonify({"error": "'from' must not be after 'to'"}), 400
+    if (end_date - start_date).days >= MAX_RANGE_DAYS:
+        return jsonify({"error": f"Range is limited to {MAX_RANGE_DAYS} days"}), 400
     
-    result = exercise_entries.insert_one(exercise_entry)
-    exercise_entry['_id'] = str(result.inserted_id)
+    user = load_profile(current_user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
     
-    return jsonify(exercise_entry), 201
+    food = load_columns(food_entries.find_range(current_user_id, start_date, end_date, FOOD_PROJECTION), FOOD_PROJECTION)
+    exercise = load_columns(exercise_entries.find_range(current_user_id, start_date, end_date, EXERCISE_PROJECTION), EXERCISE_PROJECTION)
+    trends = compute_trends(food, exercise, start_date.date(), end_date.date(), user.get('calorieGoal'))
+    
+    return jsonify(trends), 200
 
-@app.route('/api/exercise/<id>', methods=['PUT'])
+# Export of a user's full history, streamed straight from the cursors
+@api.route('/api/export', methods=['GET'])
 @jwt_required()
-def update_exercise_entry(id):
+def export_entries():
     current_user_id = get_jwt_identity()
-    data = request.json
-    
-    # Validate exercise entry exists and belongs to user
-    entry = exercise_entries.find_one({
-        '_id': ObjectId(id),
-        'user_id': current_user_id
-    })
+    export_format = request.args.get('format', 'ndjson')
+    range_from = request.args.get('from')
+    range_to = request.args.get('to')
     
-    if not entry:
-        return jsonify({"error": "Exercise entry not found"}), 404
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
     
-    # Parse date if provided
-    entry_date = entry.get('date')
-    if 'date' in data:
-        try:
-            entry_date = datetime.strptime(data.get('date'), '%Y-%m-%d')
-        except ValueError:
-            return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
-    
-    # Update fields
-    updates = {
-        'name': data.get('name', entry.get('name')),
-        'duration': int(data.get('duration', entry.get('duration'))),
-        'caloriesBurned': int(data.get('caloriesBurned', entry.get('caloriesBurned'))),
-        'date': entry_date,
-        'exerciseType': data.get('exerciseType', entry.get('exerciseType')),
-        'updated_at': datetime.utcnow()
-    }
+    # Parse dates; either bound may be left open
+    try:
+        start_date = parse_day_range(range_from)[0] if range_from else EARLIEST_DATE
+        end_date = parse_day_range(range_to)[1] if range_to else LATEST_DATE
+    except ValueError:
+        return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
     
-    result = exercise_entries.update_one(
-        {'_id': ObjectId(id), 'user_id': current_user_id},
-        {'$set': updates}
+    order = [('date', 1), ('_id', 1)]
+    rows = export_rows(
+        food_entries.iter_range(current_user_id, start_date, end_date, FOOD_EXPORT_PROJECTION, sort=order),
+        exercise_entries.iter_range(current_user_id, start_date, end_date, EXERCISE_EXPORT_PROJECTION, sort=order)
     )
+    if export_format == 'csv':
+        lines, mimetype = csv_lines(rows), 'text/csv'
+    else:
+        lines, mimetype = ndjson_lines(rows, current_app.json.dumps_bytes), 'application/x-ndjson'
     
-    if result.modified_count == 0:
-        return jsonify({"message": "No changes made"}), 200
-    
-    # Get updated entry
-    updated_entry = exercise_entries.find_one({'_id': ObjectId(id)})
-    return jsonify(serialize_doc(updated_entry)), 200
+    response = Response(encoder.chunked(lines), mimetype=mimetype)
+    response.headers['Content-Disposition'] = f'attachment; filename=fitness-export.{export_format}'
+    return response, 200
 
-@app.route('/api/exercise/<id>', methods=['DELETE'])
+# Bulk import from a CSV or NDJSON upload, read row by row
+@api.route('/api/import', methods=['POST'])
 @jwt_required()
-def delete_exercise_entry(id):
+def import_entries():
     current_user_id = get_jwt_identity()
     
-    # Validate exercise entry exists and belongs to user
-    entry = exercise_entries.find_one({
-        '_id': ObjectId(id),
-        'user_id': current_user_id
-    })
-    
-    if not entry:
-        return jsonify({"error": "Exercise entry not found"}), 404
+    # Either a multipart upload in 'file' or the raw request body
+    upload = request.files.get('file')
+    if upload:
+        binary, filename, content_type = upload.stream, upload.filename, upload.mimetype
+    else:
+        binary, filename, content_type = request.stream, None, request.mimetype
     
-    result = exercise_entries.delete_one({'_id': ObjectId(id), 'user_id': current_user_id})
+    import_format = request.args.get('format') or detect_format(filename, content_type)
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({"error": f"format must be one of: {', '.join(IMPORT_FORMATS)}"}), 400
     
-    if result.deleted_count == 0:
-        return jsonify({"error": "Failed to delete exercise entry"}), 500
+    kind = request.args.get('type')
+    if kind and kind not in ENTRY_KINDS:
+        return jsonify({"error": f"type must be one of: {', '.join(ENTRY_KINDS)}"}), 400
     
-    return jsonify({"message": "Exercise entry deleted successfully"}), 200
+    importer = EntryImporter({'food': food_entries, 'exercise': exercise_entries}, current_user_id, kind)
+    report = importer.run(parse_rows(text_stream(binary), import_format))
+    return jsonify(report), 201 if not report['failed'] else 207
+
+# Dashboard
+def dashboard_pipeline(user_id, start_date, end_date):
+    # Entries are stored with the user id as a string, so the lookups can
+    # match on it directly and use the (user_id, date) index
+    return [
+        {'$match': {'_id': ObjectId(user_id)}},
+        {'$project': PUBLIC_USER_PROJECTION},
+        {'$addFields': {'_id': {'$toString': '$_id'}}},
+        {'$lookup': {'from': food_entries.name, 'as': 'foodEntries',
+                     'pipeline': food_entries.lookup_pipeline(user_id, start_date, end_date)}},
+        {'$lookup': {'from': exercise_entries.name, 'as': 'exerciseEntries',
+                     'pipeline': exercise_entries.lookup_pipeline(user_id, start_date, end_date)}},
+        {'$addFields': {
+            'totals': {
+                'caloriesConsumed': {'$sum': '$foodEntries.calories'},
+                'caloriesBurned': {'$sum': '$exerciseEntries.caloriesBurned'},
+                'protein': {'$sum': '$foodEntries.protein'},
+                'carbs': {'$sum': '$foodEntries.carbs'},
+                'fat': {'$sum': '$foodEntries.fat'},
+                'exerciseMinutes': {'$sum': '$exerciseEntries.duration'}
+            }
+        }},
+        {'$addFields': {
+            'totals.netCalories': {'$subtract': ['$totals.caloriesConsumed', '$totals.caloriesBurned']},
+            'totals.remainingCalories': {'$subtract': [
+                {'$ifNull': ['$calorieGoal', 0]},
+                {'$subtract': ['$totals.caloriesConsumed', '$totals.caloriesBurned']}
+            ]},
+            'totals.percentOfGoal': {'$cond': [
+                {'$gt': [{'$ifNull': ['$calorieGoal', 0]}, 0]},
+                {'$round': [{'$multiply': [
+                    {'$divide': [
+                        {'$subtract': ['$totals.caloriesConsumed', '$totals.caloriesBurned']},
+                        '$calorieGoal'
+                    ]},
+                    100
+                ]}, 1]},
+                None
+            ]}
+        }}
+    ]
+
+@api.route('/api/dashboard', methods=['GET'])
+@jwt_required()
+def get_dashboard():
+    current_user_id = get_jwt_identity()
+    date = request.args.get('date')
+
+    if not date:
+        return jsonify({"error": "Date parameter is required"}), 400
+
+    # Parse date
+    try:
+        start_date, end_date = parse_day_range(date)
+    except ValueError:
+        return jsonify({"error": "Invalid date format, use YYYY-MM-DD"}), 400
+
+    # Profile, both entry lists and the day's totals in a single round trip
+    if not ObjectId.is_valid(current_user_id):
+        return jsonify({"error": "User not found"}), 404
+    result = users.aggregate(dashboard_pipeline(current_user_id, start_date, end_date))
+
+    if not result:
+        return jsonify({"error": "User not found"}), 404
+
+    dashboard = result[0]
+    return jsonify({
+        'date': date,
+        'profile': {k: v for k, v in dashboard.items() if k not in ['foodEntries', 'exerciseEntries', 'totals']},
+        'foodEntries': dashboard['foodEntries'],
+        'exerciseEntries': dashboard['exerciseEntries'],
+        'totals': dashboard['totals']
+    }), 200
+
+# Production unless FLASK_CONFIG says otherwise: gunicorn and uvicorn
+# import this module, and only python app.py is meant as the debug server
+app = create_app(os.environ.get('FLASK_CONFIG', 'development' if __name__ == '__main__' else 'production'))
 
 if __name__ == '__main__':
+    create_indexes(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
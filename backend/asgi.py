@@ -0,0 +1,356 @@
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from concurrent.futures import ThreadPoolExecutor
+from bson.objectid import ObjectId
+from flask_jwt_extended import decode_token
+from motor.motor_asyncio import AsyncIOMotorClient
+from urllib.parse import parse_qs
+import asyncio
+import logging
+import os
+import time
+
+import app as flask_module
+import events
+import metrics
+from app import create_indexes, parse_day_range, public_user, FOOD_FIELDS, EXERCISE_FIELDS, PUBLIC_USER_PROJECTION
+from etags import day_list_etag, profile_etag, etag_matches
+from cache import profile_cache
+from rollups import VERSION_FIELDS
+from db import client_options
+from pagination import encode_cursor, apply_cursor, parse_page_size, parse_projection
+from buckets import ENTRY_STORAGE
+
+# Asyncio serving mode for the same API. The read endpoints that spend
+# their time waiting on Mongo are served natively here with motor, and
+# their independent queries run concurrently; every other route, and any
+# request these handlers don't want to answer themselves (bad input,
+# missing or invalid token), is passed to the Flask app unchanged, so
+# responses and errors are the same in both modes. Run it with
+#   uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+flask_app = flask_module.app
+
+# WsgiToAsgi runs the app with sync_to_async's default thread_sensitive=True,
+# which puts every fallback request on one shared thread, one at a time.
+# Flask is thread-safe (gunicorn already runs it on gthread), so run it on
+# a pool of FLASK_THREADS threads instead, the ASGI counterpart of
+# GUNICORN_THREADS; MONGO_MAX_POOL_SIZE should stay above it.
+FLASK_THREADS = int(os.environ.get('FLASK_THREADS', '8'))
+flask_executor = ThreadPoolExecutor(max_workers=FLASK_THREADS, thread_name_prefix='flask')
+
+class ThreadedWsgiToAsgiInstance(WsgiToAsgiInstance):
+    # The parent's run_wsgi_app, minus its thread_sensitive wrapper
+    run_wsgi_app = sync_to_async(WsgiToAsgiInstance.__dict__['run_wsgi_app'].func,
+                                 thread_sensitive=False, executor=flask_executor)
+
+class ThreadedWsgiToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await ThreadedWsgiToAsgiInstance(self.wsgi_application)(scope, receive, send)
+
+fallback = ThreadedWsgiToAsgi(flask_app)
+
+class PathOnlyAccessLog(logging.Filter):
+    # uvicorn logs the path with its query string, and EventSource sends
+    # its token as ?jwt=; keep only the path, as gunicorn.conf.py does
+    def filter(self, record):
+        if record.name == 'uvicorn.access' and isinstance(record.args, tuple) and len(record.args) == 5:
+            client, method, path, version, status = record.args
+            record.args = (client, method, path.split('?', 1)[0], version, status)
+        return True
+
+logging.getLogger('uvicorn.access').addFilter(PathOnlyAccessLog())
+
+MOTOR_MAX_POOL_SIZE = int(os.environ.get('MOTOR_MAX_POOL_SIZE', '100'))
+_motor = {}
+
+def get_db():
+    # One client per process and event loop, created on first use
+    key = (os.getpid(), id(asyncio.get_running_loop()))
+    if key not in _motor:
+        _motor.clear()
+        options = {**client_options(flask_app.config), 'maxPoolSize': MOTOR_MAX_POOL_SIZE}
+        # Motor runs each command on its executor with a copy of the
+        # caller's context, so the listener sees the route set below
+        _motor[key] = AsyncIOMotorClient(flask_app.config['MONGO_URI'], event_listeners=[metrics.MongoCommandMetrics()],
+                                         **options).get_database()
+    return _motor[key]
+
+class Request:
+    def __init__(self, scope):
+        self.scope = scope
+        self.args = {k: v[0] for k, v in parse_qs(scope.get('query_string', b'').decode()).items()}
+        self.headers = {k.decode().lower(): v.decode() for k, v in scope.get('headers', [])}
+
+    def identity(self, query_token=False):
+        # The JWT identity, or None to let Flask produce the auth error
+        auth = self.headers.get('authorization', '')
+        if auth.startswith('Bearer '):
+            token = auth[len('Bearer '):]
+        elif query_token and self.args.get('jwt'):
+            token = self.args['jwt']
+        else:
+            return None
+        try:
+            with flask_app.app_context():
+                claims = decode_token(token)
+        except Exception:
+            return None
+        return claims.get(flask_app.config.get('JWT_IDENTITY_CLAIM', 'sub'))
+
+class Reply:
+    # A handler's answer when it carries an ETag; body None means 304
+    def __init__(self, body, etag):
+        self.body = body
+        self.etag = etag
+
+def not_modified(request, etag):
+    return etag_matches(request.headers.get('if-none-match'), etag)
+
+async def send_json(request, send, body, status=200, etag=None):
+    headers = []
+    if status != 304:
+        # Trailing newline like Flask's jsonify
+        payload = flask_app.json.dumps_bytes(body) + b'\n'
+        headers += [(b'content-type', b'application/json'), (b'content-length', str(len(payload)).encode())]
+    else:
+        payload = b''
+    if etag:
+        headers += [(b'etag', etag.encode()), (b'cache-control', b'private, no-cache')]
+    # Same CORS headers Flask-CORS adds with supports_credentials
+    origin = request.headers.get('origin')
+    if origin:
+        headers += [(b'access-control-allow-origin', origin.encode()),
+                    (b'access-control-allow-credentials', b'true'),
+                    (b'access-control-expose-headers', b'ETag'),
+                    (b'vary', b'Origin')]
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': payload})
+
+async def load_profile(db, user_id):
+    user_data = profile_cache.get(user_id)
+    if user_data is None:
+        if not ObjectId.is_valid(user_id):
+            return None
+        user = await db.users.find_one({'_id': ObjectId(user_id)}, PUBLIC_USER_PROJECTION)
+        if not user:
+            return None
+        user_data = public_user(user)
+        profile_cache.set(user_id, user_data)
+    return user_data
+
+async def find_entries(collection, user_id, start_date, end_date, projection=None, sort=None, limit=None, extra=None):
+    query = {'user_id': user_id, 'date': {'$gte': start_date, '$lte': end_date}}
+    if extra:
+        query.update(extra)
+    cursor = collection.find(query, projection)
+    if sort:
+        cursor = cursor.sort(sort)
+    if limit:
+        cursor = cursor.limit(limit)
+    return await cursor.to_list(length=None)
+
+# Handlers return the response body (or a Reply), or None to hand the
+# request to Flask
+async def get_auth_status(request, db, user_id):
+    return await load_profile(db, user_id)
+
+async def get_profile(request, db, user_id):
+    profile = await load_profile(db, user_id)
+    if profile is None:
+        return None
+    etag = profile_etag(user_id, profile.get('updated_at'))
+    return Reply(None if not_modified(request, etag) else profile, etag)
+
+def entry_list_handler(collection_name, kind, allowed_fields):
+    async def handler(request, db, user_id):
+        try:
+            projection = parse_projection(request.args.get('fields'), allowed_fields)
+        except ValueError:
+            return None
+        collection = db[collection_name]
+        range_from, range_to = request.args.get('from'), request.args.get('to')
+
+        if not range_from and not range_to:
+            try:
+                start_date, end_date = parse_day_range(request.args.get('date') or '')
+            except ValueError:
+                return None
+            summary = await db.daily_summaries.find_one({'user_id': user_id, 'date': start_date},
+                                                        {'_id': 1, VERSION_FIELDS[kind]: 1})
+            etag = day_list_etag(user_id, kind, request.args['date'], request.args.get('fields'), summary)
+            if not_modified(request, etag):
+                return Reply(None, etag)
+            return Reply(await find_entries(collection, user_id, start_date, end_date, projection, sort=[('date', 1)]), etag)
+
+        try:
+            start_date, _ = parse_day_range(range_from or '')
+            _, end_date = parse_day_range(range_to or '')
+            page_size = parse_page_size(request.args.get('limit'))
+            query = {'date': {'$gte': start_date, '$lte': end_date}}
+            if request.args.get('cursor'):
+                apply_cursor(query, request.args['cursor'])
+        except ValueError:
+            return None
+        start_date = query.pop('date')['$gte']
+        entries = await find_entries(collection, user_id, start_date, end_date, projection,
+                                     sort=[('date', 1), ('_id', 1)], limit=page_size + 1, extra=query)
+        has_more = len(entries) > page_size
+        entries = entries[:page_size]
+        return {'entries': entries, 'nextCursor': encode_cursor(entries[-1]) if has_more else None}
+    return handler
+
+def sum_field(entries, field):
+    # $sum semantics: missing and non-numeric values count as 0
+    return sum(v for v in (e.get(field) for e in entries) if isinstance(v, (int, float)) and not isinstance(v, bool))
+
+async def get_dashboard(request, db, user_id):
+    date = request.args.get('date')
+    try:
+        start_date, end_date = parse_day_range(date or '')
+    except ValueError:
+        return None
+
+    # Profile and both entry lists at the same time
+    profile, food, exercise = await asyncio.gather(
+        load_profile(db, user_id),
+        find_entries(db.food_entries, user_id, start_date, end_date, sort=[('date', 1)]),
+        find_entries(db.exercise_entries, user_id, start_date, end_date, sort=[('date', 1)])
+    )
+    if profile is None:
+        return None
+
+    consumed = sum_field(food, 'calories')
+    burned = sum_field(exercise, 'caloriesBurned')
+    net = consumed - burned
+    goal = profile.get('calorieGoal') or 0
+    return {
+        'date': date,
+        'profile': profile,
+        'foodEntries': food,
+        'exerciseEntries': exercise,
+        'totals': {
+            'caloriesConsumed': consumed,
+            'caloriesBurned': burned,
+            'protein': sum_field(food, 'protein'),
+            'carbs': sum_field(food, 'carbs'),
+            'fat': sum_field(food, 'fat'),
+            'exerciseMinutes': sum_field(exercise, 'duration'),
+            'netCalories': net,
+            'remainingCalories': goal - net,
+            'percentOfGoal': round(net / goal * 100, 1) if goal > 0 else None
+        }
+    }
+
+class AsyncSubscription(events.Subscription):
+    # The broker delivers from whichever thread made the write; the message
+    # is handed over to the stream's event loop
+    def __init__(self, loop, size=events.SSE_QUEUE_SIZE):
+        self.loop = loop
+        self.queue = asyncio.Queue(size)
+
+    def deliver(self, message):
+        try:
+            self.loop.call_soon_threadsafe(self.put, message)
+        except RuntimeError:
+            pass  # the loop is gone along with the connection
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+async def stream_events(scope, receive, send, request, user_id):
+    # An open stream is a queue and a coroutine, not a thread. False when
+    # the user is over the limit, to let Flask answer.
+    subscription = AsyncSubscription(asyncio.get_running_loop())
+    if not events.broker.subscribe(user_id, subscription):
+        return False
+
+    async def watch_disconnect():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        subscription.put(None)
+
+    headers = [(b'content-type', b'text/event-stream; charset=utf-8'), (b'cache-control', b'no-cache'),
+               (b'x-accel-buffering', b'no')]
+    origin = request.headers.get('origin')
+    if origin:
+        headers += [(b'access-control-allow-origin', origin.encode()),
+                    (b'access-control-allow-credentials', b'true'),
+                    (b'access-control-expose-headers', b'ETag'),
+                    (b'vary', b'Origin')]
+    watcher = asyncio.ensure_future(watch_disconnect())
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': events.stream_open(), 'more_body': True})
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.queue.get(), events.SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                message = events.HEARTBEAT
+            if message is None:
+                break
+            await send({'type': 'http.response.body', 'body': message, 'more_body': True})
+        if not watcher.done():
+            await send({'type': 'http.response.body', 'body': b''})
+    finally:
+        watcher.cancel()
+        events.broker.unsubscribe(user_id, subscription)
+    return True
+
+ROUTES = {
+    '/api/auth/status': get_auth_status,
+    '/api/user/profile': get_profile
+}
+# The entry handlers read the one-document-per-entry layout; with
+# ENTRY_STORAGE=buckets those routes go to Flask and its bucket repository
+if ENTRY_STORAGE == 'documents':
+    ROUTES.update({
+        '/api/food': entry_list_handler('food_entries', 'food', FOOD_FIELDS),
+        '/api/exercise': entry_list_handler('exercise_entries', 'exercise', EXERCISE_FIELDS),
+        '/api/dashboard': get_dashboard
+    })
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await asyncio.to_thread(create_indexes, flask_app)
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for client_db in _motor.values():
+                    client_db.client.close()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] == 'http' and scope.get('method') == 'GET' and scope.get('path') == '/api/events':
+        request = Request(scope)
+        user_id = request.identity(query_token=True)
+        if not user_id or not await stream_events(scope, receive, send, request, user_id):
+            return await fallback(scope, receive, send)
+        return
+
+    handler = ROUTES.get(scope.get('path')) if scope['type'] == 'http' and scope.get('method') == 'GET' else None
+    if handler is None:
+        return await fallback(scope, receive, send)
+
+    start = time.perf_counter()
+    request = Request(scope)
+    user_id = request.identity()
+    # Each request runs in its own task, so this doesn't leak into others
+    metrics.current_route.set(scope['path'])
+    body = await handler(request, get_db(), user_id) if user_id else None
+    if body is None:
+        return await fallback(scope, receive, send)
+
+    status, etag = 200, None
+    if isinstance(body, Reply):
+        status, etag, body = (304 if body.body is None else 200), body.etag, body.body
+    await send_json(request, send, body, status, etag)
+    labels = (scope['path'], 'GET', str(status))
+    metrics.http_requests.inc(labels)
+    metrics.http_latency.observe(labels, time.perf_counter() - start)
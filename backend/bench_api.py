@@ -0,0 +1,271 @@
+from datetime import date, timedelta
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from bench_login import call, summarize
+
+# Reproducible load test for the hot endpoints. It seeds users with a few
+# weeks of history shaped like frontend/src/utils/seedData.js, then drives a
+# weighted mix of dashboard reads, entry writes, logins and profile updates
+# and prints throughput and p50/p95/p99 per endpoint as JSON.
+#
+# Against a running server (local mongod behind it):
+#   python bench_api.py --base-url http://localhost:5000
+# Or in-process, serving app.py from a thread with throwaway secrets,
+# against a local mongod:
+#   python bench_api.py --mongo-uri mongodb://localhost:27017/fitness_bench
+# The in-memory stand-in (needs mongomock) can't run the dashboard's $lookup
+# sub-pipelines, so it refuses any mix with dashboard reads; it is only
+# good for a quick look at the write paths:
+#   python bench_api.py --mongo mock --mix food_write=25,exercise_write=10,login=10,profile_update=15
+# Keep a report and compare later runs against it to catch regressions:
+#   python bench_api.py --mongo-uri mongodb://localhost:27017/fitness_bench --output baseline.json
+#   python bench_api.py --mongo-uri mongodb://localhost:27017/fitness_bench --compare baseline.json --tolerance 0.2
+
+FOODS = [
+    {'name': 'Oatmeal with Banana', 'calories': 350, 'protein': 12, 'carbs': 65, 'fat': 6, 'mealType': 'breakfast'},
+    {'name': 'Greek Yogurt with Berries', 'calories': 180, 'protein': 15, 'carbs': 20, 'fat': 3, 'mealType': 'breakfast'},
+    {'name': 'Grilled Chicken Salad', 'calories': 420, 'protein': 35, 'carbs': 25, 'fat': 22, 'mealType': 'lunch'},
+    {'name': 'Quinoa Bowl', 'calories': 380, 'protein': 14, 'carbs': 65, 'fat': 8, 'mealType': 'lunch'},
+    {'name': 'Salmon with Sweet Potato', 'calories': 550, 'protein': 42, 'carbs': 45, 'fat': 25, 'mealType': 'dinner'}
+]
+
+EXERCISES = [
+    {'name': 'Morning Jog', 'duration': 30, 'caloriesBurned': 300, 'exerciseType': 'cardio'},
+    {'name': 'Weight Training - Upper Body', 'duration': 45, 'caloriesBurned': 250, 'exerciseType': 'strength'},
+    {'name': 'Yoga Session', 'duration': 60, 'caloriesBurned': 200, 'exerciseType': 'flexibility'},
+    {'name': 'Swimming', 'duration': 40, 'caloriesBurned': 400, 'exerciseType': 'cardio'},
+    {'name': 'HIIT Workout', 'duration': 25, 'caloriesBurned': 350, 'exerciseType': 'cardio'}
+]
+
+DEFAULT_MIX = 'dashboard=40,food_write=25,exercise_write=10,login=10,profile_update=15'
+BENCH_PASSWORD = 'bench-password'
+BATCH_SIZE = 500
+
+def jitter(rng, entry, fields):
+    # Same shape as the seed data, amounts scaled by +-20%
+    scale = rng.uniform(0.8, 1.2)
+    return {**entry, **{field: round(entry[field] * scale) for field in fields}}
+
+def food_entry(rng, day):
+    return {**jitter(rng, rng.choice(FOODS), ['calories', 'protein', 'carbs', 'fat']), 'date': day}
+
+def exercise_entry(rng, day):
+    return {**jitter(rng, rng.choice(EXERCISES), ['duration', 'caloriesBurned']), 'date': day}
+
+def history(rng, days, end_day):
+    food, exercise = [], []
+    for offset in range(days):
+        day = (end_day - timedelta(days=offset)).isoformat()
+        food.extend(food_entry(rng, day) for _ in range(rng.randint(3, 5)))
+        exercise.extend(exercise_entry(rng, day) for _ in range(rng.randint(0, 2)))
+    return food, exercise
+
+def post_batches(base_url, path, entries, token):
+    for start in range(0, len(entries), BATCH_SIZE):
+        status, _ = call(base_url, 'POST', path, entries[start:start + BATCH_SIZE], token=token)
+        if status not in (201, 207):
+            raise SystemExit(f"❌ Seeding {path} failed (HTTP {status})")
+
+def seed_users(base_url, num_users, days, rng, run_id):
+    end_day = date.today()
+    seeded = []
+    for n in range(num_users):
+        user = {
+            'name': f'Bench User {n}',
+            'email': f'bench-{run_id}-{n}@example.com',
+            'password': BENCH_PASSWORD,
+            'weight': rng.randint(55, 95),
+            'height': rng.randint(155, 195),
+            'age': rng.randint(20, 60),
+            'gender': rng.choice(['male', 'female']),
+            'activityLevel': rng.choice(['sedentary', 'light', 'moderate', 'active']),
+            'goal': rng.choice(['lose', 'maintain', 'gain'])
+        }
+        status, body = call(base_url, 'POST', '/api/auth/register', user)
+        if status != 201:
+            raise SystemExit(f"❌ Could not register {user['email']} (HTTP {status})")
+        token = body['access_token']
+        food, exercise = history(rng, days, end_day)
+        post_batches(base_url, '/api/food/batch', food, token)
+        post_batches(base_url, '/api/exercise/batch', exercise, token)
+        seeded.append({'email': user['email'], 'token': token, 'weight': user['weight']})
+    return seeded
+
+def operations(base_url, days):
+    end_day = date.today()
+
+    def any_day(rng):
+        return (end_day - timedelta(days=rng.randrange(days))).isoformat()
+
+    def dashboard(rng, user):
+        status, _ = call(base_url, 'GET', f'/api/dashboard?date={any_day(rng)}', token=user['token'])
+        return status == 200
+
+    def food_write(rng, user):
+        status, _ = call(base_url, 'POST', '/api/food', food_entry(rng, end_day.isoformat()), token=user['token'])
+        return status == 201
+
+    def exercise_write(rng, user):
+        status, _ = call(base_url, 'POST', '/api/exercise', exercise_entry(rng, end_day.isoformat()), token=user['token'])
+        return status == 201
+
+    def login(rng, user):
+        status, _ = call(base_url, 'POST', '/api/auth/login', {'email': user['email'], 'password': BENCH_PASSWORD})
+        return status == 200
+
+    def profile_update(rng, user):
+        weight = round(user['weight'] + rng.uniform(-2, 2), 1)
+        status, _ = call(base_url, 'PUT', '/api/user/profile', {'weight': weight}, token=user['token'])
+        return status == 200
+
+    return {
+        'dashboard': dashboard,
+        'food_write': food_write,
+        'exercise_write': exercise_write,
+        'login': login,
+        'profile_update': profile_update
+    }
+
+def parse_mix(text, known):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in known:
+            raise SystemExit(f"❌ Unknown operation in --mix: {name} (known: {', '.join(known)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+def run(base_url, users, mix, ops, concurrency, duration, seed):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    results = {name: ([], [0]) for name in names}
+    lock = threading.Lock()
+    stop_at = time.monotonic() + duration
+
+    def worker(index):
+        # Each worker has its own generator so a run replays the same sequence
+        rng = random.Random(seed * 1000 + index)
+        while time.monotonic() < stop_at:
+            name = rng.choices(names, weights)[0]
+            user = rng.choice(users)
+            start = time.perf_counter()
+            try:
+                ok = ops[name](rng, user)
+            except OSError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            latencies, errors = results[name]
+            with lock:
+                if ok:
+                    latencies.append(elapsed)
+                else:
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {name: summarize(lat, err[0], duration) for name, (lat, err) in results.items()}
+
+def start_in_process_server(mongo, mongo_uri):
+    # Serve app.py from this process on a free port. The production config
+    # wants real secrets; tokens minted here never leave the process.
+    if mongo_uri:
+        os.environ['MONGO_URI'] = mongo_uri
+    os.environ.setdefault('SECRET_KEY', 'bench-api-in-process-secret-key')
+    os.environ.setdefault('JWT_SECRET_KEY', 'bench-api-in-process-jwt-secret-key')
+    if mongo == 'mock':
+        try:
+            import mongomock
+        except ImportError:
+            raise SystemExit("❌ --mongo mock needs mongomock (pip install mongomock)")
+        import pymongo
+        pymongo.MongoClient = mongomock.MongoClient
+    from werkzeug.serving import make_server
+    import logging
+    import app as app_module
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+def compare(report, baseline, tolerance):
+    # Endpoints whose p95 got slower than the baseline by more than tolerance
+    regressions = []
+    for name, current in report['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if not previous or not previous.get('p95_ms') or not current.get('p95_ms'):
+            continue
+        if current['p95_ms'] > previous['p95_ms'] * (1 + tolerance):
+            regressions.append({'endpoint': name, 'baseline_p95_ms': previous['p95_ms'], 'p95_ms': current['p95_ms']})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Mixed-workload benchmark for the API')
+    parser.add_argument('--base-url', help='benchmark a running server instead of serving app.py in-process')
+    parser.add_argument('--mongo', choices=['local', 'mock'], default='local',
+                        help='in-process only: local uses MONGO_URI, mock uses mongomock')
+    parser.add_argument('--mongo-uri', help='in-process only: overrides MONGO_URI')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--days', type=int, default=30, help='days of history per user')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds')
+    parser.add_argument('--mix', help=f'operation=weight,... (default {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='also write the report to this file')
+    parser.add_argument('--compare', help='baseline report to compare p95 latencies against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 slowdown vs the baseline')
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix or DEFAULT_MIX, operations(None, args.days))
+    if args.mongo == 'mock' and not args.base_url and mix.get('dashboard'):
+        print("❌ mongomock can't run the dashboard's $lookup sub-pipelines. Benchmark against a real "
+              "mongod (--mongo-uri), or pass a --mix without dashboard.")
+        return 1
+    base_url = args.base_url or start_in_process_server(args.mongo, args.mongo_uri)
+    ops = operations(base_url, args.days)
+    rng = random.Random(args.seed)
+
+    seed_start = time.perf_counter()
+    # Fresh emails per run so repeated runs against one database don't collide
+    users = seed_users(base_url, args.users, args.days, rng, f'{args.seed}-{int(time.time())}')
+    seed_seconds = time.perf_counter() - seed_start
+
+    report = {
+        'target': args.base_url or f'in-process ({args.mongo})',
+        'users': args.users,
+        'days': args.days,
+        'concurrency': args.concurrency,
+        'duration_s': args.duration,
+        'seed': args.seed,
+        'mix': mix,
+        'seed_s': round(seed_seconds, 2),
+        'endpoints': run(base_url, users, mix, ops, args.concurrency, args.duration, args.seed)
+    }
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            report['regressions'] = compare(report, json.load(f), args.tolerance)
+        if report['regressions']:
+            exit_code = 1
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    return exit_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+from datetime import date
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+# Measures what a login storm does to the rest of the API: a set of threads
+# log in back to back while another set keeps reading GET /api/food, and
+# both sides report throughput and latency percentiles. Run it against a
+# server started the way production runs it (e.g. gunicorn), e.g.
+#   python bench_login.py --base-url http://localhost:5000 --login-threads 16
+
+BENCH_USER = {
+    'name': 'Bench User',
+    'email': 'bench-login@example.com',
+    'password': 'bench-password',
+    'weight': 70,
+    'height': 175,
+    'age': 30,
+    'gender': 'male',
+    'activityLevel': 'moderate',
+    'goal': 'maintain'
+}
+
+def call(base_url, method, path, body=None, token=None):
+    data = json.dumps(body).encode() if body is not None else None
+    req = urllib.request.Request(base_url + path, data=data, method=method)
+    req.add_header('Content-Type', 'application/json')
+    if token:
+        req.add_header('Authorization', f'Bearer {token}')
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return resp.status, json.loads(resp.read() or b'null')
+    except urllib.error.HTTPError as e:
+        return e.code, None
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 2)
+
+def summarize(latencies, errors, duration):
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / duration, 1),
+        'p50_ms': percentile(latencies, 50),
+        'p95_ms': percentile(latencies, 95),
+        'p99_ms': percentile(latencies, 99)
+    }
+
+def worker(fn, stop_at, latencies, errors, lock):
+    while time.monotonic() < stop_at:
+        start = time.perf_counter()
+        ok = fn()
+        elapsed = time.perf_counter() - start
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors[0] += 1
+
+def run(base_url, login_threads, read_threads, duration):
+    # Make sure the bench user exists and grab a token for the readers
+    call(base_url, 'POST', '/api/auth/register', BENCH_USER)
+    status, body = call(base_url, 'POST', '/api/auth/login',
+                        {'email': BENCH_USER['email'], 'password': BENCH_USER['password']})
+    if status != 200:
+        raise SystemExit(f"❌ Could not log in the bench user (HTTP {status})")
+    token = body['access_token']
+    today = date.today().isoformat()
+
+    def do_login():
+        status, _ = call(base_url, 'POST', '/api/auth/login',
+                         {'email': BENCH_USER['email'], 'password': BENCH_USER['password']})
+        return status == 200
+
+    def do_read():
+        status, _ = call(base_url, 'GET', f'/api/food?date={today}', token=token)
+        return status == 200
+
+    lock = threading.Lock()
+    results = {}
+    threads = []
+    stop_at = time.monotonic() + duration
+    for name, fn, count in (('login', do_login, login_threads), ('food_list', do_read, read_threads)):
+        latencies, errors = [], [0]
+        results[name] = (latencies, errors)
+        for _ in range(count):
+            threads.append(threading.Thread(target=worker, args=(fn, stop_at, latencies, errors, lock)))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return {
+        'base_url': base_url,
+        'duration_s': duration,
+        'login_threads': login_threads,
+        'read_threads': read_threads,
+        'endpoints': {name: summarize(lat, err[0], duration) for name, (lat, err) in results.items()}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Login throughput and its effect on other endpoints')
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--login-threads', type=int, default=8)
+    parser.add_argument('--read-threads', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds')
+    parser.add_argument('--baseline', action='store_true', help='also run the readers alone first for comparison')
+    args = parser.parse_args()
+
+    report = {}
+    if args.baseline:
+        report['baseline'] = run(args.base_url, 0, args.read_threads, args.duration)
+    report['under_login_load'] = run(args.base_url, args.login_threads, args.read_threads, args.duration)
+    print(json.dumps(report, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
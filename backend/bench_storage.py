@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure
+import argparse
+import json
+import random
+import sys
+import time
+
+from bench_api import food_entry
+from bench_login import summarize
+from buckets import migrate, BUCKET_COLLECTIONS, ENTRY_COLLECTIONS
+from indexes import INDEXES
+from repository import EntryRepository, BucketEntryRepository
+
+# Compares the two entry storage layouts on the same data: one document per
+# entry (food_entries) and one bucket per user and day (food_days, see
+# buckets.py). It seeds food entries into a scratch database, copies them
+# into buckets with the migration, then reports storage from collStats and
+# p50/p95/p99 latency of day and month reads, inserts, edits and deletes
+# through each layout's repository, as JSON.
+#
+#   python bench_storage.py --uri mongodb://localhost:27017/fitness_storage_bench --entries 10000000
+#
+# It needs a real mongod: mongomock has no collStats, and its latencies say
+# nothing about a real server's. The collections it uses are dropped
+# first, so point it at a database of its own. Seeding 10M entries takes a
+# while; --skip-seed reuses the data of an earlier run.
+DEFAULT_URI = 'mongodb://localhost:27017/fitness_storage_bench'
+SEED_BATCH_SIZE = 10000
+HISTORY_DAYS = 365
+START_DAY = datetime(2025, 1, 1)
+
+class NoSummaries:
+    # Only the entry layout is measured; both would pay the same rollup $inc
+    def record_change(self, kind, before=None, after=None):
+        pass
+
+    def record_inserted(self, kind, entries):
+        pass
+
+def seed_entries(rng, users, entries):
+    # Food entries for users over HISTORY_DAYS, a varying number per day,
+    # in (user, date) order the way people log them
+    per_day = max(1, round(entries / (users * HISTORY_DAYS)))
+    created = 0
+    while True:
+        for user in range(users):
+            for day in range(HISTORY_DAYS):
+                for _ in range(rng.randint(1, 2 * per_day - 1)):
+                    if created == entries:
+                        return
+                    now = datetime.utcnow()
+                    yield {**food_entry(rng, None), 'user_id': f'bench-user-{user}',
+                           'date': START_DAY + timedelta(days=day), 'created_at': now, 'updated_at': now}
+                    created += 1
+
+def seed(db, rng, users, entries):
+    for name in (ENTRY_COLLECTIONS['food'], BUCKET_COLLECTIONS['food']):
+        db.drop_collection(name)
+        for spec in INDEXES[name]:
+            db[name].create_index(spec['keys'], **{k: v for k, v in spec.items() if k != 'keys'})
+
+    start = time.perf_counter()
+    batch = []
+    for entry in seed_entries(rng, users, entries):
+        batch.append(entry)
+        if len(batch) == SEED_BATCH_SIZE:
+            db[ENTRY_COLLECTIONS['food']].insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db[ENTRY_COLLECTIONS['food']].insert_many(batch, ordered=False)
+    documents_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, buckets = migrate(db, 'food')
+    return {'documents_s': round(documents_s, 2), 'migrate_s': round(time.perf_counter() - start, 2), 'buckets': buckets}
+
+def storage(db, name):
+    stats = db.command('collStats', name)
+    return {field: stats.get(field) for field in ('count', 'size', 'avgObjSize', 'storageSize', 'totalIndexSize')}
+
+def measure(repo, rng, users, samples):
+    # Each operation run samples times, one after another
+    def timed(fn):
+        latencies = []
+        start = time.perf_counter()
+        for _ in range(samples):
+            op_start = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - op_start)
+        return summarize(latencies, 0, time.perf_counter() - start)
+
+    def any_user():
+        return f'bench-user-{rng.randrange(users)}'
+
+    def any_day():
+        return START_DAY + timedelta(days=rng.randrange(HISTORY_DAYS))
+
+    def day_read():
+        day = any_day()
+        repo.find_range(any_user(), day, day + timedelta(days=1) - timedelta(microseconds=1), sort=[('date', 1)])
+
+    def month_read():
+        day = any_day()
+        repo.find_range(any_user(), day, day + timedelta(days=30), sort=[('date', 1), ('_id', 1)])
+
+    written = []
+
+    def insert():
+        now = datetime.utcnow()
+        entry = repo.insert({**food_entry(rng, any_day()), 'user_id': any_user(), 'created_at': now, 'updated_at': now})
+        written.append((entry['user_id'], entry['_id']))
+
+    def update():
+        user_id, entry_id = written[rng.randrange(len(written))]
+        repo.update(user_id, entry_id, {'calories': rng.randrange(100, 800), 'updated_at': datetime.utcnow()})
+
+    def delete():
+        user_id, entry_id = written.pop()
+        repo.delete(user_id, entry_id)
+
+    return {
+        'day_read': timed(day_read),
+        'month_read': timed(month_read),
+        'insert': timed(insert),
+        'update': timed(update),
+        'delete': timed(delete)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Storage and latency of the per-entry and per-day entry layouts')
+    parser.add_argument('--uri', default=DEFAULT_URI, help='a scratch database, its entry collections are dropped')
+    parser.add_argument('--entries', type=int, default=10000000)
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--samples', type=int, default=1000, help='runs of each timed operation')
+    parser.add_argument('--skip-seed', action='store_true', help='reuse the entries of an earlier run')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='also write the report to this file')
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    try:
+        db = client.get_database()
+        if db.name == 'fitness_tracker':
+            print("❌ Refusing to drop entries in fitness_tracker, pass a --uri with a scratch database")
+            return 1
+        rng = random.Random(args.seed)
+        report = {'target': args.uri, 'entries': args.entries,
+                  'users': args.users, 'samples': args.samples, 'seed': args.seed}
+        if not args.skip_seed:
+            report['load'] = seed(db, rng, args.users, args.entries)
+
+        layouts = {
+            'documents': EntryRepository(db[ENTRY_COLLECTIONS['food']], 'food', NoSummaries()),
+            'buckets': BucketEntryRepository(db[BUCKET_COLLECTIONS['food']], 'food', NoSummaries())
+        }
+        for layout, repo in layouts.items():
+            report[layout] = {
+                'storage': storage(db, repo.name),
+                # Same sequence of users and days for both layouts
+                'latency': measure(repo, random.Random(args.seed), args.users, args.samples)
+            }
+    except OperationFailure as e:
+        print(f"❌ MongoDB rejected the operation: {str(e)}")
+        return 1
+    finally:
+        client.close()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
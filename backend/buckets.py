@@ -0,0 +1,288 @@
+from pymongo import MongoClient, ReplaceOne
+from datetime import datetime
+import argparse
+import os
+import sys
+
+# Optional storage layout for entries, selected with ENTRY_STORAGE=buckets:
+# one document per (user_id, day) in food_days / exercise_days, holding the
+# day's entries in an array with their count and totals precomputed.
+#
+#   {user_id, date, entries: [{_id, name, calories, ..., created_at, updated_at}],
+#    count, totals: {calories, protein, ...}, updated_at, written_ids}
+#
+# written_ids lists the _ids of the entries the bucket's last write pushed
+# or edited, so a change stream can tell which entries changed without
+# relying on array positions (see changed_entries).
+#
+# Reading a day is one document from the unique (user_id, date) index
+# instead of N scattered ones, and user_id and date are stored once per day
+# rather than once per entry. Entries keep their ObjectIds and
+# BucketEntryRepository hands out the same documents as the one-document-
+# per-entry layout, so the API doesn't change. Switch after copying the
+# entries over with 'python buckets.py migrate'.
+ENTRY_STORAGE = os.environ.get('ENTRY_STORAGE', 'documents')
+STORAGE_LAYOUTS = ['documents', 'buckets']
+ENTRY_COLLECTIONS = {'food': 'food_entries', 'exercise': 'exercise_entries'}
+BUCKET_COLLECTIONS = {'food': 'food_days', 'exercise': 'exercise_days'}
+
+# Per-bucket totals, kept by $inc on pushes and recomputed with $sum when
+# an entry is edited or removed
+TOTAL_FIELDS = {
+    'food': ['calories', 'protein', 'carbs', 'fat'],
+    'exercise': ['caloriesBurned', 'duration']
+}
+
+# Stored on the bucket, not on its entries
+BUCKET_KEY_FIELDS = ('user_id', 'date')
+
+MIGRATE_BATCH_SIZE = 1000
+
+def numeric(value):
+    # $sum semantics: missing and non-numeric values count as 0
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+def stored_entry(entry):
+    return {field: value for field, value in entry.items() if field not in BUCKET_KEY_FIELDS}
+
+def bucket_entries(bucket):
+    # The bucket's entries as the documents the other layout stores
+    return [{**entry, 'user_id': bucket['user_id'], 'date': bucket['date']} for entry in bucket.get('entries', [])]
+
+def push_update(kind, entries):
+    # Appends entries to their day's bucket; with upsert=True the first
+    # entry of a day creates it
+    return {
+        '$push': {'entries': {'$each': [stored_entry(entry) for entry in entries]}},
+        '$set': {'written_ids': [entry['_id'] for entry in entries]},
+        '$inc': {
+            'count': len(entries),
+            **{f'totals.{field}': sum(numeric(entry.get(field)) for entry in entries) for field in TOTAL_FIELDS[kind]}
+        },
+        '$max': {'updated_at': max(entry.get('updated_at') or datetime.min for entry in entries)}
+    }
+
+def edit_expression(entry_id, fields):
+    # $literal keeps user input such as a name starting with $ from being
+    # read as an expression
+    changes = {field: {'$literal': value} for field, value in fields.items()}
+    return {'$map': {'input': '$entries', 'in': {'$cond': [
+        {'$eq': ['$$this._id', entry_id]},
+        {'$mergeObjects': ['$$this', changes]},
+        '$$this'
+    ]}}}
+
+def remove_expression(entry_id):
+    return {'$filter': {'input': '$entries', 'cond': {'$ne': ['$$this._id', entry_id]}}}
+
+def rewrite_pipeline(kind, entries, updated_at, written_ids):
+    # Pipeline update replacing the entries array, then its count and totals
+    return [
+        {'$set': {'entries': entries, 'written_ids': {'$literal': written_ids}}},
+        {'$set': {
+            'count': {'$size': '$entries'},
+            'totals': {field: {'$sum': f'$entries.{field}'} for field in TOTAL_FIELDS[kind]},
+            'updated_at': {'$max': ['$updated_at', updated_at]}
+        }}
+    ]
+
+def update_pipeline(kind, entry_id, updates):
+    # Edits the entry in place; moving it to another day is a push to the
+    # new bucket and a delete_pipeline on the old one
+    fields = {field: value for field, value in updates.items() if field not in BUCKET_KEY_FIELDS}
+    return rewrite_pipeline(kind, edit_expression(entry_id, fields), updates.get('updated_at') or datetime.utcnow(),
+                            [entry_id])
+
+def delete_pipeline(kind, entry_id):
+    return rewrite_pipeline(kind, remove_expression(entry_id), datetime.utcnow(), [])
+
+def bucket_projection(projection):
+    # Narrows the bucket read to the entry fields an inclusion projection asks for
+    if not projection:
+        return {'_id': 0, 'user_id': 1, 'date': 1, 'entries': 1}
+    # _id is always read, entries are ordered by it
+    fields = {field for field, include in projection.items() if include and field not in BUCKET_KEY_FIELDS}
+    fields.add('_id')
+    return {'_id': 0, 'user_id': 1, 'date': 1, **{f'entries.{field}': 1 for field in fields}}
+
+def project(entry, projection):
+    if not projection:
+        return entry
+    projected = {field: entry[field] for field, include in projection.items()
+                 if include and field != '_id' and field in entry}
+    if projection.get('_id', 1):
+        projected['_id'] = entry['_id']
+    return projected
+
+def matches(doc, query):
+    # Just enough of the query language for the keyset cursor's $or in
+    # pagination.apply_cursor: equality, $gt/$gte/$lt/$lte and $or
+    for field, condition in query.items():
+        if field == '$or':
+            if not any(matches(doc, clause) for clause in condition):
+                return False
+            continue
+        value = doc.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for operator, operand in condition.items():
+            if value is None:
+                return False
+            if operator == '$gt' and not value > operand:
+                return False
+            if operator == '$gte' and not value >= operand:
+                return False
+            if operator == '$lt' and not value < operand:
+                return False
+            if operator == '$lte' and not value <= operand:
+                return False
+    return True
+
+def flatten(buckets, projection=None, extra=None, limit=None):
+    # Entries of buckets read in date order, in (date, _id) order, which is
+    # also the order the (user_id, date, _id) index gives the other layout
+    returned = 0
+    for bucket in buckets:
+        for entry in sorted(bucket_entries(bucket), key=lambda entry: entry['_id']):
+            if extra and not matches(entry, extra):
+                continue
+            yield project(entry, projection)
+            returned += 1
+            if limit and returned >= limit:
+                return
+
+def lookup_pipeline(user_id, start_date, end_date):
+    # The day's entries of one bucket collection, for a $lookup sub-pipeline
+    return [
+        {'$match': {'user_id': user_id, 'date': {'$gte': start_date, '$lte': end_date}}},
+        {'$sort': {'date': 1}},
+        {'$unwind': '$entries'},
+        {'$replaceRoot': {'newRoot': {'$mergeObjects': ['$entries', {'user_id': '$user_id', 'date': '$date'}]}}},
+        {'$sort': {'date': 1, '_id': 1}},
+        {'$addFields': {'_id': {'$toString': '$_id'}}}
+    ]
+
+def changed_entries(change):
+    # (event, entry) for the entries a write to a bucket pushed or edited,
+    # for the change stream behind live events, matched by _id against the
+    # bucket's written_ids. Array positions can't be trusted for this: a
+    # removal shifts every later entry. Removals are published from the
+    # tombstones.
+    bucket = change.get('fullDocument')
+    if not bucket:
+        return []
+    written_ids = set(bucket.get('written_ids') or ())
+    written = [entry for entry in bucket_entries(bucket) if entry['_id'] in written_ids]
+    return [('entry-created' if entry.get('created_at') == entry.get('updated_at') else 'entry-updated', entry)
+            for entry in written]
+
+# Migration from the one-document-per-entry layout
+def build_buckets(kind, entries):
+    # Entries read in (user_id, date, _id) order -> one bucket per run of
+    # the same day, complete when the next day starts
+    bucket = None
+    for entry in entries:
+        key = (entry['user_id'], entry['date'])
+        if bucket is not None and key != (bucket['user_id'], bucket['date']):
+            yield bucket
+            bucket = None
+        if bucket is None:
+            # Copied entries aren't news to anyone, so no written_ids
+            bucket = {'user_id': key[0], 'date': key[1], 'entries': [], 'count': 0,
+                      'totals': {field: 0 for field in TOTAL_FIELDS[kind]}, 'updated_at': datetime.min,
+                      'written_ids': []}
+        bucket['entries'].append(stored_entry(entry))
+        bucket['count'] += 1
+        for field in TOTAL_FIELDS[kind]:
+            bucket['totals'][field] += numeric(entry.get(field))
+        bucket['updated_at'] = max(bucket['updated_at'], entry.get('updated_at') or datetime.min)
+    if bucket is not None:
+        yield bucket
+
+def migrate(db, kind, batch_size=MIGRATE_BATCH_SIZE, user_id=None):
+    # Copies one kind's entries into buckets. Each bucket is written whole
+    # with a replace, so the migration can be rerun after an interruption
+    # or to pick up entries written since. Returns (entries, buckets).
+    source = db[ENTRY_COLLECTIONS[kind]]
+    target = db[BUCKET_COLLECTIONS[kind]]
+    query = {'user_id': user_id} if user_id else {}
+    cursor = source.find(query, batch_size=batch_size).sort([('user_id', 1), ('date', 1), ('_id', 1)])
+    entries = buckets = 0
+    ops = []
+    for bucket in build_buckets(kind, cursor):
+        ops.append(ReplaceOne({'user_id': bucket['user_id'], 'date': bucket['date']}, bucket, upsert=True))
+        entries += bucket['count']
+        buckets += 1
+        if len(ops) == batch_size:
+            target.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        target.bulk_write(ops, ordered=False)
+    return entries, buckets
+
+def layout_counts(db, kind, user_id=None):
+    # {user_id: (entries, total of the kind's first field)} in each layout
+    match = {'user_id': user_id} if user_id else {}
+    field = TOTAL_FIELDS[kind][0]
+    documents = db[ENTRY_COLLECTIONS[kind]].aggregate([
+        {'$match': match},
+        {'$group': {'_id': '$user_id', 'count': {'$sum': 1}, 'total': {'$sum': f'${field}'}}}
+    ], allowDiskUse=True)
+    bucketed = db[BUCKET_COLLECTIONS[kind]].aggregate([
+        {'$match': match},
+        {'$group': {'_id': '$user_id', 'count': {'$sum': {'$size': '$entries'}},
+                    'total': {'$sum': {'$sum': f'$entries.{field}'}}}}
+    ], allowDiskUse=True)
+    return ({row['_id']: (row['count'], row['total']) for row in documents},
+            {row['_id']: (row['count'], row['total']) for row in bucketed})
+
+def verify(db, kind, user_id=None):
+    # [(user_id, documents (count, total), buckets (count, total))] for the
+    # users whose entries differ between the layouts
+    documents, bucketed = layout_counts(db, kind, user_id)
+    mismatches = []
+    for uid in documents.keys() | bucketed.keys():
+        want, got = documents.get(uid, (0, 0)), bucketed.get(uid, (0, 0))
+        if want[0] != got[0] or abs(want[1] - got[1]) > 0.01:
+            mismatches.append((uid, want, got))
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description='Copy entries into the per-user-per-day bucket layout')
+    parser.add_argument('command', choices=['migrate', 'verify'],
+                        help='migrate: write a bucket for every day with entries, verify: compare both layouts')
+    parser.add_argument('--type', choices=list(BUCKET_COLLECTIONS), help='only this kind of entry')
+    parser.add_argument('--user-id', help='Limit to a single user')
+    parser.add_argument('--batch-size', type=int, default=MIGRATE_BATCH_SIZE, help='buckets per bulk write')
+    parser.add_argument('--uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/fitness_tracker'))
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    try:
+        db = client.get_database()
+        kinds = [args.type] if args.type else list(BUCKET_COLLECTIONS)
+        if args.command == 'migrate':
+            for kind in kinds:
+                entries, buckets = migrate(db, kind, args.batch_size, args.user_id)
+                print(f"✅ {kind}: {entries} entries in {buckets} buckets")
+            print("Check with 'python buckets.py verify', then start the app with ENTRY_STORAGE=buckets")
+            return 0
+
+        failed = False
+        for kind in kinds:
+            mismatches = verify(db, kind, args.user_id)
+            for user_id, want, got in mismatches[:50]:
+                print(f"- {kind} {user_id}: entries={want[0]} buckets={got[0]}, totals {want[1]} vs {got[1]}")
+            if mismatches:
+                failed = True
+                print(f"❌ {kind}: {len(mismatches)} users differ, rerun 'python buckets.py migrate'")
+            else:
+                print(f"✅ {kind}: buckets match {ENTRY_COLLECTIONS[kind]}")
+        return 1 if failed else 0
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+
+# A bounded LRU cache with a per-entry TTL. It lives in the worker process:
+# under gunicorn each worker holds its own copy, so a write in one worker
+# only invalidates that worker's entry and the others see it once their
+# copy expires. Keep the TTL short enough that this staleness is acceptable.
+class TTLCache:
+    def __init__(self, max_size=10000, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._reset()
+        # A fork can happen while another thread holds the lock; the child
+        # starts over with a fresh lock and an empty cache
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        # Callers get their own copy so they can't mutate the cached one
+        return dict(value)
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, dict(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxSize': self.max_size,
+                'ttlSeconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hitRatio': round(self.hits / lookups, 3) if lookups else None
+            }
+
+# Serialized user documents (no password or OTP fields), keyed by user id
+profile_cache = TTLCache(
+    max_size=int(os.environ.get('PROFILE_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('PROFILE_CACHE_TTL', 60))
+)
@@ -8,9 +8,28 @@ class Config:
     
     # MongoDB configuration
     MONGO_URI = os.environ.get('MONGO_URI', 'mongodb://localhost:27017/fitness_tracker')
+    MONGO_ENSURE_INDEXES = os.environ.get('MONGO_ENSURE_INDEXES', 'true').lower() == 'true'
+    
+    # Connection pool, per worker process. Size it to the worker's threads
+    # plus the background threads (mail queue, password rehash) that also
+    # talk to Mongo; a request waits at most MONGO_WAIT_QUEUE_TIMEOUT_MS
+    # for a free connection instead of piling up.
+    MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '20'))
+    MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+    MONGO_MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '300000'))
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '2000'))
+    MONGO_CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+    MONGO_SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '20000'))
+    # Comma separated; zstd and snappy need the zstandard / python-snappy packages
+    MONGO_COMPRESSORS = os.environ.get('MONGO_COMPRESSORS', 'zlib')
+    
+    # Reverse proxies in front of the app that append X-Forwarded-For;
+    # 0 means clients connect directly and remote_addr is theirs
+    TRUSTED_PROXY_HOPS = int(os.environ.get('TRUSTED_PROXY_HOPS', '0'))
     
     # JWT configuration
-    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'dev-jwt-secret')
+    JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY', 'dev-secret-key')
     JWT_ACCESS_TOKEN_EXPIRES = 86400  # 24 hours in seconds
 
 class DevelopmentConfig(Config):
@@ -0,0 +1,104 @@
+from pymongo import MongoClient
+import os
+import threading
+
+# Lazily created, fork-safe MongoClient. Nothing connects at import time;
+# the first query in a process creates that process's client, so a
+# gunicorn master that imports the app (preload_app) never hands open
+# sockets or pool state to its workers. A child starts with no client and
+# builds its own pool on first use.
+CLIENT_OPTIONS = {
+    'maxPoolSize': 'MONGO_MAX_POOL_SIZE',
+    'minPoolSize': 'MONGO_MIN_POOL_SIZE',
+    'maxIdleTimeMS': 'MONGO_MAX_IDLE_TIME_MS',
+    'waitQueueTimeoutMS': 'MONGO_WAIT_QUEUE_TIMEOUT_MS',
+    'connectTimeoutMS': 'MONGO_CONNECT_TIMEOUT_MS',
+    'serverSelectionTimeoutMS': 'MONGO_SERVER_SELECTION_TIMEOUT_MS',
+    'socketTimeoutMS': 'MONGO_SOCKET_TIMEOUT_MS',
+    'compressors': 'MONGO_COMPRESSORS',
+}
+
+def client_options(config):
+    # pymongo keyword arguments from a Config class or app.config
+    get = config.get if isinstance(config, dict) else lambda key: getattr(config, key, None)
+    options = {option: get(key) for option, key in CLIENT_OPTIONS.items() if get(key) not in (None, '')}
+    options['appname'] = 'fitness-tracker'
+    return options
+
+class MongoConnection:
+    def __init__(self):
+        self.uri = None
+        self.options = {}
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        # Drops the reference only: closing a client inherited over fork
+        # would touch sockets that belong to the parent
+        self._lock = threading.Lock()
+        self._client = None
+        self._database = None
+        self._collections = {}
+        self._pid = os.getpid()
+
+    def configure(self, uri, **options):
+        self.close()
+        self.uri = uri
+        self.options = options
+
+    @property
+    def client(self):
+        if self._client is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._reset()
+                    return self.client
+                if self._client is None:
+                    self._client = MongoClient(self.uri, **self.options)
+                    self._database = self._client.get_database()
+        return self._client
+
+    @property
+    def database(self):
+        self.client
+        return self._database
+
+    def collection(self, name):
+        collection = self._collections.get(name)
+        if collection is None or self._pid != os.getpid():
+            collection = self._collections[name] = self.database[name]
+        return collection
+
+    def close(self):
+        with self._lock:
+            if self._client is not None and self._pid == os.getpid():
+                self._client.close()
+            self._client = None
+            self._database = None
+            self._collections = {}
+
+class LazyCollection:
+    # Stands in for a pymongo Collection and resolves it on every use, so
+    # repositories can be built before any client exists
+    def __init__(self, connection, name):
+        self.connection = connection
+        self.name = name
+
+    def __getattr__(self, attr):
+        return getattr(self.connection.collection(self.name), attr)
+
+class LazyDatabase:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __getitem__(self, name):
+        return LazyCollection(self.connection, name)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return LazyCollection(self.connection, name)
+
+mongo = MongoConnection()
+db = LazyDatabase(mongo)
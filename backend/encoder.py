@@ -0,0 +1,113 @@
+from bson.objectid import ObjectId
+from datetime import date
+from flask import Response
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import http_date
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON for responses. ObjectId and datetime values are encoded where they
+# are found, so documents straight from Mongo can be returned as they are
+# instead of being copied and patched first. Dates keep Flask's HTTP-date
+# format so clients see the same output whichever provider is active.
+#   JSON_PROVIDER=orjson  (default when orjson is installed)
+#   JSON_PROVIDER=std     (the standard library json module)
+JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'orjson' if orjson else 'std')
+STREAM_CHUNK_BYTES = 64 * 1024
+
+def encode_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, date):
+        return http_date(value)
+    return DefaultJSONProvider.default(value)
+
+class JSONProvider(DefaultJSONProvider):
+    default = staticmethod(encode_value)
+
+    def dumps_bytes(self, obj):
+        # Compact encoding used when streaming
+        return self.dumps(obj, separators=(',', ':')).encode()
+
+class OrjsonProvider(JSONProvider):
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, indent=kwargs.pop('indent', None), **kwargs).decode()
+
+    def dumps_bytes(self, obj, indent=None, **kwargs):
+        # Anything beyond indentation/separators needs the json module
+        kwargs.pop('separators', None)
+        if kwargs:
+            return super().dumps(obj, indent=indent, **kwargs).encode()
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=encode_value, option=option)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+def init_app(app):
+    if JSON_PROVIDER == 'orjson' and orjson is None:
+        print("[WARNING] JSON_PROVIDER=orjson but orjson is not installed; using the json module")
+    provider = OrjsonProvider if JSON_PROVIDER == 'orjson' and orjson is not None else JSONProvider
+    app.json = provider(app)
+
+def chunked(pieces):
+    # Join small encoded pieces into chunks of roughly STREAM_CHUNK_BYTES
+    buffer, size = [], 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= STREAM_CHUNK_BYTES:
+            yield b''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield b''.join(buffer)
+
+def array_pieces(provider, docs):
+    yield b'['
+    for position, doc in enumerate(docs):
+        if position:
+            yield b','
+        yield provider.dumps_bytes(doc)
+    yield b']'
+
+def stream_array(provider, docs):
+    # A JSON array encoded document by document as the cursor yields them,
+    # with the trailing newline jsonify adds
+    def pieces():
+        yield from array_pieces(provider, docs)
+        yield b'\n'
+
+    return Response(chunked(pieces()), mimetype='application/json')
+
+def stream_page(provider, docs, page_size, make_cursor):
+    # {"entries": [...], "nextCursor": ...} from a cursor limited to
+    # page_size + 1 documents; the extra one only signals another page
+    def pieces():
+        last = None
+        has_more = False
+
+        def page():
+            nonlocal last, has_more
+            for position, doc in enumerate(docs):
+                if position == page_size:
+                    has_more = True
+                    break
+                last = doc
+                yield doc
+
+        yield b'{"entries":'
+        yield from array_pieces(provider, page())
+        next_cursor = make_cursor(last) if has_more else None
+        yield b',"nextCursor":' + provider.dumps_bytes(next_cursor) + b'}\n'
+
+    return Response(chunked(pieces()), mimetype='application/json')
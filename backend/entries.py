@@ -0,0 +1,69 @@
+from datetime import datetime
+
+# Entry validation, shared by the single and batch create endpoints and
+# the importer. Each returns (entry, None) or (None, error message).
+def build_food_entry(user_id, data):
+    if not isinstance(data, dict):
+        return None, "Entry must be an object"
+    
+    # Validate required fields
+    required_fields = ['name', 'calories', 'date', 'mealType']
+    for field in required_fields:
+        if field not in data:
+            return None, f"Field '{field}' is required"
+    
+    # Parse date
+    try:
+        entry_date = datetime.strptime(data.get('date'), '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None, "Invalid date format, use YYYY-MM-DD"
+    
+    try:
+        food_entry = {
+            'user_id': user_id,
+            'name': data.get('name'),
+            'calories': int(data.get('calories')),
+            'protein': float(data.get('protein', 0)),
+            'carbs': float(data.get('carbs', 0)),
+            'fat': float(data.get('fat', 0)),
+            'date': entry_date,
+            'mealType': data.get('mealType'),
+            'created_at': datetime.utcnow(),
+            'updated_at': datetime.utcnow()
+        }
+    except (TypeError, ValueError):
+        return None, "Calories and macros must be numbers"
+    
+    return food_entry, None
+
+def build_exercise_entry(user_id, data):
+    if not isinstance(data, dict):
+        return None, "Entry must be an object"
+    
+    # Validate required fields
+    required_fields = ['name', 'duration', 'caloriesBurned', 'date', 'exerciseType']
+    for field in required_fields:
+        if field not in data:
+            return None, f"Field '{field}' is required"
+    
+    # Parse date
+    try:
+        entry_date = datetime.strptime(data.get('date'), '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None, "Invalid date format, use YYYY-MM-DD"
+    
+    try:
+        exercise_entry = {
+            'user_id': user_id,
+            'name': data.get('name'),
+            'duration': int(data.get('duration')),
+            'caloriesBurned': int(data.get('caloriesBurned')),
+            'date': entry_date,
+            'exerciseType': data.get('exerciseType'),
+            'created_at': datetime.utcnow(),
+            'updated_at': datetime.utcnow()
+        }
+    except (TypeError, ValueError):
+        return None, "Duration and calories burned must be numbers"
+    
+    return exercise_entry, None
@@ -0,0 +1,209 @@
+from pymongo.errors import OperationFailure, PyMongoError
+import os
+import queue
+import threading
+import time
+
+from buckets import ENTRY_COLLECTIONS, BUCKET_COLLECTIONS, changed_entries
+
+# Live updates for open dashboards, sent as Server-Sent Events. Writes
+# publish to an in-process broker that hands each message to the
+# subscriptions of that user only. With EVENTS_SOURCE=local (the default)
+# the entry repository listeners and profile handlers publish directly, so
+# only connections on the worker that made the write hear about it; with
+# EVENTS_SOURCE=changestream every worker follows a Mongo change stream
+# instead (needs a replica set, a single-node one is enough locally) and
+# every connection sees every write.
+EVENTS_SOURCE = os.environ.get('EVENTS_SOURCE', 'local')
+SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', 100))
+SSE_MAX_PER_USER = int(os.environ.get('SSE_MAX_PER_USER', 10))
+SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+# Under gunicorn's gthread workers an open stream holds a request thread
+# for as long as the page is open. At most SSE_MAX_THREAD_STREAMS of them
+# per worker, so the rest of the threads keep serving the API; the ASGI
+# server streams without threads and doesn't take a slot.
+# gunicorn.conf.py sets it to a quarter of GUNICORN_THREADS.
+SSE_MAX_THREAD_STREAMS = int(os.environ.get('SSE_MAX_THREAD_STREAMS', 2))
+# Tells EventSource how long to wait before reconnecting
+SSE_RETRY_MS = 3000
+HEARTBEAT = b': ping\n\n'
+PRIVATE_UPDATE_FIELDS = {'password', 'otp', 'otp_expiry'}
+
+_thread_streams = threading.BoundedSemaphore(SSE_MAX_THREAD_STREAMS)
+
+def _reset_thread_streams():
+    # Slots held by threads that didn't survive fork() would never be released
+    global _thread_streams
+    _thread_streams = threading.BoundedSemaphore(SSE_MAX_THREAD_STREAMS)
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_thread_streams)
+
+def take_thread_stream():
+    # False when this worker already has SSE_MAX_THREAD_STREAMS threads streaming
+    return _thread_streams.acquire(blocking=False)
+
+def release_thread_stream():
+    _thread_streams.release()
+
+class Subscription:
+    # One open stream, read by the request thread. A client that falls
+    # SSE_QUEUE_SIZE messages behind is disconnected rather than buffered
+    # for; EventSource reconnects and the page reloads its data.
+    def __init__(self, size=SSE_QUEUE_SIZE):
+        self.queue = queue.Queue(size)
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            with self.queue.mutex:
+                self.queue.queue.clear()
+            self.queue.put_nowait(None)
+
+    def messages(self, heartbeat=SSE_HEARTBEAT_SECONDS):
+        # Yields messages, or HEARTBEAT after heartbeat idle seconds, until
+        # the subscription is closed
+        while True:
+            try:
+                message = self.queue.get(timeout=heartbeat)
+            except queue.Empty:
+                yield HEARTBEAT
+                continue
+            if message is None:
+                return
+            yield message
+
+class EventBroker:
+    def __init__(self, dumps=None):
+        self.dumps = dumps
+        self.on_first_subscribe = None
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self.published = 0
+        self.started = False
+
+    def subscribe(self, user_id, subscription):
+        # False when the user already has SSE_MAX_PER_USER streams open
+        with self._lock:
+            subscribers = self._subscribers.setdefault(user_id, [])
+            if len(subscribers) >= SSE_MAX_PER_USER:
+                return False
+            subscribers.append(subscription)
+            start, self.started = not self.started, True
+        if start and self.on_first_subscribe:
+            self.on_first_subscribe()
+        return True
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id, [])
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+            if not subscribers:
+                self._subscribers.pop(user_id, None)
+
+    def publish(self, user_id, event, data):
+        # Encoded once, however many streams the user has open
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        if not subscribers:
+            return
+        message = b'event: ' + event.encode() + b'\ndata: ' + self.dumps(data) + b'\n\n'
+        for subscription in subscribers:
+            subscription.deliver(message)
+        self.published += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'users': len(self._subscribers),
+                'connections': sum(len(s) for s in self._subscribers.values()),
+                'published': self.published
+            }
+
+broker = EventBroker()
+
+def stream_open():
+    return b'retry: ' + str(SSE_RETRY_MS).encode() + b'\n' + HEARTBEAT
+
+def publish_entry_change(kind, before=None, after=None):
+    if after is None:
+        broker.publish(before['user_id'], 'entry-deleted',
+                       {'kind': kind, '_id': before['_id'], 'date': before['date']})
+    else:
+        broker.publish(after['user_id'], 'entry-updated' if before is not None else 'entry-created',
+                       {'kind': kind, 'entry': after})
+
+def entry_listener(kind):
+    # EntryRepository listener for EVENTS_SOURCE=local
+    def entry_changed(before=None, after=None):
+        publish_entry_change(kind, before, after)
+    return entry_changed
+
+def publish_profile(user_id, profile):
+    broker.publish(user_id, 'profile-changed', {'profile': profile})
+
+class ChangeStreamSource:
+    # Follows inserts and updates of the entry collections, deletes through
+    # their tombstones (a delete event alone doesn't say whose entry it
+    # was) and profile updates, on one thread per worker, resuming after
+    # errors from the last event it handled
+    COLLECTIONS = {name: kind for kind, name in ENTRY_COLLECTIONS.items()}
+    BUCKETS = {name: kind for kind, name in BUCKET_COLLECTIONS.items()}
+
+    def __init__(self, get_database, public_user):
+        self.get_database = get_database
+        self.public_user = public_user
+        self.resume_token = None
+
+    def start(self):
+        threading.Thread(target=self.run, name='event-change-stream', daemon=True).start()
+
+    def pipeline(self):
+        return [{'$match': {'$or': [
+            {'ns.coll': {'$in': list(self.COLLECTIONS) + list(self.BUCKETS)},
+             'operationType': {'$in': ['insert', 'update', 'replace']}},
+            {'ns.coll': 'tombstones', 'operationType': 'insert'},
+            {'ns.coll': 'users', 'operationType': {'$in': ['update', 'replace']}}
+        ]}}]
+
+    def handle(self, change):
+        collection = change['ns']['coll']
+        document = change.get('fullDocument')
+        if collection == 'tombstones':
+            broker.publish(document['user_id'], 'entry-deleted',
+                           {'kind': document['kind'], '_id': document['entry_id'], 'date': document.get('date')})
+        elif collection == 'users':
+            updated = set(change.get('updateDescription', {}).get('updatedFields', {}))
+            if document and not (updated and updated <= PRIVATE_UPDATE_FIELDS):
+                publish_profile(str(document['_id']), self.public_user(document))
+        elif collection in self.BUCKETS:
+            for event, entry in changed_entries(change):
+                broker.publish(entry['user_id'], event, {'kind': self.BUCKETS[collection], 'entry': entry})
+        elif document:
+            event = 'entry-created' if change['operationType'] == 'insert' else 'entry-updated'
+            broker.publish(document['user_id'], event, {'kind': self.COLLECTIONS[collection], 'entry': document})
+
+    def run(self):
+        backoff = 1
+        while True:
+            try:
+                with self.get_database().watch(self.pipeline(), full_document='updateLookup',
+                                               resume_after=self.resume_token) as stream:
+                    backoff = 1
+                    for change in stream:
+                        self.resume_token = stream.resume_token
+                        self.handle(change)
+            except PyMongoError as e:
+                if isinstance(e, OperationFailure) and e.code == 286:
+                    # ChangeStreamHistoryLost: the oplog moved past our token
+                    self.resume_token = None
+                print(f"[WARNING] Change stream for live events failed, retrying in {backoff}s: {str(e)}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60)
@@ -0,0 +1,115 @@
+from bson import json_util
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pymongo import MongoClient
+import argparse
+import csv
+import heapq
+import io
+import os
+import sys
+
+from repository import PRIVATE_USER_FIELDS
+
+# Exports are generator pipelines from cursor to response: one document is
+# turned into one line and handed on, so memory stays flat no matter how
+# long the history is.
+EXPORT_FORMATS = ['ndjson', 'csv']
+FOOD_EXPORT_FIELDS = ['name', 'mealType', 'calories', 'protein', 'carbs', 'fat']
+EXERCISE_EXPORT_FIELDS = ['name', 'exerciseType', 'duration', 'caloriesBurned']
+CSV_COLUMNS = ['type', 'date', 'name', 'mealType', 'calories', 'protein', 'carbs', 'fat',
+               'exerciseType', 'duration', 'caloriesBurned']
+FOOD_EXPORT_PROJECTION = {'_id': 0, 'date': 1, **{field: 1 for field in FOOD_EXPORT_FIELDS}}
+EXERCISE_EXPORT_PROJECTION = {'_id': 0, 'date': 1, **{field: 1 for field in EXERCISE_EXPORT_FIELDS}}
+
+# Bounds for an export without from/to
+EARLIEST_DATE = datetime(1970, 1, 1)
+LATEST_DATE = datetime(9999, 12, 31, 23, 59, 59)
+
+def export_rows(food_docs, exercise_docs):
+    # Both cursors come back in date order, so merging them gives one
+    # chronological stream without holding either in memory
+    def rows(kind, docs, fields):
+        for doc in docs:
+            row = {'type': kind, 'date': doc['date'].strftime('%Y-%m-%d')}
+            for field in fields:
+                row[field] = doc.get(field)
+            yield row
+
+    return heapq.merge(
+        rows('food', food_docs, FOOD_EXPORT_FIELDS),
+        rows('exercise', exercise_docs, EXERCISE_EXPORT_FIELDS),
+        key=lambda row: row['date']
+    )
+
+def ndjson_lines(rows, dumps):
+    for row in rows:
+        yield dumps(row) + b'\n'
+
+def csv_lines(rows):
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    # The header alone when there were no rows
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+# Admin export of whole collections as extended JSON, one file per batch of
+# _ids so several batches can be written at once
+def batch_bounds(collection, batch_size):
+    # Every batch_size-th _id, read from the _id index only
+    bounds = []
+    for position, doc in enumerate(collection.find({}, {'_id': 1}).sort('_id', 1)):
+        if position % batch_size == 0:
+            bounds.append(doc['_id'])
+    return [(low, bounds[i + 1] if i + 1 < len(bounds) else None) for i, low in enumerate(bounds)]
+
+def export_batch(collection, low, high, path):
+    query = {'_id': {'$gte': low, **({'$lt': high} if high is not None else {})}}
+    projection = {field: 0 for field in PRIVATE_USER_FIELDS} if collection.name == 'users' else None
+    count = 0
+    with open(path, 'w') as f:
+        for doc in collection.find(query, projection).sort('_id', 1):
+            f.write(json_util.dumps(doc) + '\n')
+            count += 1
+    return count
+
+def export_collection(db, collection_name, out_dir, batch_size, workers):
+    collection = db[collection_name]
+    batches = batch_bounds(collection, batch_size)
+    paths = [os.path.join(out_dir, f'{collection_name}.{n:05d}.ndjson') for n in range(len(batches))]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        counts = pool.map(lambda args: export_batch(collection, *args),
+                          [(low, high, path) for (low, high), path in zip(batches, paths)])
+        return sum(counts), len(paths)
+
+def main():
+    parser = argparse.ArgumentParser(description='Export whole collections as NDJSON (MongoDB extended JSON)')
+    parser.add_argument('collections', nargs='*', default=['food_entries', 'exercise_entries'])
+    parser.add_argument('--out-dir', default='export')
+    parser.add_argument('--batch-size', type=int, default=50000, help='documents per output file')
+    parser.add_argument('--workers', type=int, default=4, help='batches written at the same time')
+    parser.add_argument('--uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/fitness_tracker'))
+    args = parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    client = MongoClient(args.uri)
+    try:
+        db = client.get_database()
+        for collection_name in args.collections:
+            count, files = export_collection(db, collection_name, args.out_dir, args.batch_size, args.workers)
+            print(f"✅ {collection_name}: {count} documents in {files} files")
+        return 0
+    except Exception as e:
+        print(f"❌ Export failed: {str(e)}")
+        return 1
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,47 @@
+import numpy as np
+
+# Calorie goal formulas, shared by the profile handlers (one user at a
+# time) and recompute_goals.py (whole batches as arrays). The array
+# versions do the same float operations in the same order, so both give
+# identical goals; change the constants here and rerun recompute_goals.py.
+# Revised Harris-Benedict: base + w * kg + h * cm - a * years
+BMR_COEFFICIENTS = {
+    'male': (88.362, 13.397, 4.799, 5.677),
+    'female': (447.593, 9.247, 3.098, 4.330)
+}
+ACTIVITY_MULTIPLIERS = {
+    'sedentary': 1.2,
+    'light': 1.375,
+    'moderate': 1.55,
+    'active': 1.725,
+    'veryActive': 1.9
+}
+DEFAULT_ACTIVITY_MULTIPLIER = 1.2
+GOAL_ADJUSTMENTS = {
+    'lose': -500,    # Deficit for weight loss
+    'maintain': 0,   # Maintenance
+    'gain': 500      # Surplus for weight gain
+}
+
+def calculate_bmr(weight, height, age, gender):
+    # Anything but 'male' uses the female coefficients
+    base, per_kg, per_cm, per_year = BMR_COEFFICIENTS['male' if gender == 'male' else 'female']
+    return base + (per_kg * weight) + (per_cm * height) - (per_year * age)
+
+def calculate_tdee(bmr, activity_level):
+    return bmr * ACTIVITY_MULTIPLIERS.get(activity_level, DEFAULT_ACTIVITY_MULTIPLIER)
+
+def calculate_calorie_goal(tdee, goal):
+    return tdee + GOAL_ADJUSTMENTS.get(goal, 0)
+
+def calorie_goals(weight, height, age, genders, activity_levels, goals):
+    # Rounded calorie goals for whole columns at once; weight, height and
+    # age are float arrays, the rest sequences of the stored strings
+    male = np.fromiter((gender == 'male' for gender in genders), dtype=bool, count=len(weight))
+    coefficients = np.where(male[:, None], BMR_COEFFICIENTS['male'], BMR_COEFFICIENTS['female'])
+    bmr = coefficients[:, 0] + (coefficients[:, 1] * weight) + (coefficients[:, 2] * height) - (coefficients[:, 3] * age)
+    multipliers = np.fromiter((ACTIVITY_MULTIPLIERS.get(level, DEFAULT_ACTIVITY_MULTIPLIER) for level in activity_levels),
+                              dtype=np.float64, count=len(weight))
+    adjustments = np.fromiter((GOAL_ADJUSTMENTS.get(goal, 0) for goal in goals), dtype=np.float64, count=len(weight))
+    # np.round rounds halves to even, like round() in the handlers
+    return np.round(bmr * multipliers + adjustments).astype(np.int64)
@@ -0,0 +1,45 @@
+import multiprocessing
+import os
+
+# Production serving:
+#   gunicorn app:app
+# gunicorn reads this file from the working directory. The app is imported
+# once in the master (preload_app) and forked into the workers, so they
+# boot without re-importing anything; no Mongo connection exists until a
+# worker's first query, and each worker then owns its own pool.
+os.environ.setdefault('FLASK_CONFIG', 'production')
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+preload_app = True
+
+# One connection per request thread, plus headroom for the mail queue and
+# password rehash threads; a larger pool would only hold idle sockets
+os.environ.setdefault('MONGO_MAX_POOL_SIZE', str(threads + 4))
+
+# Recycle workers now and then so slow leaks can't build up, staggered so
+# they don't all restart (and reconnect) at once
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '500'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = 30
+keepalive = 5
+
+# Each open /api/events stream holds one of the threads; keep most of
+# them for the API (see events.py)
+os.environ.setdefault('SSE_MAX_THREAD_STREAMS', str(max(1, threads // 4)))
+
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+# The default format with the path instead of the request line: EventSource
+# sends its token as ?jwt=, which must not end up in the logs
+access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(m)s %(U)s %(H)s" %(s)s %(b)s "%(f)s" "%(a)s"'
+
+def on_starting(server):
+    # Indexes once for the whole deployment, from the master. The master's
+    # client is closed again before any worker is forked.
+    from app import app, create_indexes
+    from db import mongo
+    create_indexes(app)
+    mongo.close()
@@ -0,0 +1,56 @@
+from werkzeug.security import generate_password_hash, check_password_hash
+import os
+import threading
+
+# Password hashing is slow on purpose. werkzeug's pbkdf2 runs in hashlib,
+# which releases the GIL while it hashes, so other request threads keep
+# running without handing the work to another process. What a burst of
+# logins can still do is put every core to work on hashes at once; at most
+# HASH_CONCURRENCY hashes run at a time in each worker process, and the
+# rest wait their turn. gunicorn already runs about two workers per core,
+# so the default of 1 keeps hashing to roughly the number of cores.
+# HASH_CONCURRENCY=0 doesn't limit it at all.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+PASSWORD_SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', 16))
+HASH_CONCURRENCY = int(os.environ.get('HASH_CONCURRENCY', 1))
+
+_slots = threading.BoundedSemaphore(HASH_CONCURRENCY) if HASH_CONCURRENCY > 0 else None
+
+def _reset_slots():
+    # A semaphore held by a thread that didn't survive fork() would never be released
+    global _slots
+    _slots = threading.BoundedSemaphore(HASH_CONCURRENCY) if HASH_CONCURRENCY > 0 else None
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_slots)
+
+def run_hashing(fn, *args):
+    if _slots is None:
+        return fn(*args)
+    with _slots:
+        return fn(*args)
+
+def hash_password(password):
+    return run_hashing(generate_password_hash, password, PASSWORD_HASH_METHOD, PASSWORD_SALT_LENGTH)
+
+def verify_password(password_hash, password):
+    if not password_hash or password is None:
+        return False
+    return run_hashing(check_password_hash, password_hash, password)
+
+def needs_rehash(password_hash):
+    # Stored hashes look like "pbkdf2:sha256:260000$salt$hash"; anything made
+    # with a different method or iteration count gets upgraded on next login
+    return password_hash.split('$', 1)[0] != PASSWORD_HASH_METHOD
+
+def rehash_in_background(password, on_done):
+    # Fire-and-forget upgrade of an outdated hash; on_done gets the new hash
+    def rehash():
+        try:
+            new_hash = hash_password(password)
+        except Exception as e:
+            print(f"[WARNING] Password rehash failed: {e}")
+            return
+        on_done(new_hash)
+
+    threading.Thread(target=rehash, name='password-rehash', daemon=True).start()
@@ -0,0 +1,187 @@
+from pymongo import MongoClient
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+
+from entries import build_food_entry, build_exercise_entry
+from repository import UserRepository, SummaryRepository, entry_repository
+
+# Bulk import of entries from CSV or NDJSON, e.g. a file written by
+# /api/export or converted from another tracker. Rows are read one at a
+# time and written in insert_many batches, so memory stays flat however
+# big the file is. A row is skipped as a duplicate when the user already
+# has an entry with the same date, name and meal/exercise type.
+IMPORT_FORMATS = ['csv', 'ndjson']
+ENTRY_KINDS = ['food', 'exercise']
+DEFAULT_BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 1000
+
+ENTRY_BUILDERS = {'food': build_food_entry, 'exercise': build_exercise_entry}
+DUPLICATE_KEYS = {
+    'food': ('date', 'name', 'mealType'),
+    'exercise': ('date', 'name', 'exerciseType')
+}
+
+def text_stream(binary):
+    # Decode an upload lazily; csv needs newline='' to handle quoted newlines
+    return io.TextIOWrapper(binary, encoding='utf-8', errors='replace', newline='')
+
+def parse_rows(text, import_format):
+    # Yields (row number, row dict or None, error or None)
+    if import_format == 'csv':
+        reader = csv.DictReader(text)
+        try:
+            for row in reader:
+                # Empty cells count as missing, so optional fields get defaults
+                yield reader.line_num, {k: v for k, v in row.items() if k and v not in ('', None)}, None
+        except csv.Error as e:
+            yield reader.line_num, None, f"Invalid CSV: {str(e)}"
+        return
+
+    for line_number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield line_number, None, "Invalid JSON"
+            continue
+        if not isinstance(row, dict):
+            yield line_number, None, "Each line must be a JSON object"
+            continue
+        yield line_number, row, None
+
+class EntryImporter:
+    def __init__(self, repos, user_id, default_kind=None, batch_size=DEFAULT_BATCH_SIZE):
+        # repos: {'food': EntryRepository, 'exercise': EntryRepository}
+        self.repos = repos
+        self.user_id = user_id
+        self.default_kind = default_kind
+        self.batch_size = batch_size
+        self.pending = {kind: [] for kind in ENTRY_KINDS}
+        self.created = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'error': message})
+
+    def add(self, row_number, row):
+        # A 'type' column (as written by the export) picks the collection
+        kind = row.pop('type', None) or self.default_kind
+        if kind not in ENTRY_KINDS:
+            self.error(row_number, f"Row type must be one of: {', '.join(ENTRY_KINDS)}")
+            return
+        entry, error = ENTRY_BUILDERS[kind](self.user_id, row)
+        if error:
+            self.error(row_number, error)
+            return
+        self.pending[kind].append((row_number, entry))
+        if len(self.pending[kind]) >= self.batch_size:
+            self.flush(kind)
+
+    def flush(self, kind):
+        batch, self.pending[kind] = self.pending[kind], []
+        if not batch:
+            return
+        repo = self.repos[kind]
+        key_fields = DUPLICATE_KEYS[kind]
+        seen = repo.existing_keys(self.user_id, [entry for _, entry in batch], key_fields)
+
+        new = []
+        for row_number, entry in batch:
+            key = tuple(entry.get(field) for field in key_fields)
+            if key in seen:
+                self.duplicates += 1
+                continue
+            seen.add(key)
+            new.append((row_number, entry))
+        if not new:
+            return
+
+        failed = repo.insert_many([entry for _, entry in new])
+        for position, (row_number, _) in enumerate(new):
+            if position in failed:
+                self.error(row_number, failed[position])
+        self.created += len(new) - len(failed)
+
+    def run(self, rows):
+        for row_number, row, error in rows:
+            if error:
+                self.error(row_number, error)
+            else:
+                self.add(row_number, row)
+        for kind in ENTRY_KINDS:
+            self.flush(kind)
+        return self.report()
+
+    def report(self):
+        return {
+            'created': self.created,
+            'duplicates': self.duplicates,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errorsTruncated': self.failed > len(self.errors)
+        }
+
+def detect_format(filename, content_type=None):
+    name = (filename or '').lower()
+    if name.endswith('.csv') or (content_type or '').startswith('text/csv'):
+        return 'csv'
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in (content_type or ''):
+        return 'ndjson'
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(description='Import food and exercise entries for one user')
+    parser.add_argument('file')
+    user = parser.add_mutually_exclusive_group(required=True)
+    user.add_argument('--user-id')
+    user.add_argument('--email')
+    parser.add_argument('--format', choices=IMPORT_FORMATS, help='default: from the file extension')
+    parser.add_argument('--type', choices=ENTRY_KINDS, help='for files without a type column')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/fitness_tracker'))
+    args = parser.parse_args()
+
+    import_format = args.format or detect_format(args.file)
+    if not import_format:
+        print("❌ Could not tell the format from the file name, pass --format")
+        return 1
+
+    client = MongoClient(args.uri)
+    try:
+        db = client.get_database()
+        user_id = args.user_id
+        if args.email:
+            found = UserRepository(db.users).find_by_email(args.email)
+            if not found:
+                print(f"❌ No user with email {args.email}")
+                return 1
+            user_id = str(found['_id'])
+
+        summaries = SummaryRepository(db.daily_summaries)
+        repos = {
+            'food': entry_repository(db, 'food', summaries),
+            'exercise': entry_repository(db, 'exercise', summaries)
+        }
+        importer = EntryImporter(repos, user_id, args.type, args.batch_size)
+        with open(args.file, newline='', encoding='utf-8') as f:
+            report = importer.run(parse_rows(f, import_format))
+
+        for error in report['errors'][:50]:
+            print(f"- row {error['row']}: {error['error']}")
+        print(f"{'✅' if not report['failed'] else '❌'} {report['created']} created, "
+              f"{report['duplicates']} duplicates skipped, {report['failed']} failed")
+        return 0 if not report['failed'] else 1
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
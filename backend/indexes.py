@@ -0,0 +1,156 @@
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, MongoClient
+from pymongo.errors import OperationFailure
+from datetime import datetime
+import argparse
+import os
+import sys
+
+from sync import TOMBSTONE_RETENTION_DAYS
+
+# Every index the app relies on, per collection. Names are fixed so that
+# re-applying the set is a no-op instead of creating duplicates. The
+# trailing _id on the entry indexes lets keyset pages on (date, _id) walk
+# the index in order without an in-memory sort.
+INDEXES = {
+    'users': [
+        {'keys': [('email', ASCENDING)], 'name': 'email_unique', 'unique': True},
+    ],
+    'food_entries': [
+        {'keys': [('user_id', ASCENDING), ('date', ASCENDING), ('_id', ASCENDING)], 'name': 'user_id_date_id'},
+        {'keys': [('user_id', ASCENDING), ('updated_at', ASCENDING)], 'name': 'user_id_updated_at'},
+    ],
+    'exercise_entries': [
+        {'keys': [('user_id', ASCENDING), ('date', ASCENDING), ('_id', ASCENDING)], 'name': 'user_id_date_id'},
+        {'keys': [('user_id', ASCENDING), ('updated_at', ASCENDING)], 'name': 'user_id_updated_at'},
+    ],
+    # The bucket layout (buckets.py): one document per user and day, found
+    # by an entry _id for edits and deletes, and by updated_at for sync
+    'food_days': [
+        {'keys': [('user_id', ASCENDING), ('date', ASCENDING)], 'name': 'user_id_date_unique', 'unique': True},
+        {'keys': [('user_id', ASCENDING), ('entries._id', ASCENDING)], 'name': 'user_id_entries_id'},
+        {'keys': [('user_id', ASCENDING), ('updated_at', ASCENDING)], 'name': 'user_id_updated_at'},
+    ],
+    'exercise_days': [
+        {'keys': [('user_id', ASCENDING), ('date', ASCENDING)], 'name': 'user_id_date_unique', 'unique': True},
+        {'keys': [('user_id', ASCENDING), ('entries._id', ASCENDING)], 'name': 'user_id_entries_id'},
+        {'keys': [('user_id', ASCENDING), ('updated_at', ASCENDING)], 'name': 'user_id_updated_at'},
+    ],
+    'tombstones': [
+        {'keys': [('user_id', ASCENDING), ('deleted_at', ASCENDING)], 'name': 'user_id_deleted_at'},
+        {'keys': [('deleted_at', ASCENDING)], 'name': 'deleted_at_ttl',
+         'expireAfterSeconds': TOMBSTONE_RETENTION_DAYS * 86400},
+    ],
+    'otps': [
+        # expireAfterSeconds=0: each code is removed at its own expires_at
+        {'keys': [('expires_at', ASCENDING)], 'name': 'expires_at_ttl', 'expireAfterSeconds': 0},
+    ],
+    'daily_summaries': [
+        {'keys': [('user_id', ASCENDING), ('date', ASCENDING)], 'name': 'user_id_date_unique', 'unique': True},
+    ],
+}
+
+# Indexes we used to create and that are now covered by a declared one
+RETIRED_INDEXES = {
+    'food_entries': ['user_id_date'],
+    'exercise_entries': ['user_id_date'],
+}
+
+def ensure_indexes(db):
+    # create_index is idempotent for an identical spec, so this is safe to
+    # run on every start. One failing spec (say duplicate emails blocking
+    # email_unique) doesn't stop the rest; failures are returned as
+    # (collection, index name, error) for the caller to decide.
+    created, failures = [], []
+    for collection_name, specs in INDEXES.items():
+        for spec in specs:
+            options = {k: v for k, v in spec.items() if k != 'keys'}
+            try:
+                created.append((collection_name, db[collection_name].create_index(spec['keys'], **options)))
+            except Exception as e:
+                failures.append((collection_name, spec['name'], e))
+    for collection_name, names in RETIRED_INDEXES.items():
+        try:
+            existing = db[collection_name].index_information()
+            for name in names:
+                if name in existing:
+                    db[collection_name].drop_index(name)
+        except Exception as e:
+            failures.append((collection_name, ', '.join(names), e))
+    return created, failures
+
+# The queries that run on every request. Each one must be answered from an
+# index; a COLLSCAN here means latency grows with the size of the collection.
+def hot_queries(db):
+    sample_user_id = '000000000000000000000000'
+    day_start = datetime(2025, 1, 1)
+    day_end = datetime(2025, 1, 1, 23, 59, 59, 999999)
+    day_query = {'user_id': sample_user_id, 'date': {'$gte': day_start, '$lte': day_end}}
+    range_query = {'user_id': sample_user_id, 'date': {'$gte': day_start, '$lte': datetime(2025, 3, 31)}}
+    return [
+        ('users by email', db.users.find({'email': 'someone@example.com'}).limit(1)),
+        ('food_entries by user and day', db.food_entries.find(day_query).sort('date', ASCENDING)),
+        ('exercise_entries by user and day', db.exercise_entries.find(day_query).sort('date', ASCENDING)),
+        ('food_entries range page', db.food_entries.find(range_query).sort([('date', ASCENDING), ('_id', ASCENDING)]).limit(101)),
+        ('food_entries changed since', db.food_entries.find({'user_id': sample_user_id, 'updated_at': {'$gt': day_start}}).sort('updated_at', ASCENDING)),
+        ('food_days by user and range', db.food_days.find(range_query).sort('date', ASCENDING)),
+        ('food_days by entry', db.food_days.find({'user_id': sample_user_id, 'entries._id': ObjectId()}).limit(1)),
+    ]
+
+def plan_stages(plan):
+    # Walk the winning plan tree and yield every stage name in it
+    if not plan:
+        return
+    stage = plan.get('stage')
+    if stage:
+        yield stage
+    if 'queryPlan' in plan:
+        yield from plan_stages(plan['queryPlan'])
+    if 'inputStage' in plan:
+        yield from plan_stages(plan['inputStage'])
+    for child in plan.get('inputStages', []):
+        yield from plan_stages(child)
+
+def check_query_plans(db):
+    failures = []
+    for label, cursor in hot_queries(db):
+        explain = cursor.explain()
+        stages = list(plan_stages(explain.get('queryPlanner', {}).get('winningPlan', {})))
+        status = 'COLLSCAN' if 'COLLSCAN' in stages else 'ok'
+        print(f"{label}: {' <- '.join(stages)} [{status}]")
+        if status != 'ok':
+            failures.append(label)
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage MongoDB indexes for the fitness tracker')
+    parser.add_argument('command', choices=['apply', 'check'],
+                        help='apply: create the declared indexes, check: fail if a hot query does a COLLSCAN')
+    parser.add_argument('--uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/fitness_tracker'))
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    try:
+        db = client.get_database()
+        if args.command == 'apply':
+            created, failures = ensure_indexes(db)
+            for collection_name, index_name in created:
+                print(f"✅ {collection_name}.{index_name}")
+            for collection_name, index_name, error in failures:
+                print(f"❌ {collection_name}.{index_name}: {str(error)}")
+            return 1 if failures else 0
+
+        failures = check_query_plans(db)
+        if failures:
+            print(f"❌ {len(failures)} hot queries fall back to COLLSCAN: {', '.join(failures)}")
+            return 1
+        print("✅ All hot queries use an index")
+        return 0
+    except OperationFailure as e:
+        print(f"❌ MongoDB rejected the operation: {str(e)}")
+        return 1
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,164 @@
+from datetime import datetime
+import json
+import os
+import queue
+import smtplib
+import threading
+import time
+import traceback
+
+from otp_utils import open_smtp_connection
+
+MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE', 1000))
+MAIL_MAX_ATTEMPTS = int(os.environ.get('MAIL_MAX_ATTEMPTS', 4))
+MAIL_RETRY_BACKOFF = float(os.environ.get('MAIL_RETRY_BACKOFF', 1.0))  # seconds, doubled per attempt
+# Most providers drop a connection that sits idle; close ours first
+SMTP_IDLE_TIMEOUT = float(os.environ.get('SMTP_IDLE_TIMEOUT', 60))
+MAIL_DEAD_LETTER_PATH = os.environ.get('MAIL_DEAD_LETTER_PATH', 'mail_dead_letter.log')
+
+# Failures that will repeat on retry (a rejected address, bad credentials).
+# Everything else raised while sending, including a dropped connection, is
+# an OSError and gets a fresh connection and another attempt.
+PERMANENT_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPAuthenticationError,
+    smtplib.SMTPNotSupportedError,
+)
+
+class SMTPSession:
+    # One long-lived SMTP connection, reopened on demand
+    def __init__(self, connect=open_smtp_connection):
+        self._connect = connect
+        self._server = None
+
+    def send(self, msg):
+        if self._server is None:
+            self._server = self._connect()
+        try:
+            self._server.send_message(msg)
+        except PERMANENT_ERRORS:
+            raise
+        except OSError:
+            # The server may have dropped us since the last send
+            self.close()
+            raise
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+class MailQueue:
+    # Hands messages to a single background thread so request handlers
+    # return as soon as the message is queued. The thread is started lazily
+    # and again after a fork, since threads don't survive into the child.
+    def __init__(self, session_factory=SMTPSession, max_size=MAIL_QUEUE_SIZE,
+                 max_attempts=MAIL_MAX_ATTEMPTS, backoff=MAIL_RETRY_BACKOFF,
+                 idle_timeout=SMTP_IDLE_TIMEOUT, dead_letter_path=MAIL_DEAD_LETTER_PATH):
+        self.session_factory = session_factory
+        self.max_size = max_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.dead_letter_path = dead_letter_path
+        self._start_lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+        self.sent = 0
+        self.failed = 0
+
+    def _ensure_worker(self):
+        if self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._queue = queue.Queue(maxsize=self.max_size)
+            self._thread = threading.Thread(target=self._run, name='mail-queue', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def enqueue(self, msg):
+        # False when the queue is full, so the caller can shed load
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(msg)
+            return True
+        except queue.Full:
+            return False
+
+    def wait_until_idle(self, timeout=None):
+        # For tests and shutdown: block until everything queued was handled
+        if self._queue is None:
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def _run(self):
+        session = self.session_factory()
+        while True:
+            try:
+                msg = self._queue.get(timeout=self.idle_timeout)
+            except queue.Empty:
+                session.close()
+                continue
+            try:
+                self._deliver(session, msg)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, session, msg):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                session.send(msg)
+                self.sent += 1
+                return
+            except PERMANENT_ERRORS as e:
+                error = e
+                session.close()
+                break
+            except OSError as e:
+                error = e
+                # Backing off here holds up the rest of the queue too, which
+                # is what we want while the server is unreachable
+                if attempt < self.max_attempts:
+                    time.sleep(self.backoff * 2 ** (attempt - 1))
+            except Exception as e:
+                error = e
+                session.close()
+                break
+        self.failed += 1
+        self._dead_letter(msg, error, attempt)
+
+    def _dead_letter(self, msg, error, attempts):
+        # The body holds the OTP itself, so only the envelope is recorded
+        record = {
+            'time': datetime.utcnow().isoformat(),
+            'to': msg['To'],
+            'subject': msg['Subject'],
+            'attempts': attempts,
+            'error': f'{type(error).__name__}: {error}'
+        }
+        print(f"[ERROR] Giving up on mail to {msg['To']} after {attempts} attempts: {record['error']}")
+        with open(self.dead_letter_path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'sent': self.sent,
+            'failed': self.failed
+        }
+
+otp_mail_queue = MailQueue()
@@ -0,0 +1,202 @@
+from bisect import bisect_left
+from flask import request, g
+from pymongo import monitoring
+import contextvars
+import threading
+import time
+
+# A small in-process metrics registry rendered in the Prometheus text
+# format. Recording a sample is a dict lookup, a bisect and a few integer
+# adds under a lock, which keeps it cheap enough for every request.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    return '{' + ','.join(f'{n}="{escape_label(v)}"' for n, v in zip(names, values)) + '}'
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} {self.kind}']
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f'{self.name}{format_labels(self.labelnames, labels)} {value}' for labels, value in items]
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, labels=(), amount=1):
+        self.inc(labels, -amount)
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, labels, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                # Per-bucket counts (not cumulative) plus +Inf, then sum
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            items = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        lines = self.header()
+        names = self.labelnames + ('le',)
+        for labels, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{format_labels(names, labels + (bound,))} {cumulative}')
+            lines.append(f'{self.name}_sum{format_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        # collect() -> [(name, help, kind, {labels tuple: value}, labelnames)]
+        self.collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            for name, help_text, kind, values, labelnames in collect():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} {kind}')
+                lines.extend(f'{name}{format_labels(labelnames, labels)} {value}' for labels, value in values.items())
+        return '\n'.join(lines) + '\n'
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    'http_requests_total', 'HTTP requests by route, method and status', ('route', 'method', 'status')))
+http_latency = registry.register(Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route, method and status', ('route', 'method', 'status')))
+http_in_flight = registry.register(Gauge(
+    'http_requests_in_flight', 'Requests currently being handled by route', ('route',)))
+mongo_commands = registry.register(Counter(
+    'mongo_commands_total', 'MongoDB commands by issuing route, command and outcome', ('route', 'command', 'status')))
+mongo_latency = registry.register(Histogram(
+    'mongo_command_duration_seconds', 'MongoDB command latency by issuing route and command', ('route', 'command')))
+mongo_documents = registry.register(Counter(
+    'mongo_documents_returned_total', 'Documents returned by MongoDB cursors by issuing route and command', ('route', 'command')))
+
+# The route of the request being served on this thread, so Mongo commands
+# can be attributed to the endpoint that issued them
+current_route = contextvars.ContextVar('current_route', default='none')
+
+def returned_documents(reply):
+    cursor = reply.get('cursor') if isinstance(reply, dict) else None
+    if not cursor:
+        return 0
+    return len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    # pymongo calls listeners synchronously on the thread running the
+    # command, so the request's context variable is visible here
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        route = current_route.get()
+        command = event.command_name
+        mongo_commands.inc((route, command, 'ok'))
+        mongo_latency.observe((route, command), event.duration_micros / 1e6)
+        documents = returned_documents(event.reply)
+        if documents:
+            mongo_documents.inc((route, command), documents)
+
+    def failed(self, event):
+        route = current_route.get()
+        command = event.command_name
+        mongo_commands.inc((route, command, 'error'))
+        mongo_latency.observe((route, command), event.duration_micros / 1e6)
+
+def init_app(app):
+    def route_of():
+        return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+    @app.before_request
+    def start_request_metrics():
+        route = route_of()
+        g.metrics_route = route
+        g.metrics_start = time.perf_counter()
+        g.metrics_recorded = False
+        current_route.set(route)
+        http_in_flight.inc((route,))
+
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_start' not in g:
+            return response
+        labels = (g.metrics_route, request.method, str(response.status_code))
+        http_requests.inc(labels)
+        g.metrics_recorded = True
+        if not response.is_streamed:
+            http_latency.observe(labels, time.perf_counter() - g.metrics_start)
+            return response
+        # A streamed body (export, event stream) is generated after this
+        # returns, and its queries run then too; time the request and keep
+        # it in flight until the server closes the response
+        route, start = g.metrics_route, g.metrics_start
+        g.metrics_streamed = True
+
+        def finish_streamed_request():
+            http_latency.observe(labels, time.perf_counter() - start)
+            http_in_flight.dec((route,))
+            current_route.set('none')
+
+        response.call_on_close(finish_streamed_request)
+        return response
+
+    @app.teardown_request
+    def finish_request_metrics(error):
+        if 'metrics_start' not in g:
+            return
+        # An unhandled exception skips after_request; count it as a 500
+        if not g.metrics_recorded:
+            labels = (g.metrics_route, request.method, '500')
+            http_requests.inc(labels)
+            http_latency.observe(labels, time.perf_counter() - g.metrics_start)
+        if not g.get('metrics_streamed'):
+            http_in_flight.dec((g.metrics_route,))
+            current_route.set('none')
@@ -1,4 +1,6 @@
-import random
+import hashlib
+import hmac
+import secrets
 import smtplib
 from email.mime.text import MIMEText
 from datetime import datetime, timedelta
@@ -6,28 +8,40 @@ import os
 
 OTP_LENGTH = 6
 OTP_EXPIRY_MINUTES = 5
+OTP_MAX_ATTEMPTS = int(os.environ.get('OTP_MAX_ATTEMPTS', 5))
 
 SMTP_SERVER = os.environ.get('SMTP_SERVER', 'smtp.gmail.com')
 SMTP_PORT = int(os.environ.get('SMTP_PORT', 587))
 SMTP_USER = os.environ.get('SMTP_USER')
 SMTP_PASSWORD = os.environ.get('SMTP_PASSWORD')
 SENDER_EMAIL = os.environ.get('SENDER_EMAIL', SMTP_USER)
+# Set to false for a local stand-in such as `python -m aiosmtpd -n -l localhost:1025`
+SMTP_USE_TLS = os.environ.get('SMTP_USE_TLS', 'true').lower() == 'true'
+SMTP_TIMEOUT = float(os.environ.get('SMTP_TIMEOUT', 10))
 
 def generate_otp():
-    return str(random.randint(100000, 999999))
+    return str(100000 + secrets.randbelow(900000))
 
-def send_otp_email(recipient_email, otp):
+def hash_otp(secret, email, otp):
+    # Keyed, so a leaked OTP collection can't be reversed by trying all codes
+    return hmac.new(secret.encode(), f'{email}:{otp}'.encode(), hashlib.sha256).hexdigest()
+
+def build_otp_message(recipient_email, otp):
     subject = 'Your Fitness App OTP Verification Code'
     body = f'Your OTP code is: {otp}. It is valid for {OTP_EXPIRY_MINUTES} minutes.'
     msg = MIMEText(body)
     msg['Subject'] = subject
     msg['From'] = SENDER_EMAIL
     msg['To'] = recipient_email
+    return msg
 
-    with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
+def open_smtp_connection():
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=SMTP_TIMEOUT)
+    if SMTP_USE_TLS:
         server.starttls()
+    if SMTP_USER:
         server.login(SMTP_USER, SMTP_PASSWORD)
-        server.sendmail(SENDER_EMAIL, recipient_email, msg.as_string())
+    return server
 
 def otp_expiry_time():
     return datetime.utcnow() + timedelta(minutes=OTP_EXPIRY_MINUTES)
@@ -0,0 +1,56 @@
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Cursors are opaque to clients: the (date, _id) of the last entry on the
+# previous page, so the next page starts right after it without a skip.
+def encode_cursor(doc):
+    payload = json.dumps({'d': doc['date'].isoformat(), 'id': str(doc['_id'])}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token):
+    # Raises ValueError for anything we didn't hand out
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload['d']), ObjectId(payload['id'])
+    except (ValueError, KeyError, TypeError, InvalidId):
+        raise ValueError('Invalid cursor')
+
+def apply_cursor(query, token):
+    # Narrow a date-range query to everything strictly after (date, _id).
+    # Raising the lower date bound keeps the index scan starting at the
+    # cursor instead of at the beginning of the range.
+    last_date, last_id = decode_cursor(token)
+    query['date']['$gte'] = max(query['date']['$gte'], last_date)
+    query['$or'] = [
+        {'date': {'$gt': last_date}},
+        {'date': last_date, '_id': {'$gt': last_id}}
+    ]
+    return query
+
+def parse_page_size(value):
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    size = int(value)
+    if size < 1:
+        raise ValueError('limit must be positive')
+    return min(size, MAX_PAGE_SIZE)
+
+def parse_projection(fields, allowed_fields):
+    # fields=name,calories -> {'name': 1, 'calories': 1, 'date': 1}
+    # date and _id are always returned since the cursor is built from them
+    if not fields:
+        return None
+    requested = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in requested if f not in allowed_fields]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    projection = {f: 1 for f in requested}
+    projection['date'] = 1
+    return projection
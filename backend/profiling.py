@@ -0,0 +1,175 @@
+from collections import Counter
+from flask import request, g
+import atexit
+import cProfile
+import hmac
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+
+# Opt-in profiling of live requests. A request is profiled when it is picked
+# by PROFILE_SAMPLE_RATE (0.0 - 1.0) or when it carries an X-Profile-Token
+# header matching PROFILE_ADMIN_TOKEN. Results are aggregated per route and
+# written to PROFILE_DIR:
+#   cprofile mode -> <route>.<pid>.pstats  (python -m pstats, snakeviz, ...)
+#   stack mode    -> <route>.<pid>.folded  (flamegraph.pl, speedscope, ...)
+# With neither setting present no hooks are installed at all, so there is
+# nothing on the hot path.
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_ADMIN_TOKEN = os.environ.get('PROFILE_ADMIN_TOKEN', '')
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'cprofile')  # cprofile or stack
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = float(os.environ.get('PROFILE_INTERVAL_MS', '5')) / 1000
+PROFILE_FLUSH_EVERY = int(os.environ.get('PROFILE_FLUSH_EVERY', '10'))  # profiled requests per route
+
+def route_filename(route):
+    # /api/food/<id> -> api_food_id
+    return re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+
+class RouteProfiles:
+    # Per-route aggregates for this worker, flushed to disk every
+    # PROFILE_FLUSH_EVERY profiled requests of a route
+    def __init__(self, directory, flush_every):
+        self.directory = directory
+        self.flush_every = flush_every
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._stacks = {}
+        self._pending = Counter()
+
+    def path(self, route, suffix):
+        return os.path.join(self.directory, f'{route_filename(route)}.{os.getpid()}.{suffix}')
+
+    def add_profile(self, route, profiler):
+        with self._lock:
+            if route in self._stats:
+                self._stats[route].add(profiler)
+            else:
+                self._stats[route] = pstats.Stats(profiler)
+            self._maybe_flush(route)
+
+    def add_stacks(self, route, stacks):
+        with self._lock:
+            self._stacks.setdefault(route, Counter()).update(stacks)
+            self._maybe_flush(route)
+
+    def _maybe_flush(self, route):
+        self._pending[route] += 1
+        if self._pending[route] >= self.flush_every:
+            self._flush(route)
+
+    def _flush(self, route):
+        self._pending[route] = 0
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if route in self._stats:
+                self._stats[route].dump_stats(self.path(route, 'pstats'))
+            if route in self._stacks:
+                with open(self.path(route, 'folded'), 'w') as f:
+                    for stack, count in self._stacks[route].most_common():
+                        f.write(f'{stack} {count}\n')
+        except OSError as e:
+            print(f"[WARNING] Could not write profile for {route}: {str(e)}")
+
+    def flush_all(self):
+        with self._lock:
+            for route in set(self._stats) | set(self._stacks):
+                self._flush(route)
+
+def collapse(frame):
+    # Outermost first, the way flamegraph tools expect it
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class StackSampler:
+    # One background thread samples the stacks of every thread that is
+    # currently serving a profiled request
+    def __init__(self, interval):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._targets = {}
+        self._thread = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._targets = {}
+            self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+            self._thread.start()
+
+    def start(self, thread_id):
+        stacks = Counter()
+        with self._lock:
+            self._ensure_thread()
+            self._targets[thread_id] = stacks
+        return stacks
+
+    def stop(self, thread_id):
+        with self._lock:
+            return self._targets.pop(thread_id, Counter())
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._targets:
+                    continue
+                frames = sys._current_frames()
+                for thread_id, stacks in self._targets.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        stacks[collapse(frame)] += 1
+
+profiles = RouteProfiles(PROFILE_DIR, PROFILE_FLUSH_EVERY)
+sampler = StackSampler(PROFILE_INTERVAL)
+
+def should_profile():
+    token = request.headers.get('X-Profile-Token')
+    # compare_digest only takes ASCII str, and a header can carry anything
+    if token and PROFILE_ADMIN_TOKEN and hmac.compare_digest(token.encode(), PROFILE_ADMIN_TOKEN.encode()):
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+def init_app(app):
+    if PROFILE_SAMPLE_RATE <= 0 and not PROFILE_ADMIN_TOKEN:
+        return
+    if PROFILE_MODE not in ('cprofile', 'stack'):
+        print(f"[WARNING] Unknown PROFILE_MODE {PROFILE_MODE!r}; profiling disabled")
+        return
+    atexit.register(profiles.flush_all)
+
+    @app.before_request
+    def start_profile():
+        if request.url_rule is None or not should_profile():
+            return
+        g.profile_route = request.url_rule.rule
+        if PROFILE_MODE == 'cprofile':
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # Another profiler is already active on this thread
+                return
+            g.profiler = profiler
+        else:
+            sampler.start(threading.get_ident())
+            g.profile_sampling = True
+
+    @app.teardown_request
+    def finish_profile(error):
+        if 'profiler' in g:
+            g.profiler.disable()
+            profiles.add_profile(g.profile_route, g.profiler)
+        elif 'profile_sampling' in g:
+            stacks = sampler.stop(threading.get_ident())
+            if stacks:
+                profiles.add_stacks(g.profile_route, stacks)
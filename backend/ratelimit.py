@@ -0,0 +1,59 @@
+from collections import OrderedDict
+import math
+import os
+import threading
+import time
+
+# Token buckets keyed by email or client address. Like the profile cache
+# this lives in the worker process, so under gunicorn each worker enforces
+# the limit on its own share of the traffic; it is there to stop floods
+# from turning into database writes and SMTP sends, not to be exact.
+# Keys are kept in LRU order and the least recently seen are dropped past
+# max_keys, which only ever forgets a bucket that had time to refill.
+class TokenBucketLimiter:
+    def __init__(self, capacity, period, max_keys=10000):
+        # capacity requests per period seconds, allowed in a burst
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.max_keys = max_keys
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+        self.allowed = 0
+        self.rejected = 0
+
+    def take(self, key):
+        # 0 when the request may go ahead, otherwise the seconds until it may
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.capacity, now))
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            if tokens < 1:
+                self._buckets[key] = (tokens, now)
+                self._buckets.move_to_end(key)
+                self.rejected += 1
+                return math.ceil((1 - tokens) / self.rate)
+            self._buckets[key] = (tokens - 1, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            self.allowed += 1
+            return 0
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._buckets), 'allowed': self.allowed, 'rejected': self.rejected}
+
+# OTP requests: a few codes per address, more per client address since
+# several people can share one
+OTP_RATE_PERIOD = int(os.environ.get('OTP_RATE_PERIOD', 600))
+OTP_EMAIL_LIMIT = int(os.environ.get('OTP_EMAIL_LIMIT', 3))
+OTP_IP_LIMIT = int(os.environ.get('OTP_IP_LIMIT', 20))
+RATE_LIMIT_KEYS = int(os.environ.get('RATE_LIMIT_KEYS', 10000))
+
+otp_email_limiter = TokenBucketLimiter(OTP_EMAIL_LIMIT, OTP_RATE_PERIOD, RATE_LIMIT_KEYS)
+otp_ip_limiter = TokenBucketLimiter(OTP_IP_LIMIT, OTP_RATE_PERIOD, RATE_LIMIT_KEYS)
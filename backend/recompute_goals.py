@@ -0,0 +1,134 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pymongo import MongoClient, UpdateOne
+import argparse
+import csv
+import numpy as np
+import os
+import sys
+
+from goals import calorie_goals
+
+# Recompute every user's calorieGoal after a change to the formulas in
+# goals.py. Users are read in projected batches, each batch's goals are
+# computed as arrays, and only the rows whose goal changed are written
+# back with an unordered bulk_write, on a separate thread so the next batch
+# is read while the last one is written. Goals a user set by hand through
+# /api/user/calorie-goal are replaced, as a profile update would do.
+GOAL_INPUT_PROJECTION = {'weight': 1, 'height': 1, 'age': 1, 'gender': 1, 'activityLevel': 1, 'goal': 1, 'calorieGoal': 1}
+DEFAULT_BATCH_SIZE = 10000
+
+def batch_columns(docs):
+    # The usable docs and their numeric inputs, converted the way register
+    # does it; users whose stored values can't be converted are left out
+    weight, height, age, usable = [], [], [], []
+    for doc in docs:
+        try:
+            values = float(doc['weight']), float(doc['height']), int(doc['age'])
+        except (KeyError, TypeError, ValueError):
+            continue
+        weight.append(values[0])
+        height.append(values[1])
+        age.append(values[2])
+        usable.append(doc)
+    return usable, np.array(weight, dtype=np.float64), np.array(height, dtype=np.float64), np.array(age, dtype=np.float64)
+
+def changed_goals(docs):
+    # [(doc, old goal, new goal)] for the batch's users whose goal moves,
+    # and the number of users skipped for unusable inputs
+    usable, weight, height, age = batch_columns(docs)
+    if not usable:
+        return [], len(docs)
+    new = calorie_goals(weight, height, age, [d.get('gender') for d in usable],
+                        [d.get('activityLevel') for d in usable], [d.get('goal') for d in usable])
+    old = np.array([d.get('calorieGoal') if isinstance(d.get('calorieGoal'), (int, float)) else np.nan
+                    for d in usable], dtype=np.float64)
+    # NaN never equals, so users without a goal are always written
+    changed = np.flatnonzero(old != new)
+    return [(usable[i], usable[i].get('calorieGoal'), int(new[i])) for i in changed], len(docs) - len(usable)
+
+def write_goals(collection, changes):
+    # updated_at moves too, so profile ETags and sync clients see the change
+    now = datetime.utcnow()
+    ops = [UpdateOne({'_id': doc['_id']}, {'$set': {'calorieGoal': goal, 'updated_at': now}})
+           for doc, _, goal in changes]
+    return collection.bulk_write(ops, ordered=False).modified_count if ops else 0
+
+def batches(collection, batch_size):
+    batch = []
+    for doc in collection.find({}, GOAL_INPUT_PROJECTION, batch_size=batch_size):
+        batch.append(doc)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def recompute(db, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, on_change=None):
+    totals = {'scanned': 0, 'changed': 0, 'skipped': 0, 'written': 0}
+    deltas = []
+    pending = None
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        for batch in batches(db.users, batch_size):
+            changes, skipped = changed_goals(batch)
+            totals['scanned'] += len(batch)
+            totals['skipped'] += skipped
+            totals['changed'] += len(changes)
+            deltas.extend(new - old for _, old, new in changes if isinstance(old, (int, float)))
+            if on_change:
+                for change in changes:
+                    on_change(*change)
+            if dry_run or not changes:
+                continue
+            # At most one write in flight while the next batch is read
+            if pending is not None:
+                totals['written'] += pending.result()
+            pending = writer.submit(write_goals, db.users, changes)
+        if pending is not None:
+            totals['written'] += pending.result()
+    return totals, np.array(deltas, dtype=np.float64)
+
+def main():
+    parser = argparse.ArgumentParser(description='Recompute calorieGoal for every user from goals.py')
+    parser.add_argument('--dry-run', action='store_true', help='report what would change without writing')
+    parser.add_argument('--report', help='write every change to this CSV file')
+    parser.add_argument('--show', type=int, default=20, help='changes to print')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/fitness_tracker'))
+    args = parser.parse_args()
+
+    shown = []
+    report = open(args.report, 'w', newline='') if args.report else None
+    writer = csv.writer(report) if report else None
+    if writer:
+        writer.writerow(['_id', 'gender', 'activityLevel', 'goal', 'oldCalorieGoal', 'newCalorieGoal'])
+
+    def on_change(doc, old, new):
+        if len(shown) < args.show:
+            shown.append((doc['_id'], old, new))
+        if writer:
+            writer.writerow([doc['_id'], doc.get('gender'), doc.get('activityLevel'), doc.get('goal'), old, new])
+
+    client = MongoClient(args.uri)
+    try:
+        totals, deltas = recompute(client.get_database(), args.batch_size, args.dry_run, on_change)
+    except Exception as e:
+        print(f"❌ Recompute failed: {str(e)}")
+        return 1
+    finally:
+        client.close()
+        if report:
+            report.close()
+
+    for user_id, old, new in shown:
+        print(f"- {user_id}: {old} -> {new}")
+    if len(deltas):
+        print(f"Change per user: mean {deltas.mean():+.1f}, min {deltas.min():+.0f}, max {deltas.max():+.0f}")
+    verb = 'would change' if args.dry_run else 'changed'
+    print(f"✅ {totals['scanned']} users scanned, {totals['changed']} {verb}, "
+          f"{totals['skipped']} skipped for missing or invalid inputs"
+          + ('' if args.dry_run else f", {totals['written']} written"))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
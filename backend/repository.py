@@ -0,0 +1,456 @@
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+from datetime import datetime
+import contextvars
+
+import buckets
+import rollups
+
+# All reads and writes the routes make go through these repositories. Each
+# method is one Mongo round trip (plus one for the daily rollup on entry
+# writes), and every round trip is counted against the current request so
+# tests can hold each endpoint to a budget.
+_mongo_ops = contextvars.ContextVar('mongo_ops', default=None)
+
+def start_op_count():
+    _mongo_ops.set([0])
+
+def op_count():
+    counter = _mongo_ops.get()
+    return counter[0] if counter is not None else 0
+
+def count_op(n=1):
+    counter = _mongo_ops.get()
+    if counter is not None:
+        counter[0] += n
+
+def to_object_id(value):
+    # None for anything that can't be an ObjectId, so callers answer 404
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+# Fields that never leave the server
+PRIVATE_USER_FIELDS = ['password', 'otp', 'otp_expiry']
+PUBLIC_USER_PROJECTION = {field: 0 for field in PRIVATE_USER_FIELDS}
+
+class UserRepository:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def find_by_id(self, user_id, projection=PUBLIC_USER_PROJECTION):
+        oid = to_object_id(user_id)
+        if oid is None:
+            return None
+        count_op()
+        return self.collection.find_one({'_id': oid}, projection)
+
+    def find_by_email(self, email):
+        count_op()
+        return self.collection.find_one({'email': email})
+
+    def create(self, user):
+        # Relies on the unique email index; None when the email is taken
+        count_op()
+        try:
+            return self.collection.insert_one(user).inserted_id
+        except DuplicateKeyError:
+            return None
+
+    def update(self, user_id, updates):
+        # The updated, public user document, or None if there is no such user
+        oid = to_object_id(user_id)
+        if oid is None:
+            return None
+        count_op()
+        return self.collection.find_one_and_update(
+            {'_id': oid},
+            {'$set': updates},
+            projection=PUBLIC_USER_PROJECTION,
+            return_document=ReturnDocument.AFTER
+        )
+
+    def replace_password_hash(self, user_id, old_hash, new_hash):
+        # Only if nobody changed the password in the meantime
+        count_op()
+        self.collection.update_one({'_id': user_id, 'password': old_hash}, {'$set': {'password': new_hash}})
+
+    def find_id_by_email(self, email):
+        # Answered from the email index without reading the document
+        count_op()
+        user = self.collection.find_one({'email': email}, {'_id': 1})
+        return user['_id'] if user else None
+
+    def aggregate(self, pipeline):
+        count_op()
+        return list(self.collection.aggregate(pipeline))
+
+class OTPRepository:
+    # One pending code per email, kept out of the users collection. Only a
+    # hash of the code is stored, and the TTL index on expires_at removes
+    # codes nobody used.
+    def __init__(self, collection):
+        self.collection = collection
+
+    def issue(self, email, user_id, code_hash, expires_at):
+        # Replaces any earlier code for the email
+        count_op()
+        self.collection.replace_one(
+            {'_id': email},
+            {'user_id': user_id, 'code_hash': code_hash, 'expires_at': expires_at, 'attempts': 0},
+            upsert=True
+        )
+
+    def find(self, email):
+        count_op()
+        return self.collection.find_one({'_id': email})
+
+    def record_failure(self, email, max_attempts):
+        # The code is dropped once it has been guessed wrong max_attempts times
+        count_op()
+        otp = self.collection.find_one_and_update(
+            {'_id': email}, {'$inc': {'attempts': 1}}, return_document=ReturnDocument.AFTER
+        )
+        if otp is not None and otp['attempts'] >= max_attempts:
+            count_op()
+            self.collection.delete_one({'_id': email, 'code_hash': otp['code_hash']})
+
+    def consume(self, email, code_hash):
+        # The code, deleted so it works once, or None if it was already used
+        # or replaced in the meantime
+        count_op()
+        return self.collection.find_one_and_delete({'_id': email, 'code_hash': code_hash})
+
+class TombstoneRepository:
+    # A record of every deleted entry, so sync clients can drop their copy.
+    # A TTL index forgets them after TOMBSTONE_RETENTION_DAYS.
+    def __init__(self, collection):
+        self.collection = collection
+
+    def listener(self, kind):
+        # EntryRepository listener recording the deletes of one collection
+        def entry_changed(before=None, after=None):
+            if after is None:
+                count_op()
+                self.collection.insert_one({
+                    'user_id': before['user_id'],
+                    'kind': kind,
+                    'entry_id': before['_id'],
+                    'date': before['date'],
+                    'deleted_at': datetime.utcnow()
+                })
+        return entry_changed
+
+    def find_since(self, user_id, since, limit=None):
+        count_op()
+        cursor = self.collection.find({'user_id': user_id, 'deleted_at': {'$gt': since}},
+                                      {'_id': 0, 'kind': 1, 'entry_id': 1}).sort('deleted_at', 1)
+        return list(cursor.limit(limit) if limit else cursor)
+
+class SummaryRepository:
+    def __init__(self, collection):
+        self.collection = collection
+
+    def record_change(self, kind, before=None, after=None):
+        deltas = rollups.entry_change_deltas(kind, before, after)
+        if deltas:
+            count_op()
+            rollups.apply_deltas(self.collection, deltas)
+
+    def record_inserted(self, kind, entries):
+        if entries:
+            count_op()
+            rollups.record_entries_inserted(self.collection, kind, entries)
+
+    def day_version(self, user_id, date, kind):
+        count_op()
+        return rollups.get_day_version(self.collection, user_id, date, kind)
+
+    def find_range(self, user_id, start_date, end_date):
+        count_op()
+        return rollups.get_summaries(self.collection, user_id, start_date, end_date)
+
+class EntryRepository:
+    # One instance per entry collection; kind is 'food' or 'exercise'
+    def __init__(self, collection, kind, summaries):
+        self.collection = collection
+        self.kind = kind
+        self.summaries = summaries
+        self.listeners = []
+
+    def add_listener(self, listener):
+        # listener(before=None, after=None) is called after every write
+        # that succeeded, the way the daily rollup sees it
+        self.listeners.append(listener)
+
+    def _changed(self, before=None, after=None):
+        for listener in self.listeners:
+            listener(before=before, after=after)
+
+    @property
+    def name(self):
+        return self.collection.name
+
+    def find_range(self, user_id, start_date, end_date, projection=None, sort=None, limit=None, extra=None):
+        return list(self.iter_range(user_id, start_date, end_date, projection, sort, limit, extra))
+
+    def iter_range(self, user_id, start_date, end_date, projection=None, sort=None, limit=None, extra=None):
+        # The live cursor, for callers that stream documents out as they arrive
+        query = {
+            'user_id': user_id,
+            'date': {'$gte': start_date, '$lte': end_date}
+        }
+        if extra:
+            query.update(extra)
+        cursor = self.collection.find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        count_op()
+        return cursor
+
+    def lookup_pipeline(self, user_id, start_date, end_date):
+        # The entries of a day range with string ids, as a $lookup sub-pipeline
+        return [
+            {'$match': {'user_id': user_id, 'date': {'$gte': start_date, '$lte': end_date}}},
+            {'$sort': {'date': 1}},
+            {'$addFields': {'_id': {'$toString': '$_id'}}}
+        ]
+
+    def insert(self, entry):
+        count_op()
+        entry['_id'] = self.collection.insert_one(entry).inserted_id
+        self.summaries.record_change(self.kind, after=entry)
+        self._changed(after=entry)
+        return entry
+
+    def insert_many(self, entries):
+        # Unordered, so one failed write doesn't stop the rest. Returns
+        # {position: error message} for the entries that were not written.
+        failed = {}
+        count_op()
+        try:
+            self.collection.insert_many(entries, ordered=False)
+        except BulkWriteError as e:
+            failed = {err['index']: err.get('errmsg', 'Write failed') for err in e.details.get('writeErrors', [])}
+        inserted = [entry for position, entry in enumerate(entries) if position not in failed]
+        self.summaries.record_inserted(self.kind, inserted)
+        for entry in inserted:
+            self._changed(after=entry)
+        return failed
+
+    def find_changed(self, user_id, since, limit=None):
+        # Created or updated after since, oldest change first
+        count_op()
+        cursor = self.collection.find({'user_id': user_id, 'updated_at': {'$gt': since}}).sort('updated_at', 1)
+        return list(cursor.limit(limit) if limit else cursor)
+
+    def existing_keys(self, user_id, entries, key_fields):
+        # The key_fields tuples of the user's stored entries that collide
+        # with any of entries, in one query over their date span
+        if not entries:
+            return set()
+        dates = [entry['date'] for entry in entries]
+        query = {
+            'user_id': user_id,
+            'date': {'$gte': min(dates), '$lte': max(dates)},
+            'name': {'$in': list({entry['name'] for entry in entries})}
+        }
+        count_op()
+        cursor = self.collection.find(query, {'_id': 0, **{field: 1 for field in key_fields}})
+        return {tuple(doc.get(field) for field in key_fields) for doc in cursor}
+
+    def update(self, user_id, entry_id, updates):
+        # The updated entry, or None if it doesn't exist or isn't the user's.
+        # Returning the document from before the write lets the rollup move
+        # totals between days without a separate read.
+        oid = to_object_id(entry_id)
+        if oid is None:
+            return None
+        count_op()
+        before = self.collection.find_one_and_update(
+            {'_id': oid, 'user_id': user_id},
+            {'$set': updates},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            return None
+        after = {**before, **updates}
+        self.summaries.record_change(self.kind, before=before, after=after)
+        self._changed(before=before, after=after)
+        return after
+
+    def delete(self, user_id, entry_id):
+        # The deleted entry, or None if it doesn't exist or isn't the user's
+        oid = to_object_id(entry_id)
+        if oid is None:
+            return None
+        count_op()
+        entry = self.collection.find_one_and_delete({'_id': oid, 'user_id': user_id})
+        if entry is not None:
+            self.summaries.record_change(self.kind, before=entry)
+            self._changed(before=entry)
+        return entry
+
+class BucketEntryRepository(EntryRepository):
+    # The same interface over the bucket layout described in buckets.py, on
+    # food_days / exercise_days. Writes are still one round trip on the
+    # entry side, except moving an entry to another day, which takes three.
+    def iter_range(self, user_id, start_date, end_date, projection=None, sort=None, limit=None, extra=None):
+        # Entries always come back in (date, _id) order, whatever sort asks
+        # for; the routes only ever ask for date order
+        count_op()
+        cursor = self.collection.find(
+            {'user_id': user_id, 'date': {'$gte': start_date, '$lte': end_date}},
+            buckets.bucket_projection(projection)
+        ).sort('date', 1)
+        return buckets.flatten(cursor, projection, extra, limit)
+
+    def lookup_pipeline(self, user_id, start_date, end_date):
+        return buckets.lookup_pipeline(user_id, start_date, end_date)
+
+    def _push(self, entries):
+        # Pushes entries to their days' buckets in one unordered bulk write.
+        # Returns {position: error message} for the entries not written.
+        groups = {}
+        for position, entry in enumerate(entries):
+            groups.setdefault((entry['user_id'], entry['date']), []).append(position)
+        keys = list(groups)
+        ops = [UpdateOne({'user_id': user_id, 'date': date},
+                         buckets.push_update(self.kind, [entries[position] for position in groups[(user_id, date)]]),
+                         upsert=True)
+               for user_id, date in keys]
+        count_op()
+        try:
+            self.collection.bulk_write(ops, ordered=False)
+            return {}
+        except BulkWriteError as e:
+            errors = e.details.get('writeErrors', [])
+        # Two first writes to the same day can race on the upsert, as with
+        # the daily rollup; retrying the losers finds the bucket
+        retry = [err['index'] for err in errors if err.get('code') == 11000]
+        errors = [err for err in errors if err.get('code') != 11000]
+        if retry:
+            count_op()
+            try:
+                self.collection.bulk_write([ops[index] for index in retry], ordered=False)
+            except BulkWriteError as e:
+                errors += [dict(err, index=retry[err['index']]) for err in e.details.get('writeErrors', [])]
+        return {position: err.get('errmsg', 'Write failed')
+                for err in errors for position in groups[keys[err['index']]]}
+
+    def insert(self, entry):
+        entry['_id'] = entry.get('_id') or ObjectId()
+        failed = self._push([entry])
+        if failed:
+            raise WriteError(failed[0])
+        self.summaries.record_change(self.kind, after=entry)
+        self._changed(after=entry)
+        return entry
+
+    def insert_many(self, entries):
+        for entry in entries:
+            entry['_id'] = entry.get('_id') or ObjectId()
+        failed = self._push(entries)
+        inserted = [entry for position, entry in enumerate(entries) if position not in failed]
+        self.summaries.record_inserted(self.kind, inserted)
+        for entry in inserted:
+            self._changed(after=entry)
+        return failed
+
+    def find_changed(self, user_id, since, limit=None):
+        # A bucket's updated_at is the latest of its entries', so the
+        # (user_id, updated_at) index finds the days to look in
+        count_op()
+        cursor = self.collection.find({'user_id': user_id, 'updated_at': {'$gt': since}},
+                                      {'_id': 0, 'user_id': 1, 'date': 1, 'entries': 1})
+        changed = sorted((entry for bucket in cursor for entry in buckets.bucket_entries(bucket)
+                          if entry.get('updated_at') and entry['updated_at'] > since),
+                         key=lambda entry: entry['updated_at'])
+        return changed[:limit] if limit else changed
+
+    def existing_keys(self, user_id, entries, key_fields):
+        if not entries:
+            return set()
+        dates = [entry['date'] for entry in entries]
+        names = {entry['name'] for entry in entries}
+        projection = {field: 1 for field in key_fields}
+        stored = self.iter_range(user_id, min(dates), max(dates), {'_id': 0, 'name': 1, **projection})
+        return {tuple(doc.get(field) for field in key_fields) for doc in stored if doc.get('name') in names}
+
+    def update(self, user_id, entry_id, updates):
+        oid = to_object_id(entry_id)
+        if oid is None:
+            return None
+        # Usually the entry stays on its day (or updates has no date) and is
+        # edited where it is
+        query = {'user_id': user_id, 'entries._id': oid}
+        if 'date' in updates:
+            query['date'] = updates['date']
+        count_op()
+        bucket = self.collection.find_one_and_update(
+            query,
+            buckets.update_pipeline(self.kind, oid, updates),
+            return_document=ReturnDocument.BEFORE
+        )
+        if bucket is not None:
+            before = next(entry for entry in buckets.bucket_entries(bucket) if entry['_id'] == oid)
+            after = {**before, **updates}
+        elif 'date' in updates:
+            moved = self._move(user_id, oid, updates)
+            if moved is None:
+                return None
+            before, after = moved
+        else:
+            return None
+        self.summaries.record_change(self.kind, before=before, after=after)
+        self._changed(before=before, after=after)
+        return after
+
+    def _move(self, user_id, oid, updates):
+        # Pushes the edited entry to its new day before taking it out of the
+        # old one. Should the second write fail, the entry is on both days
+        # rather than on neither; the single-document updates are retried
+        # once by the driver's retryable writes.
+        count_op()
+        holding = list(self.collection.find({'user_id': user_id, 'entries._id': oid},
+                                            {'_id': 0, 'user_id': 1, 'date': 1, 'entries': {'$elemMatch': {'_id': oid}}}))
+        if not holding:
+            return None
+        before = buckets.bucket_entries(holding[0])[0]
+        after = {**before, **updates}
+        failed = self._push([after])
+        if failed:
+            raise WriteError(failed[0])
+        for bucket in holding:
+            count_op()
+            self.collection.update_one({'user_id': user_id, 'date': bucket['date']},
+                                       buckets.delete_pipeline(self.kind, oid))
+        return before, after
+
+    def delete(self, user_id, entry_id):
+        oid = to_object_id(entry_id)
+        if oid is None:
+            return None
+        count_op()
+        bucket = self.collection.find_one_and_update(
+            {'user_id': user_id, 'entries._id': oid},
+            buckets.delete_pipeline(self.kind, oid),
+            return_document=ReturnDocument.BEFORE
+        )
+        if bucket is None:
+            return None
+        entry = next(entry for entry in buckets.bucket_entries(bucket) if entry['_id'] == oid)
+        self.summaries.record_change(self.kind, before=entry)
+        self._changed(before=entry)
+        return entry
+
+def entry_repository(db, kind, summaries, storage=buckets.ENTRY_STORAGE):
+    # The repository for one kind of entry in the configured storage layout
+    if storage == 'buckets':
+        return BucketEntryRepository(db[buckets.BUCKET_COLLECTIONS[kind]], kind, summaries)
+    return EntryRepository(db[buckets.ENTRY_COLLECTIONS[kind]], kind, summaries)
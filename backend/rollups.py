@@ -0,0 +1,217 @@
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+from datetime import datetime
+import argparse
+import os
+import sys
+
+from buckets import ENTRY_STORAGE, STORAGE_LAYOUTS, ENTRY_COLLECTIONS, BUCKET_COLLECTIONS
+
+# daily_summaries holds one document per (user_id, date) with running totals
+# of that day's food and exercise entries. The entry handlers keep it current
+# with $inc deltas, so reading N days of totals touches N small documents
+# instead of every entry in the range.
+SUMMARY_FIELDS = ['calories', 'protein', 'carbs', 'fat', 'foodCount',
+                  'caloriesBurned', 'exerciseMinutes', 'exerciseCount']
+
+# Bumped on every change to a day's entries of that kind. The totals can
+# cancel out (an edit that only renames), the versions only ever grow, so
+# they make the day-list ETags.
+VERSION_FIELDS = {'food': 'foodVersion', 'exercise': 'exerciseVersion'}
+
+# Floating point macros accumulate rounding error under $inc
+VERIFY_TOLERANCE = 0.01
+
+def food_delta(entry, sign):
+    return {
+        'calories': sign * entry.get('calories', 0),
+        'protein': sign * entry.get('protein', 0),
+        'carbs': sign * entry.get('carbs', 0),
+        'fat': sign * entry.get('fat', 0),
+        'foodCount': sign,
+        'foodVersion': 1
+    }
+
+def exercise_delta(entry, sign):
+    return {
+        'caloriesBurned': sign * entry.get('caloriesBurned', 0),
+        'exerciseMinutes': sign * entry.get('duration', 0),
+        'exerciseCount': sign,
+        'exerciseVersion': 1
+    }
+
+DELTAS = {
+    'food': food_delta,
+    'exercise': exercise_delta
+}
+
+def merge_delta(deltas, key, delta):
+    combined = deltas.setdefault(key, {})
+    for field, value in delta.items():
+        combined[field] = combined.get(field, 0) + value
+
+def entry_change_deltas(kind, before=None, after=None):
+    # {(user_id, date): {field: delta}} for an insert (after only), a delete
+    # (before only) or an update (both). An update that moves the entry to
+    # another day takes it off the old day and adds it to the new one.
+    delta_for = DELTAS[kind]
+    deltas = {}
+    if before is not None:
+        merge_delta(deltas, (before['user_id'], before['date']), delta_for(before, -1))
+    if after is not None:
+        merge_delta(deltas, (after['user_id'], after['date']), delta_for(after, 1))
+    return {key: {f: v for f, v in delta.items() if v != 0} for key, delta in deltas.items()}
+
+def apply_deltas(summaries, deltas):
+    ops = [
+        UpdateOne(
+            {'user_id': user_id, 'date': date},
+            {'$inc': delta, '$set': {'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+        for (user_id, date), delta in deltas.items() if delta
+    ]
+    if not ops:
+        return
+    try:
+        summaries.bulk_write(ops, ordered=False)
+    except BulkWriteError as e:
+        # Two first writes to the same day can race on the upsert. The unique
+        # index lets one through, so retrying the losers finds the document.
+        errors = e.details.get('writeErrors', [])
+        if not errors or any(err.get('code') != 11000 for err in errors):
+            raise
+        summaries.bulk_write([ops[err['index']] for err in errors], ordered=False)
+
+def record_entry_change(summaries, kind, before=None, after=None):
+    apply_deltas(summaries, entry_change_deltas(kind, before, after))
+
+def record_entries_inserted(summaries, kind, entries):
+    deltas = {}
+    for entry in entries:
+        for key, delta in entry_change_deltas(kind, after=entry).items():
+            merge_delta(deltas, key, delta)
+    apply_deltas(summaries, deltas)
+
+def get_summaries(summaries, user_id, start_date, end_date):
+    # Fields only appear once something incremented them, so fill in zeros
+    stored = summaries.find(
+        {'user_id': user_id, 'date': {'$gte': start_date, '$lte': end_date}},
+        {'_id': 0, 'user_id': 0, 'updated_at': 0, **{field: 0 for field in VERSION_FIELDS.values()}}
+    ).sort('date', 1)
+    return [dict({field: 0 for field in SUMMARY_FIELDS}, **summary) for summary in stored]
+
+def get_day_version(summaries, user_id, date, kind):
+    # Just the _id and the kind's version of one day, from the unique index
+    return summaries.find_one({'user_id': user_id, 'date': date}, {'_id': 1, VERSION_FIELDS[kind]: 1})
+
+# Rebuild / verify from the raw entries
+def computed_summaries(db, user_id=None, storage=ENTRY_STORAGE):
+    match = {'user_id': user_id} if user_id else {}
+    totals = {}
+    food_group = {
+        '_id': {'user_id': '$user_id', 'date': '$date'},
+        'calories': {'$sum': '$calories'},
+        'protein': {'$sum': '$protein'},
+        'carbs': {'$sum': '$carbs'},
+        'fat': {'$sum': '$fat'},
+        'foodCount': {'$sum': 1}
+    }
+    exercise_group = {
+        '_id': {'user_id': '$user_id', 'date': '$date'},
+        'caloriesBurned': {'$sum': '$caloriesBurned'},
+        'exerciseMinutes': {'$sum': '$duration'},
+        'exerciseCount': {'$sum': 1}
+    }
+    # In the bucket layout each (user_id, date) already is one document.
+    # The totals are summed from its entries, not read from the bucket's
+    # own totals, so verify catches those drifting too.
+    food_bucket = {
+        '_id': {'user_id': '$user_id', 'date': '$date'},
+        'calories': {'$sum': '$entries.calories'},
+        'protein': {'$sum': '$entries.protein'},
+        'carbs': {'$sum': '$entries.carbs'},
+        'fat': {'$sum': '$entries.fat'},
+        'foodCount': {'$size': '$entries'}
+    }
+    exercise_bucket = {
+        '_id': {'user_id': '$user_id', 'date': '$date'},
+        'caloriesBurned': {'$sum': '$entries.caloriesBurned'},
+        'exerciseMinutes': {'$sum': '$entries.duration'},
+        'exerciseCount': {'$size': '$entries'}
+    }
+    sources = {
+        'documents': [(db[ENTRY_COLLECTIONS['food']], {'$group': food_group}),
+                      (db[ENTRY_COLLECTIONS['exercise']], {'$group': exercise_group})],
+        'buckets': [(db[BUCKET_COLLECTIONS['food']], {'$project': food_bucket}),
+                    (db[BUCKET_COLLECTIONS['exercise']], {'$project': exercise_bucket})]
+    }
+    for collection, stage in sources[storage]:
+        # Buckets emptied by deletes are left in place and skipped here
+        match_entries = {**match, 'entries.0': {'$exists': True}} if storage == 'buckets' else match
+        for row in collection.aggregate([{'$match': match_entries}, stage], allowDiskUse=True):
+            key = (row['_id']['user_id'], row['_id']['date'])
+            summary = totals.setdefault(key, {field: 0 for field in SUMMARY_FIELDS})
+            summary.update({k: v for k, v in row.items() if k != '_id'})
+    return totals
+
+def rebuild(db, user_id=None, storage=ENTRY_STORAGE):
+    totals = computed_summaries(db, user_id, storage)
+    db.daily_summaries.delete_many({'user_id': user_id} if user_id else {})
+    ops = [
+        UpdateOne(
+            {'user_id': uid, 'date': date},
+            {'$set': dict(summary, updated_at=datetime.utcnow())},
+            upsert=True
+        )
+        for (uid, date), summary in totals.items()
+    ]
+    for start in range(0, len(ops), 1000):
+        db.daily_summaries.bulk_write(ops[start:start + 1000], ordered=False)
+    return len(ops)
+
+def verify(db, user_id=None, storage=ENTRY_STORAGE):
+    expected = computed_summaries(db, user_id, storage)
+    mismatches = []
+    seen = set()
+    for stored in db.daily_summaries.find({'user_id': user_id} if user_id else {}):
+        key = (stored['user_id'], stored['date'])
+        seen.add(key)
+        want = expected.get(key, {field: 0 for field in SUMMARY_FIELDS})
+        for field in SUMMARY_FIELDS:
+            if abs(stored.get(field, 0) - want.get(field, 0)) > VERIFY_TOLERANCE:
+                mismatches.append((key, field, stored.get(field, 0), want.get(field, 0)))
+    for key in expected.keys() - seen:
+        mismatches.append((key, 'missing', None, None))
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description='Rebuild or verify the daily_summaries rollup')
+    parser.add_argument('command', choices=['rebuild', 'verify'])
+    parser.add_argument('--user-id', help='Limit to a single user')
+    parser.add_argument('--storage', choices=STORAGE_LAYOUTS, default=ENTRY_STORAGE,
+                        help='layout the entries are stored in (default from ENTRY_STORAGE)')
+    parser.add_argument('--uri', default=os.environ.get('MONGO_URI', 'mongodb://localhost:27017/fitness_tracker'))
+    args = parser.parse_args()
+
+    client = MongoClient(args.uri)
+    try:
+        db = client.get_database()
+        if args.command == 'rebuild':
+            count = rebuild(db, args.user_id, args.storage)
+            print(f"✅ Rebuilt {count} daily summaries")
+            return 0
+
+        mismatches = verify(db, args.user_id, args.storage)
+        for (user_id, date), field, stored, expected in mismatches[:50]:
+            print(f"- {user_id} {date.date()}: {field} stored={stored} expected={expected}")
+        if mismatches:
+            print(f"❌ {len(mismatches)} mismatches, run 'python rollups.py rebuild' to repair")
+            return 1
+        print("✅ daily_summaries matches the raw entries")
+        return 0
+    finally:
+        client.close()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,158 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from datetime import datetime
+import os
+import threading
+import time
+
+# Food name autocomplete. Each user's past foods are kept in a sorted array
+# of keys, one per word of each name, so "chick" finds both "Chicken Wrap"
+# and "Grilled Chicken Salad" with a bisect and a short scan. The index is
+# built from food_entries on the user's first search and kept up to date by
+# the entry writes this worker makes; SEARCH_INDEX_TTL bounds how long
+# writes made by other workers can go unseen.
+SEARCH_INDEX_USERS = int(os.environ.get('SEARCH_INDEX_USERS', '1000'))
+SEARCH_INDEX_TTL = int(os.environ.get('SEARCH_INDEX_TTL', '300'))
+RECENCY_HALF_LIFE_DAYS = 30
+DEFAULT_RESULTS = 10
+MAX_RESULTS = 50
+
+SEARCH_PROJECTION = {'_id': 1, 'name': 1, 'calories': 1, 'protein': 1, 'carbs': 1, 'fat': 1, 'mealType': 1, 'date': 1}
+LAST_USED_FIELDS = ['name', 'calories', 'protein', 'carbs', 'fat', 'mealType']
+
+def normalize(name):
+    return ' '.join(str(name or '').lower().split())
+
+class UserFoodIndex:
+    def __init__(self):
+        self.foods = {}  # normalized name -> stats and last-used values
+        self.keys = []   # sorted (word-suffix of the name, normalized name)
+        self.built_at = time.monotonic()
+
+    def add(self, entry):
+        name = normalize(entry.get('name'))
+        if not name:
+            return
+        food = self.foods.get(name)
+        if food is None:
+            food = self.foods[name] = {'count': 0, 'lastDate': None, 'lastId': None}
+            words = name.split(' ')
+            for i in range(len(words)):
+                insort(self.keys, (' '.join(words[i:]), name))
+        food['count'] += 1
+        if food['lastDate'] is None or entry['date'] >= food['lastDate']:
+            food['lastDate'] = entry['date']
+            food['lastId'] = entry.get('_id')
+            for field in LAST_USED_FIELDS:
+                food[field] = entry.get(field)
+
+    def remove(self, entry):
+        # False when the index can't be patched and has to be rebuilt
+        name = normalize(entry.get('name'))
+        food = self.foods.get(name)
+        if food is None:
+            return True
+        food['count'] -= 1
+        if food['count'] <= 0:
+            del self.foods[name]
+            self.keys = [key for key in self.keys if key[1] != name]
+            return True
+        # The next most recent use isn't known without reading it back
+        return food['lastId'] != entry.get('_id')
+
+    def edit(self, after):
+        # An edit that kept the name: count is unchanged, only the last-used
+        # values may move. False when the index has to be rebuilt.
+        food = self.foods.get(normalize(after.get('name')))
+        if food is None:
+            return False
+        if after['date'] >= food['lastDate']:
+            food['lastDate'] = after['date']
+            food['lastId'] = after.get('_id')
+            for field in LAST_USED_FIELDS:
+                food[field] = after.get(field)
+            return True
+        return food['lastId'] != after.get('_id')
+
+    def search(self, query, limit, today):
+        query = normalize(query)
+        if query:
+            names = set()
+            position = bisect_left(self.keys, (query,))
+            while position < len(self.keys) and self.keys[position][0].startswith(query):
+                names.add(self.keys[position][1])
+                position += 1
+        else:
+            names = self.foods.keys()
+
+        # Frequency, discounted by how long ago the food was last logged
+        def score(name):
+            food = self.foods[name]
+            days = max((today - food['lastDate']).days, 0)
+            return food['count'] * 0.5 ** (days / RECENCY_HALF_LIFE_DAYS)
+
+        ranked = sorted(names, key=score, reverse=True)[:limit]
+        return [self.result(self.foods[name]) for name in ranked]
+
+    @staticmethod
+    def result(food):
+        item = {field: food.get(field) for field in LAST_USED_FIELDS}
+        item['count'] = food['count']
+        item['lastUsed'] = food['lastDate'].strftime('%Y-%m-%d')
+        return item
+
+class FoodSearch:
+    # Per-worker LRU of user indexes; load(user_id) returns the user's
+    # food entries and is only called to build a missing or expired index
+    def __init__(self, load, max_users=SEARCH_INDEX_USERS, ttl=SEARCH_INDEX_TTL):
+        self.load = load
+        self.max_users = max_users
+        self.ttl = ttl
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._lock = threading.Lock()
+        self._indexes = OrderedDict()
+
+    def _get(self, user_id):
+        index = self._indexes.get(user_id)
+        if index is None:
+            return None
+        if time.monotonic() - index.built_at > self.ttl:
+            del self._indexes[user_id]
+            return None
+        self._indexes.move_to_end(user_id)
+        return index
+
+    def search(self, user_id, query, limit=DEFAULT_RESULTS):
+        with self._lock:
+            index = self._get(user_id)
+        if index is None:
+            # Built outside the lock so other users' lookups aren't held up
+            index = UserFoodIndex()
+            for entry in self.load(user_id):
+                index.add(entry)
+            with self._lock:
+                self._indexes[user_id] = index
+                while len(self._indexes) > self.max_users:
+                    self._indexes.popitem(last=False)
+        with self._lock:
+            return index.search(query, limit, datetime.utcnow())
+
+    def entry_changed(self, before=None, after=None):
+        # EntryRepository listener; only indexes already in memory are patched
+        user_id = (after or before)['user_id']
+        with self._lock:
+            index = self._indexes.get(user_id)
+            if index is None:
+                return
+            if before is not None and after is not None and normalize(before.get('name')) == normalize(after.get('name')):
+                patched = index.edit(after)
+            else:
+                patched = before is None or index.remove(before)
+                if patched and after is not None:
+                    index.add(after)
+            if not patched:
+                del self._indexes[user_id]
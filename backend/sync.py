@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+import base64
+import json
+import os
+
+# Delta sync. A token is the server time the previous sync covered up to;
+# the next sync returns entries whose updated_at is later, tombstones for
+# entries deleted since, and the profile if it changed. updated_at is set
+# by the worker before its write lands, so each token is pulled back by
+# SYNC_OVERLAP_SECONDS: a change still in flight at sync time is sent next
+# time, and clients apply changes by _id, so seeing one twice is harmless.
+SYNC_OVERLAP_SECONDS = int(os.environ.get('SYNC_OVERLAP_SECONDS', 30))
+SYNC_MAX_CHANGES = int(os.environ.get('SYNC_MAX_CHANGES', 2000))
+# How long deletes are remembered; an older token has to start over
+TOMBSTONE_RETENTION_DAYS = 30
+
+def new_sync_token(now=None):
+    now = now or datetime.utcnow()
+    payload = json.dumps({'t': (now - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_sync_token(token):
+    # Raises ValueError for anything we didn't hand out
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        return datetime.fromisoformat(json.loads(base64.urlsafe_b64decode(padded.encode()))['t'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError('Invalid sync token')
+
+def token_expired(since, now=None):
+    return since < (now or datetime.utcnow()) - timedelta(days=TOMBSTONE_RETENTION_DAYS)
@@ -0,0 +1,37 @@
+import os
+
+import mongomock
+import pymongo
+import pytest
+
+import tests.mongomock_ext
+
+# Production settings, so responses look the way they do when deployed
+os.environ.setdefault('FLASK_CONFIG', 'production')
+os.environ.setdefault('SECRET_KEY', 'test-secret-key-of-at-least-32-bytes')
+os.environ.setdefault('JWT_SECRET_KEY', 'test-jwt-secret-key-of-32-bytes!')
+# The app binds its Mongo client and repositories at import time, so the
+# in-memory mongomock client has to be in place before anything imports it
+pymongo.MongoClient = mongomock.MongoClient
+
+@pytest.fixture
+def flask_app():
+    from app import app, mongo
+    app.config['TESTING'] = True
+    yield app
+    mongo.client.drop_database(mongo.database.name)
+
+@pytest.fixture
+def client(flask_app):
+    return flask_app.test_client()
+
+@pytest.fixture
+def register(client):
+    def register(email='user@example.com', password='secret'):
+        response = client.post('/api/auth/register', json={
+            'name': 'Test User', 'email': email, 'password': password, 'weight': 70, 'height': 175,
+            'age': 30, 'gender': 'male', 'activityLevel': 'moderate', 'goal': 'maintain'
+        })
+        assert response.status_code == 201, response.get_json()
+        return {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+    return register
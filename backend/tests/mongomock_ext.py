@@ -0,0 +1,35 @@
+from mongomock import aggregate
+
+# Expression operators mongomock 4.3 doesn't evaluate, for the pipelines
+# the app sends a real mongod:
+#   $mergeObjects  the in-place bucket edit (buckets.edit_expression);
+#                  mongomock only knows it as a $group accumulator
+#   $round         percentOfGoal in the dashboard pipeline
+_parse = aggregate._Parser.parse
+
+def _merge_objects(parser, parts):
+    merged = {}
+    for part in parts:
+        if isinstance(part, dict) and not any(key.startswith('$') for key in part):
+            part = {key: parser.parse(value) for key, value in part.items()}
+        else:
+            part = parser.parse(part)
+        merged.update(part or {})
+    return merged
+
+def _round(parser, args):
+    value, places = (args + [0])[:2] if isinstance(args, list) else (args, 0)
+    value = parser.parse(value)
+    # Python's round() rounds halves to even, as $round does
+    return None if value is None else round(value, parser.parse(places))
+
+OPERATORS = {'$mergeObjects': _merge_objects, '$round': _round}
+
+def _parse_with_extras(self, expression):
+    if isinstance(expression, dict) and len(expression) == 1:
+        operator, args = next(iter(expression.items()))
+        if operator in OPERATORS:
+            return OPERATORS[operator](self, args)
+    return _parse(self, expression)
+
+aggregate._Parser.parse = _parse_with_extras
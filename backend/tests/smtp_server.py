@@ -0,0 +1,85 @@
+import socketserver
+import threading
+
+# A local SMTP stand-in for the mail queue tests: just enough of the
+# protocol for smtplib (EHLO, MAIL, RCPT, DATA, RSET, NOOP, QUIT). Received
+# messages are kept in order. Failures are scripted per test: drop_next
+# hangs up on that many connections right after the greeting, and rejected
+# recipients get a 550.
+class SMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.messages = []
+        self.rejected = set()
+        self.drop_next = 0
+        self.connections = 0
+        self.quits = 0
+        self.lock = threading.Lock()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+            drop = server.drop_next > 0
+            server.drop_next -= drop
+        self.reply('220 localhost test SMTP')
+        if drop:
+            return
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb in ('EHLO', 'HELO'):
+                self.reply('250 localhost')
+            elif verb == 'MAIL':
+                sender, recipients = command.split(':', 1)[1].strip(), []
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                recipient = command.split(':', 1)[1].strip().strip('<>')
+                if recipient in server.rejected:
+                    self.reply('550 No such user')
+                else:
+                    recipients.append(recipient)
+                    self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                while True:
+                    chunk = self.rfile.readline()
+                    if not chunk or chunk in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(chunk)
+                with server.lock:
+                    server.messages.append({'from': sender, 'to': recipients, 'data': b''.join(data).decode()})
+                self.reply('250 OK')
+            elif verb in ('RSET', 'NOOP'):
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                with server.lock:
+                    server.quits += 1
+                self.reply('221 Bye')
+                return
+            else:
+                self.reply('502 Command not implemented')
@@ -0,0 +1,56 @@
+import pytest
+
+from app import create_app
+from config import config
+
+def test_second_app_in_a_process_is_refused(flask_app):
+    # The repositories are module-level and already bound to flask_app
+    with pytest.raises(RuntimeError, match='already called'):
+        create_app('production')
+
+def test_missing_secret_key_is_refused_at_startup(flask_app, monkeypatch):
+    # Without it the OTP routes could only fail once a request came in
+    monkeypatch.setattr(config['production'], 'SECRET_KEY', None)
+    with pytest.raises(RuntimeError, match='SECRET_KEY must be set'):
+        create_app('production')
+
+def food_entry(date='2025-01-01', **fields):
+    return {'name': 'Oats', 'calories': 300, 'protein': 10, 'date': date, 'mealType': 'breakfast', **fields}
+
+def conditional_get(client, url, headers, etag):
+    return client.get(url, headers={**headers, 'If-None-Match': etag})
+
+def test_day_list_is_not_modified_until_that_day_changes(client, register):
+    headers = register()
+    url = '/api/food?date=2025-01-01'
+    entry = client.post('/api/food', headers=headers, json=food_entry()).get_json()
+    etag = client.get(url, headers=headers).headers['ETag']
+    assert conditional_get(client, url, headers, etag).status_code == 304
+
+    # Writes to another day, or to the other kind on this day, keep it
+    client.post('/api/food', headers=headers, json=food_entry('2025-01-02'))
+    client.post('/api/exercise', headers=headers, json={
+        'name': 'Run', 'duration': 30, 'caloriesBurned': 300, 'date': '2025-01-01', 'exerciseType': 'cardio'})
+    assert conditional_get(client, url, headers, etag).status_code == 304
+
+    # A same-day create, update and delete each bump the day's foodVersion
+    for write in (lambda: client.post('/api/food', headers=headers, json=food_entry(name='Apple')),
+                  lambda: client.put(f"/api/food/{entry['_id']}", headers=headers, json={'calories': 320}),
+                  lambda: client.delete(f"/api/food/{entry['_id']}", headers=headers)):
+        assert write().status_code in (200, 201)
+        response = conditional_get(client, url, headers, etag)
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        etag = response.headers['ETag']
+        assert conditional_get(client, url, headers, etag).status_code == 304
+
+def test_profile_is_not_modified_until_it_is_updated(client, register):
+    headers = register()
+    etag = client.get('/api/user/profile', headers=headers).headers['ETag']
+    assert conditional_get(client, '/api/user/profile', headers, etag).status_code == 304
+
+    assert client.put('/api/user/profile', headers=headers, json={'weight': 72}).status_code == 200
+    response = conditional_get(client, '/api/user/profile', headers, etag)
+    assert response.status_code == 200
+    assert response.get_json()['weight'] == 72
+    assert conditional_get(client, '/api/user/profile', headers, response.headers['ETag']).status_code == 304
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import WriteError
+
+import buckets
+from repository import BucketEntryRepository
+
+DAY_1 = datetime(2025, 1, 1)
+DAY_2 = datetime(2025, 1, 2)
+
+class NoSummaries:
+    def record_change(self, kind, before=None, after=None):
+        pass
+
+    def record_inserted(self, kind, entries):
+        pass
+
+@pytest.fixture
+def repo():
+    return BucketEntryRepository(mongomock.MongoClient().db.food_days, 'food', NoSummaries())
+
+def food_entry(date, name='Oats', calories=100):
+    now = datetime.utcnow()
+    return {'user_id': 'user', 'date': date, 'name': name, 'calories': calories, 'created_at': now, 'updated_at': now}
+
+def day(repo, date):
+    return repo.collection.find_one({'user_id': 'user', 'date': date})
+
+def test_moving_an_entry_pushes_it_to_the_new_day_and_takes_it_off_the_old(repo):
+    entry = repo.insert(food_entry(DAY_1))
+    repo.insert(food_entry(DAY_1, 'Apple', 80))
+
+    moved = repo.update('user', str(entry['_id']), {'date': DAY_2, 'updated_at': datetime.utcnow()})
+    assert moved['date'] == DAY_2 and moved['name'] == 'Oats'
+    assert [e['name'] for e in day(repo, DAY_1)['entries']] == ['Apple']
+    assert day(repo, DAY_1)['totals']['calories'] == 80
+    assert [e['_id'] for e in day(repo, DAY_2)['entries']] == [entry['_id']]
+    assert day(repo, DAY_2)['totals']['calories'] == 100
+
+def test_failed_push_leaves_the_entry_on_its_day(repo, monkeypatch):
+    entry = repo.insert(food_entry(DAY_1))
+    monkeypatch.setattr(repo, '_push', lambda entries: {0: 'no room'})
+
+    with pytest.raises(WriteError):
+        repo.update('user', str(entry['_id']), {'date': DAY_2})
+    assert [e['_id'] for e in day(repo, DAY_1)['entries']] == [entry['_id']]
+    assert day(repo, DAY_2) is None
+
+def test_moving_a_missing_entry_finds_nothing(repo):
+    repo.insert(food_entry(DAY_1))
+    assert repo.update('user', str(ObjectId()), {'date': DAY_2}) is None
+    assert repo.update('someone else', str(ObjectId()), {'date': DAY_1}) is None
+
+def test_changed_entries_follow_written_ids_not_positions():
+    second, third = ObjectId(), ObjectId()
+    now = datetime.utcnow()
+    # The first entry was just removed: the rest shifted down one place,
+    # which the update description reports as writes to entries.0 and .1
+    change = {
+        'operationType': 'update',
+        'updateDescription': {'updatedFields': {'entries.0': {}, 'entries.1': {}}},
+        'fullDocument': {'user_id': 'user', 'date': DAY_1, 'written_ids': [],
+                         'entries': [{'_id': second, 'created_at': now, 'updated_at': now},
+                                     {'_id': third, 'created_at': now, 'updated_at': now}]}
+    }
+    assert buckets.changed_entries(change) == []
+
+    change['fullDocument']['written_ids'] = [third]
+    assert [(event, entry['_id']) for event, entry in buckets.changed_entries(change)] == [('entry-created', third)]
+
+def test_pushes_record_what_they_wrote(repo):
+    entry = repo.insert(food_entry(DAY_1))
+    assert day(repo, DAY_1)['written_ids'] == [entry['_id']]
+    repo.delete('user', str(entry['_id']))
+    assert day(repo, DAY_1)['written_ids'] == []
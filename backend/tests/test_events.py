@@ -0,0 +1,30 @@
+import logging
+import threading
+
+import events
+from asgi import PathOnlyAccessLog
+
+def test_threaded_streams_are_capped_per_worker(client, register, monkeypatch):
+    monkeypatch.setattr(events, '_thread_streams', threading.BoundedSemaphore(1))
+    headers = register()
+    first = client.get('/api/events', headers=headers, buffered=False)
+    assert first.status_code == 200
+
+    refused = client.get('/api/events', headers=headers, buffered=False)
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == '60'
+
+    # Closing the first stream gives its slot back and unsubscribes it,
+    # even though its body was never read
+    first.close()
+    assert events.broker._subscribers == {}
+    second = client.get('/api/events', headers=headers, buffered=False)
+    assert second.status_code == 200
+    second.close()
+
+def test_uvicorn_access_log_drops_the_query_string():
+    record = logging.LogRecord('uvicorn.access', logging.INFO, __file__, 1, '%s - "%s %s HTTP/%s" %d',
+                               ('127.0.0.1:5000', 'GET', '/api/events?jwt=secret', '1.1', 200), None)
+    assert PathOnlyAccessLog().filter(record)
+    assert 'secret' not in record.getMessage()
+    assert record.getMessage() == '127.0.0.1:5000 - "GET /api/events HTTP/1.1" 200'
@@ -0,0 +1,92 @@
+import json
+import smtplib
+import time
+
+import pytest
+
+from mail_queue import MailQueue, SMTPSession
+from otp_utils import build_otp_message
+from tests.smtp_server import SMTPServer
+
+@pytest.fixture
+def smtp_server():
+    server = SMTPServer().start()
+    yield server
+    server.stop()
+
+def make_queue(server, tmp_path, **options):
+    def session_factory():
+        return SMTPSession(connect=lambda: smtplib.SMTP('127.0.0.1', server.port, timeout=5))
+    options = {'backoff': 0.01, 'idle_timeout': 5, **options}
+    return MailQueue(session_factory=session_factory, dead_letter_path=str(tmp_path / 'dead.log'), **options)
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+def test_enqueued_messages_are_sent_over_one_connection(smtp_server, tmp_path):
+    mail = make_queue(smtp_server, tmp_path)
+    for i in range(3):
+        assert mail.enqueue(build_otp_message(f'user{i}@example.com', '123456'))
+    assert mail.wait_until_idle(timeout=5)
+
+    assert [m['to'] for m in smtp_server.messages] == [[f'user{i}@example.com'] for i in range(3)]
+    assert 'Your OTP code is: 123456' in smtp_server.messages[0]['data']
+    assert smtp_server.connections == 1
+    assert mail.stats() == {'queued': 0, 'sent': 3, 'failed': 0}
+
+def test_dropped_connection_is_retried_on_a_new_one(smtp_server, tmp_path):
+    smtp_server.drop_next = 2
+    mail = make_queue(smtp_server, tmp_path, max_attempts=4)
+    mail.enqueue(build_otp_message('user@example.com', '123456'))
+    assert mail.wait_until_idle(timeout=5)
+
+    assert len(smtp_server.messages) == 1
+    assert smtp_server.connections == 3
+    assert mail.stats()['sent'] == 1
+
+def test_gives_up_after_max_attempts_and_dead_letters_the_envelope(smtp_server, tmp_path):
+    smtp_server.drop_next = 10
+    mail = make_queue(smtp_server, tmp_path, max_attempts=3)
+    mail.enqueue(build_otp_message('user@example.com', '654321'))
+    assert mail.wait_until_idle(timeout=5)
+
+    assert smtp_server.messages == []
+    assert smtp_server.connections == 3
+    assert mail.stats()['failed'] == 1
+    record = json.loads((tmp_path / 'dead.log').read_text())
+    assert record['to'] == 'user@example.com'
+    assert record['attempts'] == 3
+    assert '654321' not in json.dumps(record)
+
+def test_rejected_recipient_is_not_retried(smtp_server, tmp_path):
+    smtp_server.rejected.add('nobody@example.com')
+    mail = make_queue(smtp_server, tmp_path, max_attempts=4)
+    mail.enqueue(build_otp_message('nobody@example.com', '123456'))
+    mail.enqueue(build_otp_message('user@example.com', '123456'))
+    assert mail.wait_until_idle(timeout=5)
+
+    assert [m['to'] for m in smtp_server.messages] == [['user@example.com']]
+    assert mail.stats() == {'queued': 0, 'sent': 1, 'failed': 1}
+    assert json.loads((tmp_path / 'dead.log').read_text())['attempts'] == 1
+
+def test_full_queue_refuses_instead_of_blocking(smtp_server, tmp_path):
+    smtp_server.drop_next = 100
+    mail = make_queue(smtp_server, tmp_path, max_size=1, max_attempts=2, backoff=0.5)
+    results = [mail.enqueue(build_otp_message(f'user{i}@example.com', '123456')) for i in range(5)]
+    # The worker holds one message while the queue holds another
+    assert results[:1] == [True] and False in results
+    assert mail.wait_until_idle(timeout=10)
+
+def test_idle_connection_is_closed_and_reopened(smtp_server, tmp_path):
+    mail = make_queue(smtp_server, tmp_path, idle_timeout=0.1)
+    mail.enqueue(build_otp_message('user@example.com', '123456'))
+    assert mail.wait_until_idle(timeout=5)
+    wait_for(lambda: smtp_server.quits == 1)
+
+    mail.enqueue(build_otp_message('user@example.com', '123456'))
+    assert mail.wait_until_idle(timeout=5)
+    assert len(smtp_server.messages) == 2
+    assert smtp_server.connections == 2
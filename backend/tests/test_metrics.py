@@ -0,0 +1,32 @@
+import metrics
+
+def latency_count(labels):
+    series = metrics.http_latency._values.get(labels)
+    return sum(series[0]) if series else 0
+
+def in_flight(route):
+    return metrics.http_in_flight._values.get((route,), 0)
+
+def test_plain_response_is_timed_when_it_is_returned(client, register):
+    headers = register()
+    labels = ('/api/user/profile', 'GET', '200')
+    before = latency_count(labels)
+    assert client.get('/api/user/profile', headers=headers).status_code == 200
+    assert latency_count(labels) == before + 1
+    assert in_flight('/api/user/profile') == 0
+
+def test_streamed_response_is_timed_when_its_body_is_done(client, register):
+    headers = register()
+    labels = ('/api/export', 'GET', '200')
+    before = latency_count(labels)
+    response = client.get('/api/export?format=csv', headers=headers, buffered=False)
+    assert response.status_code == 200
+    # Headers are out but the body hasn't been generated yet
+    assert latency_count(labels) == before
+    assert in_flight('/api/export') == 1
+
+    assert response.get_data(as_text=True).startswith('type,')
+    response.close()
+    assert latency_count(labels) == before + 1
+    assert in_flight('/api/export') == 0
+    assert metrics.current_route.get() == 'none'
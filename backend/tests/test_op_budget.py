@@ -0,0 +1,54 @@
+import pytest
+
+from app import create_indexes, mongo
+
+# Mongo round trips per request, as counted by count_op() and reported in
+# X-Mongo-Ops. A change that adds a query to one of these paths should
+# show up here rather than in production latency.
+def mongo_ops(response):
+    return int(response.headers['X-Mongo-Ops'])
+
+def food_entry(**fields):
+    return {'name': 'Eggs', 'calories': 150, 'protein': 12, 'carbs': 1, 'fat': 10,
+            'mealType': 'breakfast', 'date': '2025-01-01', **fields}
+
+def test_register_is_a_lookup_and_an_insert(client):
+    response = client.post('/api/auth/register', json={
+        'name': 'New User', 'email': 'new@example.com', 'password': 'secret', 'weight': 70, 'height': 175,
+        'age': 30, 'gender': 'female', 'activityLevel': 'moderate', 'goal': 'maintain'
+    })
+    assert response.status_code == 201
+    assert mongo_ops(response) == 2
+
+def test_register_with_a_taken_email_stops_at_the_lookup(client, register):
+    register('taken@example.com')
+    response = client.post('/api/auth/register', json={
+        'name': 'Someone Else', 'email': 'taken@example.com', 'password': 'other', 'weight': 60, 'height': 165,
+        'age': 40, 'gender': 'female', 'activityLevel': 'light', 'goal': 'lose'
+    })
+    assert response.status_code == 400
+    assert mongo_ops(response) == 1
+
+def test_profile_update_reads_through_the_cache(client, register):
+    headers = register()
+    first = client.put('/api/user/profile', json={'weight': 72}, headers=headers)
+    assert first.status_code == 200
+    assert first.get_json()['weight'] == 72
+    # Cold cache: load the profile, then update and read it back in one go
+    assert mongo_ops(first) == 2
+    # The update refreshed the cache, so only the write is left
+    second = client.put('/api/user/profile', json={'goal': 'lose'}, headers=headers)
+    assert second.status_code == 200
+    assert mongo_ops(second) == 1
+
+def test_delete_entry_is_delete_rollup_and_tombstone(client, register):
+    headers = register()
+    entry = client.post('/api/food', json=food_entry(), headers=headers).get_json()
+    response = client.delete(f"/api/food/{entry['_id']}", headers=headers)
+    assert response.status_code == 200
+    assert mongo_ops(response) == 3
+
+def test_missing_email_index_refuses_to_start(flask_app):
+    mongo.database.users.insert_many([{'email': 'twice@example.com'}, {'email': 'twice@example.com'}])
+    with pytest.raises(RuntimeError, match='email_unique'):
+        create_indexes(flask_app)
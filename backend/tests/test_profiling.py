@@ -0,0 +1,15 @@
+from flask import Flask
+
+import profiling
+
+def test_admin_token_accepts_any_header_value(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILE_ADMIN_TOKEN', 'sekret')
+    monkeypatch.setattr(profiling, 'PROFILE_SAMPLE_RATE', 0)
+    app = Flask(__name__)
+    with app.test_request_context(headers={'X-Profile-Token': 'sekret'}):
+        assert profiling.should_profile()
+    # Werkzeug hands non-ASCII header bytes over as latin-1 text
+    with app.test_request_context(headers={'X-Profile-Token': 'sékret'}):
+        assert not profiling.should_profile()
+    with app.test_request_context(headers={'X-Profile-Token': 'wrong'}):
+        assert not profiling.should_profile()
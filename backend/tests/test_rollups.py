@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+import rollups
+from repository import SummaryRepository, entry_repository
+
+DAY_1 = datetime(2025, 1, 1)
+DAY_2 = datetime(2025, 1, 2)
+DAY_3 = datetime(2025, 1, 3)
+
+def food_entry(date, name, calories):
+    now = datetime.utcnow()
+    return {'user_id': 'user', 'date': date, 'name': name, 'calories': calories, 'protein': 10,
+            'carbs': 20, 'fat': 5, 'mealType': 'lunch', 'created_at': now, 'updated_at': now}
+
+def exercise_entry(date, name, duration):
+    now = datetime.utcnow()
+    return {'user_id': 'user', 'date': date, 'name': name, 'duration': duration, 'caloriesBurned': duration * 10,
+            'exerciseType': 'cardio', 'created_at': now, 'updated_at': now}
+
+def edit(**fields):
+    return {**fields, 'updated_at': datetime.utcnow()}
+
+@pytest.mark.parametrize('storage', ['documents', 'buckets'])
+def test_rollup_follows_entries_across_days(storage):
+    db = mongomock.MongoClient().db
+    summaries = SummaryRepository(db.daily_summaries)
+    food = entry_repository(db, 'food', summaries, storage=storage)
+    exercise = entry_repository(db, 'exercise', summaries, storage=storage)
+
+    oats = food.insert(food_entry(DAY_1, 'Oats', 300))
+    apple = food.insert(food_entry(DAY_1, 'Apple', 80))
+    soup = food.insert(food_entry(DAY_2, 'Soup', 250))
+    run = exercise.insert(exercise_entry(DAY_1, 'Run', 30))
+    food.insert_many([food_entry(DAY_3, f'Snack {i}', 50) for i in range(3)])
+
+    # Edit in place, move to another day, move and edit at once, delete
+    food.update('user', str(oats['_id']), edit(calories=350))
+    food.update('user', str(apple['_id']), edit(date=DAY_2))
+    food.update('user', str(soup['_id']), edit(date=DAY_3, calories=200))
+    exercise.update('user', str(run['_id']), edit(date=DAY_2, duration=45))
+    food.delete('user', str(oats['_id']))
+
+    assert rollups.verify(db, storage=storage) == []
+    by_day = {summary['date']: summary for summary in rollups.get_summaries(db.daily_summaries, 'user', DAY_1, DAY_3)}
+    assert by_day[DAY_1]['foodCount'] == 0 and by_day[DAY_1]['calories'] == 0
+    assert by_day[DAY_1]['exerciseCount'] == 0
+    assert (by_day[DAY_2]['foodCount'], by_day[DAY_2]['calories']) == (1, 80)
+    assert (by_day[DAY_2]['exerciseCount'], by_day[DAY_2]['exerciseMinutes'], by_day[DAY_2]['caloriesBurned']) == (1, 45, 300)
+    assert (by_day[DAY_3]['foodCount'], by_day[DAY_3]['calories']) == (4, 350)
+
+def test_changing_an_entry_date_through_the_api_moves_its_rollup(client, register):
+    from app import mongo
+    headers = register()
+    entry = client.post('/api/food', headers=headers, json={
+        'name': 'Oats', 'calories': 300, 'protein': 10, 'date': '2025-01-01', 'mealType': 'breakfast'}).get_json()
+    response = client.put(f"/api/food/{entry['_id']}", headers=headers, json={'date': '2025-01-02', 'calories': 320})
+    assert response.status_code == 200
+
+    days = client.get('/api/summary?from=2025-01-01&to=2025-01-02', headers=headers).get_json()
+    assert [(day['foodCount'], day['calories']) for day in days] == [(0, 0), (1, 320)]
+    assert rollups.verify(mongo.database) == []
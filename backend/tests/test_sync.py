@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta
+
+def test_profile_changed_elsewhere_reaches_the_next_sync(flask_app, client, register):
+    from app import mongo
+    headers = register()
+    users = mongo.database.users
+    users.update_one({'email': 'user@example.com'},
+                     {'$set': {'updated_at': datetime.utcnow() - timedelta(minutes=5)}})
+    # Warm this worker's profile cache with the old copy
+    assert client.get('/api/user/profile', headers=headers).status_code == 200
+    token = client.get('/api/sync', headers=headers).get_json()['token']
+
+    # A write that never goes through this worker, like recompute_goals.py
+    users.update_one({'email': 'user@example.com'},
+                     {'$set': {'calorieGoal': 1800, 'updated_at': datetime.utcnow()}})
+
+    response = client.get('/api/sync', headers=headers, query_string={'since': token})
+    assert response.status_code == 200
+    assert response.get_json()['profile']['calorieGoal'] == 1800
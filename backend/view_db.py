@@ -27,16 +27,16 @@ def view_database_contents():
             print(f"\n📁 Collection: {collection_name}")
             print("=" * 50)
             
-            # Get all documents in the collection
-            documents = list(db[collection_name].find())
+            # Walk the cursor instead of loading the collection into memory
+            count = db[collection_name].estimated_document_count()
             
-            if not documents:
+            if not count:
                 print("No documents found in this collection.")
                 continue
                 
-            print(f"Found {len(documents)} documents:\n")
+            print(f"Found about {count} documents:\n")
             
-            for doc in documents:
+            for doc in db[collection_name].find():
                 # Convert ObjectId to string
                 if '_id' in doc:
                     doc['_id'] = str(doc['_id'])
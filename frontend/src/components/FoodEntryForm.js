@@ -1,6 +1,6 @@
-import React, { useState } from 'react';
+import React, { useState, useEffect } from 'react';
 import '../styles/forms.css';
-import { addFoodEntry } from '../services/foodService';
+import { addFoodEntry, searchFoods } from '../services/foodService';
 
 const FoodEntryForm = ({ onEntryAdded }) => {
   const [formData, setFormData] = useState({
@@ -14,12 +14,37 @@ const FoodEntryForm = ({ onEntryAdded }) => {
   });
   const [error, setError] = useState('');
   const [loading, setLoading] = useState(false);
+  const [suggestions, setSuggestions] = useState([]);
+
+  // Suggest past foods as the name is typed
+  useEffect(() => {
+    const query = formData.name.trim();
+    if (!query) {
+      setSuggestions([]);
+      return undefined;
+    }
+    const timer = setTimeout(() => {
+      searchFoods(query)
+        .then(setSuggestions)
+        .catch(() => setSuggestions([]));
+    }, 150);
+    return () => clearTimeout(timer);
+  }, [formData.name]);
 
   const handleChange = (e) => {
     const { name, value } = e.target;
+    // Picking a suggestion fills in what was logged last time
+    const match = name === 'name' && suggestions.find(food => food.name === value);
     setFormData(prev => ({
       ...prev,
-      [name]: value
+      [name]: value,
+      ...(match ? {
+        calories: match.calories ?? '',
+        protein: match.protein ?? '',
+        carbs: match.carbs ?? '',
+        fat: match.fat ?? '',
+        mealType: match.mealType || prev.mealType
+      } : {})
     }));
     setError(''); // Clear error when user makes changes
   };
@@ -32,7 +57,7 @@ const FoodEntryForm = ({ onEntryAdded }) => {
     try {
       const response = await addFoodEntry(formData);
       if (response) {
-        onEntryAdded();
+        if (onEntryAdded) onEntryAdded();
         setFormData({
           name: '',
           calories: '',
@@ -83,8 +108,17 @@ const FoodEntryForm = ({ onEntryAdded }) => {
               onChange={handleChange}
               className="form-control"
               placeholder="e.g., Grilled Chicken Breast"
+              list="food-suggestions"
+              autoComplete="off"
               required
             />
+            <datalist id="food-suggestions">
+              {suggestions.map(food => (
+                <option key={food.name} value={food.name}>
+                  {`${food.calories} kcal, logged ${food.count}x`}
+                </option>
+              ))}
+            </datalist>
             <div className="form-helper">Enter the name of the food item</div>
           </div>
           <div className="form-group">
@@ -1,11 +1,10 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { format } from 'date-fns';
 import DailyCaloriesSummary from '../components/DailyCaloriesSummary';
 import FoodEntryForm from '../components/FoodEntryForm';
 import ExerciseEntryForm from '../components/ExerciseEntryForm';
-import { getFoodEntries } from '../services/foodService';
-import { getExerciseEntries } from '../services/exerciseService';
-import { getUserProfile } from '../services/userService';
+import { getDashboard } from '../services/dashboardService';
+import { subscribeToEvents } from '../services/eventService';
 import { useAuth } from '../context/AuthContext';
 import '../styles/dashboard.css';
 import {BMICalculator} from '../components/BMICalculator';
@@ -18,35 +17,34 @@ const Dashboard = () => {
   const [userProfile, setUserProfile] = useState(null);
   const [loading, setLoading] = useState(true);
   const [activeTab, setActiveTab] = useState('summary');
+  const refreshTimer = useRef(null);
 
-  // Calculate total calories
-  const totalCaloriesConsumed = foodEntries.reduce((sum, entry) => sum + entry.calories, 0);
-  const totalCaloriesBurned = exerciseEntries.reduce((sum, entry) => sum + entry.caloriesBurned, 0);
+  const [totals, setTotals] = useState(null);
+
+  // Totals are computed server-side alongside the entries
+  const totalCaloriesConsumed = totals ? totals.caloriesConsumed : 0;
+  const totalCaloriesBurned = totals ? totals.caloriesBurned : 0;
   
   // Calculate remaining calories (goal - consumed + burned)
-  const remainingCalories = userProfile ? userProfile.calorieGoal - totalCaloriesConsumed + totalCaloriesBurned : 0;
-  
-  // Net calories is what the user has consumed after accounting for exercise
-  const netCalories = totalCaloriesConsumed - totalCaloriesBurned;
+  const remainingCalories = totals ? totals.remainingCalories : 0;
   
   // Calculate percentage of goal consumed for progress bar
-  const caloriePercentage = userProfile ? 
-    Math.min(100, Math.max(0, (totalCaloriesConsumed - totalCaloriesBurned) / userProfile.calorieGoal * 100)) : 0;
+  const caloriePercentage = totals && totals.percentOfGoal !== null ?
+    Math.min(100, Math.max(0, totals.percentOfGoal)) : 0;
+
+  const applyDashboard = (dashboard) => {
+    setFoodEntries(dashboard.foodEntries);
+    setExerciseEntries(dashboard.exerciseEntries);
+    setUserProfile(dashboard.profile);
+    setTotals(dashboard.totals);
+  };
 
   useEffect(() => {
     const fetchData = async () => {
       setLoading(true);
       try {
         const formattedDate = format(date, 'yyyy-MM-dd');
-        const [foodData, exerciseData, profileData] = await Promise.all([
-          getFoodEntries(formattedDate),
-          getExerciseEntries(formattedDate),
-          getUserProfile()
-        ]);
-
-        setFoodEntries(foodData);
-        setExerciseEntries(exerciseData);
-        setUserProfile(profileData);
+        applyDashboard(await getDashboard(formattedDate));
       } catch (error) {
         console.error('Error fetching dashboard data:', error);
       } finally {
@@ -61,17 +59,38 @@ const Dashboard = () => {
     setDate(new Date(e.target.value));
   };
 
-  const refreshData = async () => {
-    const formattedDate = format(date, 'yyyy-MM-dd');
-    const [foodData, exerciseData] = await Promise.all([
-      getFoodEntries(formattedDate),
-      getExerciseEntries(formattedDate)
-    ]);
-
-    setFoodEntries(foodData);
-    setExerciseEntries(exerciseData);
+  // A burst of refreshes (a batch import, or our own write followed by its
+  // event) becomes a single refetch
+  const scheduleRefresh = (shownDate) => {
+    clearTimeout(refreshTimer.current);
+    refreshTimer.current = setTimeout(() => {
+      getDashboard(shownDate).then(applyDashboard).catch((error) => {
+        console.error('Error refreshing dashboard data:', error);
+      });
+    }, 200);
   };
 
+  // Our own writes always refetch: the event for them may never arrive, e.g.
+  // EVENTS_SOURCE=local with the stream held open by a different worker
+  const refreshData = () => scheduleRefresh(format(date, 'yyyy-MM-dd'));
+
+  // Changes made in other tabs or on other devices arrive as events
+  useEffect(() => {
+    const shownDate = format(date, 'yyyy-MM-dd');
+    const unsubscribe = subscribeToEvents((type, data) => {
+      const entryDate = type === 'entry-deleted' ? data.date : data.entry && data.entry.date;
+      if (type !== 'profile-changed' && new Date(entryDate).toISOString().slice(0, 10) !== shownDate) {
+        return;
+      }
+      scheduleRefresh(shownDate);
+    });
+
+    return () => {
+      clearTimeout(refreshTimer.current);
+      unsubscribe();
+    };
+  }, [date]);
+
   if (loading || !userProfile) {
     return (
       <div className="dashboard-container flex items-center justify-center">
@@ -217,14 +236,14 @@ const Dashboard = () => {
             {activeTab === 'food' && (
               <div className="form-container">
                 <h2 className="form-title">Add Food Entry</h2>
-                <FoodEntryForm date={date} onSuccess={refreshData} />
+                <FoodEntryForm date={date} onEntryAdded={refreshData} />
               </div>
             )}
 
             {activeTab === 'exercise' && (
               <div className="form-container">
                 <h2 className="form-title">Add Exercise Entry</h2>
-                <ExerciseEntryForm date={date} onSuccess={refreshData} />
+                <ExerciseEntryForm date={date} onEntryAdded={refreshData} />
               </div>
             )}
             {/* BMI Calculator form */}
@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { clearConditionalCache } from './conditionalGet';
 
 const API_URL = '/api';
 
@@ -79,6 +80,7 @@ export const verifyOtp = async (email, otp) => {
 };
 
 export const logout = async () => {
+  clearConditionalCache();
   try {
     await axios.post(`${API_URL}/auth/logout`, {}, {
       withCredentials: true,
@@ -0,0 +1,35 @@
+import axios from 'axios';
+
+// Last response and ETag per URL. A repeat GET sends the ETag back as
+// If-None-Match and, when the server answers 304, reuses the cached data
+// instead of downloading it again.
+const MAX_CACHED = 50;
+const cache = new Map();
+
+export const conditionalGet = async (url, config = {}) => {
+  const cached = cache.get(url);
+  const response = await axios.get(url, {
+    ...config,
+    headers: {
+      ...config.headers,
+      ...(cached ? { 'If-None-Match': cached.etag } : {}),
+    },
+    validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+  });
+
+  if (response.status === 304 && cached) {
+    return cached.data;
+  }
+
+  cache.delete(url);
+  const etag = response.headers.etag;
+  if (etag) {
+    cache.set(url, { etag, data: response.data });
+    if (cache.size > MAX_CACHED) {
+      cache.delete(cache.keys().next().value);
+    }
+  }
+  return response.data;
+};
+
+export const clearConditionalCache = () => cache.clear();
@@ -0,0 +1,14 @@
+import axios from 'axios';
+
+const API_URL = 'http://localhost:5000/api';
+
+export const getDashboard = async (date) => {
+  try {
+    const response = await axios.get(`${API_URL}/dashboard?date=${date}`, {
+      withCredentials: true,
+    });
+    return response.data;
+  } catch (error) {
+    throw error.response ? error.response.data : error;
+  }
+};
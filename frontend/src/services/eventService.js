@@ -0,0 +1,24 @@
+const API_URL = 'http://localhost:5000/api';
+
+const EVENT_TYPES = ['entry-created', 'entry-updated', 'entry-deleted', 'profile-changed'];
+
+// Live updates over Server-Sent Events. EventSource can't send an
+// Authorization header, so the token goes in the query string. The
+// browser reconnects on its own after a dropped connection; onStatus(false)
+// tells the caller to fall back to refetching after its own writes.
+export const subscribeToEvents = (onEvent, onStatus = () => {}) => {
+  const token = localStorage.getItem('token');
+  if (!token || typeof EventSource === 'undefined') {
+    onStatus(false);
+    return () => {};
+  }
+
+  const source = new EventSource(`${API_URL}/events?jwt=${encodeURIComponent(token)}`);
+  source.onopen = () => onStatus(true);
+  source.onerror = () => onStatus(false);
+  EVENT_TYPES.forEach((type) => {
+    source.addEventListener(type, (event) => onEvent(type, JSON.parse(event.data)));
+  });
+
+  return () => source.close();
+};
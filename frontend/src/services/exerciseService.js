@@ -1,13 +1,13 @@
 import axios from 'axios';
+import { conditionalGet } from './conditionalGet';
 
 const API_URL = 'http://localhost:5000/api';
 
 export const getExerciseEntries = async (date) => {
   try {
-    const response = await axios.get(`${API_URL}/exercise?date=${date}`, {
+    return await conditionalGet(`${API_URL}/exercise?date=${date}`, {
       withCredentials: true,
     });
-    return response.data;
   } catch (error) {
     throw error.response ? error.response.data : error;
   }
@@ -1,14 +1,14 @@
 
 import axios from 'axios';
+import { conditionalGet } from './conditionalGet';
 
 const API_URL = 'http://localhost:5000/api';
 
 export const getFoodEntries = async (date) => {
   try {
-    const response = await axios.get(`${API_URL}/food?date=${date}`, {
+    return await conditionalGet(`${API_URL}/food?date=${date}`, {
       withCredentials: true,
     });
-    return response.data;
   } catch (error) {
     throw error.response ? error.response.data : error;
   }
@@ -45,4 +45,15 @@ export const deleteFoodEntry = async (id) => {
   } catch (error) {
     throw error.response ? error.response.data : error;
   }
-};
\ No newline at end of file
+};
+export const searchFoods = async (query) => {
+  try {
+    const response = await axios.get(`${API_URL}/food/search`, {
+      params: { q: query },
+      withCredentials: true,
+    });
+    return response.data;
+  } catch (error) {
+    throw error.response ? error.response.data : error;
+  }
+};
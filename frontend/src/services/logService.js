@@ -26,6 +26,17 @@ export const addFoodEntry = async (foodData) => {
   }
 };
 
+export const addFoodEntries = async (entries) => {
+  try {
+    const response = await axios.post(`${API_URL}/food/batch`, { entries }, {
+      withCredentials: true
+    });
+    return response.data;
+  } catch (error) {
+    throw error.response?.data || { error: 'Failed to add food entries' };
+  }
+};
+
 export const updateFoodEntry = async (id, foodData) => {
   try {
     const response = await axios.put(`${API_URL}/food/${id}`, foodData, {
@@ -72,6 +83,17 @@ export const addExerciseEntry = async (exerciseData) => {
   }
 };
 
+export const addExerciseEntries = async (entries) => {
+  try {
+    const response = await axios.post(`${API_URL}/exercise/batch`, { entries }, {
+      withCredentials: true
+    });
+    return response.data;
+  } catch (error) {
+    throw error.response?.data || { error: 'Failed to add exercise entries' };
+  }
+};
+
 export const updateExerciseEntry = async (id, exerciseData) => {
   try {
     const response = await axios.put(`${API_URL}/exercise/${id}`, exerciseData, {
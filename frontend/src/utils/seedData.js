@@ -1,4 +1,4 @@
-import { addFoodEntry, addExerciseEntry } from '../services/logService.js';
+import { addFoodEntries, addExerciseEntries } from '../services/logService.js';
 
 const foodEntries = [
   {
@@ -90,17 +90,13 @@ export const seedData = async () => {
   try {
     // Add food entries
     console.log('Adding food entries...');
-    for (const entry of foodEntries) {
-      await addFoodEntry(entry);
-      console.log(`Added food entry: ${entry.name}`);
-    }
+    const foodResult = await addFoodEntries(foodEntries);
+    console.log(`Added ${foodResult.created} food entries (${foodResult.failed} failed)`);
 
     // Add exercise entries
     console.log('Adding exercise entries...');
-    for (const entry of exerciseEntries) {
-      await addExerciseEntry(entry);
-      console.log(`Added exercise entry: ${entry.name}`);
-    }
+    const exerciseResult = await addExerciseEntries(exerciseEntries);
+    console.log(`Added ${exerciseResult.created} exercise entries (${exerciseResult.failed} failed)`);
 
     console.log('Successfully added all dummy data!');
   } catch (error) {